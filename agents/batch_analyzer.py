@@ -0,0 +1,296 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import traceback
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from agents.patent_analyzer import PatentAnalyzer, FAILED_RESULTS
+from agents.progress import report_progress
+from config.settings import BATCH_MAX_CONCURRENCY
+
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+MANIFEST_NAME = 'manifest.json'
+INPUTS_FOLDER = 'inputs'
+# 通过接口上传的 zip 保存在 inputs/ 下的固定文件名，避免与清单、索引等批次文件重名
+UPLOAD_ARCHIVE_NAME = 'upload.zip'
+
+
+def _report_name(relative_path):
+    """把输入文件的相对路径转换为扁平、安全的报告文件名
+
+    扁平化会把不同路径映射成同一个名字（如 a/b.pdf 与 a__b.pdf），因此附加相对路径的短哈希
+    """
+    relative_path = relative_path.replace('\\', '/')
+    stem = os.path.splitext(relative_path)[0]
+    name = re.sub(r'[^\w.-]+', '_', stem.replace('/', '__')).strip('._')
+    digest = hashlib.sha256(relative_path.encode('utf-8')).hexdigest()[:8]
+    return f"{name or 'patent'}-{digest}.html"
+
+
+class BatchAnalyzer:
+    """对一批专利 PDF 执行分析，进度记录在 output_dir/manifest.json 中，中断后重新运行即可从断点继续
+
+    输出目录结构：
+        manifest.json    每个文件的状态（pending / done / failed）、报告路径和错误信息
+        inputs/          从 zip 中解出的 PDF
+        reports/         每个专利一份报告
+        index.html/json  组合索引
+    """
+
+    def __init__(self, output_dir, analysis_params=None, max_workers=BATCH_MAX_CONCURRENCY, analyzer_factory=PatentAnalyzer):
+        self.output_dir = output_dir
+        self.analysis_params = analysis_params or {}
+        self.max_workers = max(1, max_workers)
+        self.analyzer_factory = analyzer_factory
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self.manifest = self._load_manifest()
+        # 续跑时沿用首次运行的分析参数，保证同一组合内的报告口径一致
+        if self.manifest.get('analysis_params') is None:
+            self.manifest['analysis_params'] = self.analysis_params
+        else:
+            self.analysis_params = self.manifest['analysis_params']
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'sources': [], 'analysis_params': None, 'created_at': time.time(), 'items': {}}
+
+    def _save_manifest(self):
+        """先写临时文件再替换，进程在写入过程中被杀掉也不会留下损坏的清单，调用方需持有锁"""
+        self.manifest['updated_at'] = time.time()
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def add_source(self, source):
+        """登记目录或 zip 中的全部 PDF，已登记的文件保持原状态；返回新增的文件数"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        if os.path.isdir(source):
+            files = self._collect_directory(source)
+        elif zipfile.is_zipfile(source):
+            files = self._extract_zip(source)
+        else:
+            raise ValueError(f"批量分析的输入必须是目录或 zip 文件: {source}")
+
+        added = 0
+        with self._lock:
+            if source not in self.manifest['sources']:
+                self.manifest['sources'].append(source)
+            for relative_path, path in files:
+                if relative_path not in self.manifest['items']:
+                    self.manifest['items'][relative_path] = {
+                        'path': path,
+                        'status': 'pending',
+                        'report': None,
+                        'error': None,
+                        'attempts': 0,
+                    }
+                    added += 1
+            self._save_manifest()
+        return added
+
+    def _collect_directory(self, directory):
+        files = []
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if name.lower().endswith('.pdf'):
+                    path = os.path.abspath(os.path.join(root, name))
+                    files.append((os.path.relpath(path, os.path.abspath(directory)).replace(os.sep, '/'), path))
+        return sorted(files)
+
+    def _extract_zip(self, archive_path):
+        """把 zip 中的 PDF 解压到 inputs/ 下；成员名只用于生成扁平的文件名，避免路径穿越"""
+        inputs_dir = os.path.join(self.output_dir, INPUTS_FOLDER)
+        os.makedirs(inputs_dir, exist_ok=True)
+        files = []
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith('.pdf'):
+                    continue
+                path = os.path.join(inputs_dir, _report_name(member.filename)[:-len('.html')] + '.pdf')
+                if not os.path.exists(path):
+                    with archive.open(member) as src, open(path, 'wb') as dst:
+                        dst.write(src.read())
+                files.append((member.filename, os.path.abspath(path)))
+        return sorted(files)
+
+    def counts(self):
+        with self._lock:
+            counts = {'pending': 0, 'done': 0, 'failed': 0}
+            for item in self.manifest['items'].values():
+                counts[item['status']] = counts.get(item['status'], 0) + 1
+            counts['total'] = len(self.manifest['items'])
+            return counts
+
+    def run(self, retry_failed=True, progress_callback=None):
+        """以至多 max_workers 个并发分析所有未完成的文件，返回各状态计数"""
+        with self._lock:
+            todo = [
+                relative_path for relative_path, item in self.manifest['items'].items()
+                if item['status'] == 'pending' or (retry_failed and item['status'] == 'failed')
+            ]
+        total = len(self.manifest['items'])
+        print(f"[BatchAnalyzer] 共 {total} 个文件，本次需要分析 {len(todo)} 个，并发数 {self.max_workers}")
+        report_progress(progress_callback, 'batch_started', total=total, todo=len(todo))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='batch-analysis') as executor:
+                futures = {executor.submit(self._analyze_item, relative_path): relative_path for relative_path in todo}
+                for future in as_completed(futures):
+                    relative_path = futures[future]
+                    status = future.result()
+                    counts = self.counts()
+                    print(f"[BatchAnalyzer] {relative_path}: {status}（完成 {counts['done']}，失败 {counts['failed']}，共 {counts['total']}）")
+                    report_progress(progress_callback, 'batch_item', file=relative_path, status=status, **counts)
+        finally:
+            self.write_index()
+        return self.counts()
+
+    def _analyze_item(self, relative_path):
+        with self._lock:
+            item = self.manifest['items'][relative_path]
+            item['attempts'] += 1
+            path = item['path']
+
+        started_at = time.perf_counter()
+        report = None
+        try:
+            analyzer = self.analyzer_factory()
+            patent_text = analyzer.extract_text(path)
+            if not patent_text:
+                raise ValueError("无法提取有效文本内容")
+            result = analyzer.analyze_with_params(patent_text, self.analysis_params)
+            if result in FAILED_RESULTS:
+                raise ValueError(result)
+            report = self._write_report(relative_path, result)
+            status, error = 'done', None
+        except Exception as e:
+            print(f"[BatchAnalyzer] 分析 {relative_path} 失败: {type(e).__name__} - {str(e)}")
+            traceback.print_exc()
+            status, error = 'failed', str(e)
+
+        with self._lock:
+            item.update(
+                status=status,
+                report=report,
+                error=error,
+                duration_seconds=round(time.perf_counter() - started_at, 3),
+                finished_at=time.time(),
+            )
+            self._save_manifest()
+        return status
+
+    def _write_report(self, relative_path, result):
+        reports_dir = os.path.join(self.output_dir, 'reports')
+        os.makedirs(reports_dir, exist_ok=True)
+        report_name = _report_name(relative_path)
+        html = _template_env().get_template('report.html').render(
+            result=result,
+            report_id=os.path.splitext(report_name)[0],
+            report_time=datetime.now(),
+            session={'analysis_params': self.analysis_params},
+        )
+        with open(os.path.join(reports_dir, report_name), 'w', encoding='utf-8') as f:
+            f.write(html)
+        return f"reports/{report_name}"
+
+    def write_index(self):
+        """写出组合索引：index.json 供程序读取，index.html 供人工浏览"""
+        with self._lock:
+            items = [dict(item, file=relative_path) for relative_path, item in sorted(self.manifest['items'].items())]
+        counts = self.counts()
+        with open(os.path.join(self.output_dir, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump({'counts': counts, 'items': items}, f, ensure_ascii=False, indent=2)
+        html = _template_env().from_string(INDEX_TEMPLATE).render(counts=counts, items=items, generated_at=datetime.now())
+        with open(os.path.join(self.output_dir, 'index.html'), 'w', encoding='utf-8') as f:
+            f.write(html)
+
+
+_env = None
+
+
+def _template_env():
+    global _env
+    if _env is None:
+        _env = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(['html']))
+    return _env
+
+
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <title>专利组合分析索引</title>
+    <style>
+        body { font-family: -apple-system, "Microsoft YaHei", sans-serif; margin: 2em; }
+        table { border-collapse: collapse; width: 100%; }
+        th, td { border: 1px solid #ddd; padding: 6px 10px; text-align: left; }
+        .done { color: #1a7f37; } .failed { color: #cf222e; } .pending { color: #9a6700; }
+    </style>
+</head>
+<body>
+    <h1>专利组合分析索引</h1>
+    <p>共 {{ counts.total }} 个文件：完成 {{ counts.done }}，失败 {{ counts.failed }}，待处理 {{ counts.pending }}。生成时间 {{ generated_at.strftime('%Y-%m-%d %H:%M') }}</p>
+    <table>
+        <tr><th>文件</th><th>状态</th><th>报告</th><th>耗时（秒）</th><th>错误</th></tr>
+        {% for item in items %}
+        <tr>
+            <td>{{ item.file }}</td>
+            <td class="{{ item.status }}">{{ item.status }}</td>
+            <td>{% if item.report %}<a href="{{ item.report }}">查看</a>{% endif %}</td>
+            <td>{{ item.duration_seconds or '' }}</td>
+            <td>{{ item.error or '' }}</td>
+        </tr>
+        {% endfor %}
+    </table>
+</body>
+</html>
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量分析目录或 zip 中的专利 PDF，可中断后重新运行以继续")
+    parser.add_argument('source', nargs='?', help="PDF 目录或 zip 文件；续跑已有批次时可省略")
+    parser.add_argument('-o', '--output', required=True, help="输出目录（保存清单、报告和索引）")
+    parser.add_argument('-j', '--workers', type=int, default=BATCH_MAX_CONCURRENCY, help="并发分析的专利数")
+    parser.add_argument('--company-name', default='国际知名ICT企业')
+    parser.add_argument('--target-companies', default='', help="逗号分隔")
+    parser.add_argument('--exclude-companies', default='', help="逗号分隔")
+    parser.add_argument('--focus-area', default='')
+    parser.add_argument('--skip-failed', action='store_true', help="不重试之前失败的文件")
+    parser.add_argument('--incremental', action='store_true', help="分析过的专利只检索上次分析之后的新结果（定期复查）")
+    args = parser.parse_args(argv)
+
+    batch = BatchAnalyzer(
+        args.output,
+        analysis_params={
+            'company_name': args.company_name,
+            'target_companies': args.target_companies,
+            'exclude_companies': args.exclude_companies,
+            'focus_area': args.focus_area,
+            'incremental': args.incremental,
+        },
+        max_workers=args.workers,
+    )
+    if args.source:
+        batch.add_source(args.source)
+    elif not batch.manifest['items']:
+        parser.error("新的批次需要指定 source")
+    counts = batch.run(retry_failed=not args.skip_failed)
+    print(f"[BatchAnalyzer] 完成 {counts['done']}，失败 {counts['failed']}，索引: {os.path.join(args.output, 'index.html')}")
+    return 0 if counts['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,44 @@
+from agents.sqlite_cache import SQLiteCache
+
+# 按执行顺序排列的可恢复阶段
+CHECKPOINT_STAGES = ('research', 'evaluation', 'summary')
+
+
+class CheckpointStore(SQLiteCache):
+    """分析流程的阶段检查点
+
+    以 (任务 ID, 阶段) 为键保存每个阶段的产出：research 保存研究材料，evaluation 保存评估出的线索，
+    summary 保存最终报告。任务失败后用同一任务 ID 重新执行时，从最后一个成功的阶段继续。
+    每个检查点都附带专利原文的哈希，只在续跑同一篇专利时返回。
+    """
+
+    def __init__(self, db_path, ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        super().__init__(db_path, 'analysis_checkpoints', ttl_seconds, max_entries)
+
+    @staticmethod
+    def make_key(job_id, stage):
+        return f"{job_id}:{stage}"
+
+    def get(self, job_id, stage, patent_hash):
+        """返回该阶段的产出；没有检查点或检查点属于另一篇专利时返回 None"""
+        entry = self.get_value(self.make_key(job_id, stage))
+        if entry is None or entry.get('patent_hash') != patent_hash:
+            return None
+        return entry['value']
+
+    def has_other_patent(self, job_id, patent_hash):
+        """该任务是否保存过另一篇专利的检查点"""
+        entries = self.get_values([self.make_key(job_id, stage) for stage in CHECKPOINT_STAGES])
+        return any(entry.get('patent_hash') != patent_hash for entry in entries.values())
+
+    def set(self, job_id, stage, value, patent_hash):
+        self.set_value(self.make_key(job_id, stage), {'patent_hash': patent_hash, 'value': value})
+
+    def discard(self, job_id, stages=CHECKPOINT_STAGES):
+        """删除该任务指定阶段的检查点"""
+        self.delete_values([self.make_key(job_id, stage) for stage in stages])
+
+    def stages(self, job_id):
+        """返回该任务已保存检查点的阶段"""
+        entries = self.get_values([self.make_key(job_id, stage) for stage in CHECKPOINT_STAGES])
+        return [stage for stage in CHECKPOINT_STAGES if self.make_key(job_id, stage) in entries]
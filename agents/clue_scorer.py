@@ -0,0 +1,121 @@
+import argparse
+import os
+import pickle
+import re
+import threading
+
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from agents.pdf_extractor import get_pdf_extractor
+from config.settings import CLUE_SCORER_IDF_PATH
+
+# 连续的中日韩字符或连续的英文/数字（允许 LTE-A、802.11 这类带连接符的型号）
+TOKEN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]+|[a-z0-9]+(?:[-_.][a-z0-9]+)*')
+CJK_RUN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]')
+
+
+def cjk_analyzer(text):
+    """中英混合文本的分词：中文按单字和相邻双字切分，英文按词切分并去掉停用词
+
+    中文没有空格分词，按词的 TF-IDF 会把整句当成一个词；字级 n-gram 不依赖词典也能匹配技术术语。
+    """
+    tokens = []
+    for run in TOKEN_PATTERN.findall(text.lower()):
+        if CJK_RUN.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        elif run not in ENGLISH_STOP_WORDS and len(run) > 1:
+            tokens.append(run)
+    return tokens
+
+
+def _new_vectorizer():
+    return TfidfVectorizer(analyzer=cjk_analyzer, sublinear_tf=True)
+
+
+class ClueScorer:
+    """一次性计算专利与全部线索的 TF-IDF 余弦相似度
+
+    默认对 [专利, 线索...] 一起拟合 IDF；加载了预先拟合的 IDF 模型时只做 transform，
+    不同分析之间的分数可以直接比较，也省去了拟合的开销。
+    """
+
+    def __init__(self, vectorizer=None):
+        self.vectorizer = vectorizer
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(pickle.load(f))
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.vectorizer, f)
+        os.replace(tmp_path, path)
+
+    def fit(self, corpus):
+        """在一批专利/线索文本上拟合 IDF 模型，供之后的分析复用"""
+        self.vectorizer = _new_vectorizer().fit(corpus)
+        return self
+
+    def score(self, patent_text, clue_texts):
+        """返回每条线索与专利的相似度（0-100，保留两位小数），顺序与 clue_texts 一致"""
+        if not clue_texts:
+            return []
+        documents = [patent_text] + list(clue_texts)
+        try:
+            if self.vectorizer is not None:
+                matrix = self.vectorizer.transform(documents)
+            else:
+                matrix = _new_vectorizer().fit_transform(documents)
+        except ValueError:
+            # 所有文本都没有可用的词（例如全是标点）
+            return [0.0] * len(clue_texts)
+        similarities = cosine_similarity(matrix[0], matrix[1:]).ravel()
+        return [round(float(similarity) * 100, 2) for similarity in similarities]
+
+
+_default_scorer = None
+_default_scorer_lock = threading.Lock()
+
+
+def get_clue_scorer():
+    """返回进程内共享的打分器；配置了 CLUE_SCORER_IDF_PATH 且文件存在时加载预先拟合的 IDF 模型"""
+    global _default_scorer
+    with _default_scorer_lock:
+        if _default_scorer is None:
+            if CLUE_SCORER_IDF_PATH and os.path.exists(CLUE_SCORER_IDF_PATH):
+                try:
+                    _default_scorer = ClueScorer.load(CLUE_SCORER_IDF_PATH)
+                    print(f"[ClueScorer] 已加载 IDF 模型: {CLUE_SCORER_IDF_PATH}")
+                except Exception as e:
+                    print(f"[ClueScorer] 加载 IDF 模型失败，改为每次分析单独拟合: {str(e)}")
+            if _default_scorer is None:
+                _default_scorer = ClueScorer()
+        return _default_scorer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在一批专利文本上拟合 IDF 模型，供线索相似度打分复用")
+    parser.add_argument('files', nargs='+', help="PDF 或 UTF-8 文本文件")
+    parser.add_argument('-o', '--output', default=CLUE_SCORER_IDF_PATH, required=not CLUE_SCORER_IDF_PATH)
+    args = parser.parse_args(argv)
+
+    corpus = []
+    for path in args.files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        text = get_pdf_extractor().extract(data) if path.lower().endswith('.pdf') else data.decode('utf-8', errors='ignore')
+        if text:
+            corpus.append(text)
+    ClueScorer().fit(corpus).save(args.output)
+    print(f"[ClueScorer] 已基于 {len(corpus)} 篇文本拟合 IDF 模型: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
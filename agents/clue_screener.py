@@ -0,0 +1,52 @@
+from collections import Counter
+
+from agents.clue_scorer import get_clue_scorer
+from agents.patent_segmenter import segment_patent
+from agents.search_dedup import dedup_research_materials
+from config.settings import CLUE_TOP_K, CLUE_MIN_SCORE
+
+
+def screen_clues(research_materials, top_k=CLUE_TOP_K, min_score=CLUE_MIN_SCORE):
+    """评估前的本地预筛：使用去重后的搜索结果，按与权利要求的相似度排序，只保留前 top_k 条
+
+    结果写入 research_materials：
+        screened_clues  送入评估的线索 [{snippet, link, title, query, queries, links, similarity}]
+        screening       预筛统计，以及每条被剔除线索的链接、来源查询、相似度和原因，便于审计
+    """
+    if 'documents' not in research_materials:
+        dedup_research_materials(research_materials)
+    dedup = research_materials['dedup']
+    unique = [dict(document) for document in research_materials['documents']]
+    dropped = [{'link': item['link'], 'query': item['query'], 'similarity': None, 'reason': 'duplicate'}
+               for item in dedup['duplicates']]
+
+    claims = segment_patent(research_materials['original_text'])['claims']
+    patent_text = "\n".join(claims) if claims else research_materials['original_text']
+    scores = get_clue_scorer().score(patent_text, [f"{clue.get('title', '')} {clue['snippet']}" for clue in unique])
+    for clue, score in zip(unique, scores):
+        clue['similarity'] = score
+
+    ranked = sorted(unique, key=lambda clue: clue['similarity'], reverse=True)
+    kept = []
+    for clue in ranked:
+        if clue['similarity'] < min_score:
+            reason = 'below_min_score'
+        elif len(kept) >= top_k:
+            reason = 'beyond_top_k'
+        else:
+            kept.append(clue)
+            continue
+        dropped.append({'link': clue.get('link', ''), 'query': clue['query'], 'similarity': clue['similarity'], 'reason': reason})
+
+    research_materials['screened_clues'] = kept
+    research_materials['screening'] = {
+        'total': dedup['total'],
+        'unique': len(unique),
+        'kept': len(kept),
+        'top_k': top_k,
+        'min_score': min_score,
+        'dropped_by_reason': dict(Counter(item['reason'] for item in dropped)),
+        'dropped': dropped,
+    }
+    print(f"[ClueScreener] 共 {dedup['total']} 条搜索结果，去重后 {len(unique)} 条，送评估 {len(kept)} 条")
+    return kept
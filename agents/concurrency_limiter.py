@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from agents.metrics import LLM_CONCURRENCY_LIMIT, LLM_CONCURRENCY_IN_FLIGHT, LLM_CONCURRENCY_QUEUE_DEPTH
+
+# 说明网关已经过载的错误：出现时并发上限减半
+OVERLOAD_ERRORS = ('rate_limit', 'timeout')
+# 每个阶段至少有这么多次成功调用后才用耗时判断是否过载
+MIN_LATENCY_SAMPLES = 5
+LATENCY_SMOOTHING = 0.1
+# 比基线慢不到这么多秒时不算耗时突增，避免很短的调用因抖动误判
+MIN_LATENCY_SPIKE_SECONDS = 1.0
+
+
+class _Waiter:
+    """排队等待名额的调用方；名额由释放方在持有锁时直接转交（granted 置为 True 后再唤醒）"""
+
+    def __init__(self, loop=None):
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdaptiveConcurrencyLimiter:
+    """按 AIMD 自适应调整同时在途的模型调用数，同一端点的全部同步/异步适配器共享一个
+
+    每次成功调用上限增加 1/limit（约每轮增加 1）；遇到 429、超时，或耗时超过该阶段平滑基线的
+    latency_tolerance 倍时上限减半。过载开始前已发出的调用返回的过载信号只算一次，避免一次拥塞连续减半。
+    超出上限的调用按先来先到排队。
+    """
+
+    def __init__(self, name, initial_limit=8, min_limit=1, max_limit=64, latency_tolerance=2.0):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.in_flight = 0
+        self._waiters = deque()
+        self._baselines = {}  # stage -> (平滑耗时, 样本数)
+        self._last_decrease_at = float('-inf')
+        self._lock = threading.Lock()
+        self._update_metrics()
+
+    def _update_metrics(self):
+        """调用方需持有锁"""
+        LLM_CONCURRENCY_LIMIT.set(int(self.limit), endpoint=self.name)
+        LLM_CONCURRENCY_IN_FLIGHT.set(self.in_flight, endpoint=self.name)
+        LLM_CONCURRENCY_QUEUE_DEPTH.set(len(self._waiters), endpoint=self.name)
+
+    def _try_acquire(self):
+        """调用方需持有锁；有空闲名额且无人排队时占用一个名额"""
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self._update_metrics()
+            return True
+        return False
+
+    def acquire(self):
+        """阻塞直到获得名额，返回开始时间，调用结束后需传给 release"""
+        with self._lock:
+            if self._try_acquire():
+                return time.monotonic()
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+            self._update_metrics()
+        waiter.event.wait()
+        return time.monotonic()
+
+    async def acquire_async(self):
+        """acquire 的异步版本，排队期间不阻塞事件循环；被取消时归还已转交的名额"""
+        with self._lock:
+            if self._try_acquire():
+                return time.monotonic()
+            waiter = _Waiter(asyncio.get_running_loop())
+            self._waiters.append(waiter)
+            self._update_metrics()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self.in_flight -= 1
+                    self._wake_waiters()
+                else:
+                    self._waiters.remove(waiter)
+                self._update_metrics()
+            raise
+        return time.monotonic()
+
+    def _wake_waiters(self):
+        """调用方需持有锁；把空出的名额依次转交给排队的调用方"""
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.in_flight += 1
+            try:
+                waiter.wake()
+            except RuntimeError:
+                # 等待方的事件循环已关闭，名额收回
+                self.in_flight -= 1
+
+    def _decrease(self, started_at, reason):
+        """调用方需持有锁；上次减半之前发出的调用不再触发减半"""
+        if started_at < self._last_decrease_at:
+            return
+        self._last_decrease_at = time.monotonic()
+        self.limit = max(float(self.min_limit), self.limit / 2)
+        print(f"[ConcurrencyLimiter] {self.name} {reason}，并发上限降至 {int(self.limit)}")
+
+    def release(self, started_at, stage='unknown', error_class=None):
+        """释放名额并调整上限；error_class 为 None 表示调用成功"""
+        latency = time.monotonic() - started_at
+        with self._lock:
+            self.in_flight -= 1
+            if error_class in OVERLOAD_ERRORS:
+                self._decrease(started_at, f"{error_class} 错误")
+            elif error_class is None:
+                baseline, samples = self._baselines.get(stage, (latency, 0))
+                if (samples >= MIN_LATENCY_SAMPLES and latency > baseline * self.latency_tolerance
+                        and latency - baseline > MIN_LATENCY_SPIKE_SECONDS):
+                    self._decrease(started_at, f"{stage} 耗时 {latency:.1f}s 超过基线 {baseline:.1f}s 的 {self.latency_tolerance} 倍")
+                else:
+                    self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+                self._baselines[stage] = (baseline + LATENCY_SMOOTHING * (latency - baseline), samples + 1)
+            self._wake_waiters()
+            self._update_metrics()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_concurrency_limiter(name, initial_limit=8, min_limit=1, max_limit=64, latency_tolerance=2.0):
+    """返回端点对应的进程内共享限流器"""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = AdaptiveConcurrencyLimiter(name, initial_limit, min_limit, max_limit, latency_tolerance)
+            _limiters[name] = limiter
+        return limiter
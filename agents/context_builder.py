@@ -0,0 +1,173 @@
+import re
+from functools import lru_cache
+
+from agents.metrics import CONTEXT_PROMPT_TOKENS, CONTEXT_DROPPED_TOKENS
+from agents.patent_segmenter import condense_patent, TRUNCATION_NOTE
+from config.settings import MODEL_CONFIG, MODEL_CONTEXT_WINDOW, CONTEXT_BUDGET_RATIOS
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 为可选依赖，未安装时按字符类别估算
+    tiktoken = None
+
+# 每个部分的格式开销（消息 role、标题和分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+class TiktokenTokenizer:
+    def __init__(self, model_name):
+        try:
+            self.encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            # 非 OpenAI 模型（qwen、deepseek 等）没有官方编码，用 cl100k_base 近似
+            self.encoding = tiktoken.get_encoding('cl100k_base')
+
+    def count(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+
+
+class EstimatingTokenizer:
+    """不依赖词表的估算：中日韩字符约 1 token/字，其余字符约 4 字符/token，估算值偏保守"""
+
+    def count(self, text):
+        cjk = len(CJK_PATTERN.findall(text))
+        return cjk + -(-(len(text) - cjk) // 4)
+
+    def truncate(self, text, max_tokens):
+        if self.count(text) <= max_tokens:
+            return text
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model_name=None):
+    """返回模型对应的分词器，按模型名缓存，加载词表的开销只发生一次"""
+    if tiktoken is not None:
+        try:
+            return TiktokenTokenizer(model_name or "")
+        except Exception as e:
+            print(f"[ContextBuilder] 加载 tiktoken 编码失败，改为估算 token 数: {str(e)}")
+    return EstimatingTokenizer()
+
+
+@lru_cache(maxsize=256)
+def count_tokens(text, model_name=None):
+    """计算文本的 token 数；系统提示词等重复出现的文本直接命中缓存"""
+    return get_tokenizer(model_name).count(text)
+
+
+def stage_budget(stage, context_window=None):
+    """某阶段初始 prompt 可用的 token 数：上下文窗口按比例分配，其余留给输出和后续对话轮次"""
+    return int((context_window or MODEL_CONTEXT_WINDOW) * CONTEXT_BUDGET_RATIOS.get(stage, 0.5))
+
+
+def truncate_text(text, max_tokens, model_name=None):
+    tokenizer = get_tokenizer(model_name)
+    note_tokens = tokenizer.count(TRUNCATION_NOTE)
+    if tokenizer.count(text) <= max_tokens:
+        return text
+    if max_tokens <= note_tokens:
+        return ""
+    return tokenizer.truncate(text, max_tokens - note_tokens) + TRUNCATION_NOTE
+
+
+def shrink_patent(text, max_tokens, model_name=None):
+    """按权利要求优先的规则压缩专利文本到 max_tokens 以内"""
+    tokenizer = get_tokenizer(model_name)
+    tokens = tokenizer.count(text)
+    if tokens <= max_tokens:
+        return text
+    max_chars = int(len(text) * max_tokens / tokens)
+    for _ in range(5):
+        condensed = condense_patent(text, max_chars)
+        if tokenizer.count(condensed) <= max_tokens:
+            return condensed
+        max_chars = int(max_chars * 0.9)
+    return truncate_text(text, max_tokens, model_name)
+
+
+class ContextBuilder:
+    """按优先级把 prompt 的各部分装入某阶段的 token 预算
+
+    每个部分可以是一段文本，也可以是条目列表（items）：文本超出预算时用 shrink 压缩，
+    条目列表超出预算时按顺序保留能放下的条目。priority 越小越先分配预算，输出仍按添加顺序。
+    build() 返回 {名称: 装入后的文本}，装入情况记录在 report 中并输出到日志和指标。
+    """
+
+    def __init__(self, stage, budget=None, model_name=None):
+        self.stage = stage
+        self.model_name = model_name or MODEL_CONFIG.get("model_name")
+        self.budget = budget if budget is not None else stage_budget(stage)
+        self.sections = []
+        self.report = None
+
+    def count(self, text):
+        return count_tokens(text, self.model_name)
+
+    def add(self, name, text=None, items=None, priority=1, shrink=None, separator="\n", max_share=None):
+        """max_share 限制该部分最多占用预算的比例，避免高优先级的长文本挤掉其余部分"""
+        self.sections.append({
+            'name': name,
+            'text': text or "",
+            'items': items,
+            'priority': priority,
+            'shrink': shrink or truncate_text,
+            'separator': separator,
+            'max_share': max_share,
+        })
+        return self
+
+    def build(self):
+        remaining = self.budget
+        packed = {}
+        report = {'stage': self.stage, 'budget': self.budget, 'used': 0, 'dropped': {}}
+
+        for section in sorted(self.sections, key=lambda section: section['priority']):
+            name = section['name']
+            available = max(0, remaining - MESSAGE_OVERHEAD_TOKENS)
+            if section['max_share'] is not None:
+                available = min(available, int(self.budget * section['max_share']))
+            if section['items'] is not None:
+                kept = []
+                used = 0
+                separator_tokens = self.count(section['separator'])
+                for item in section['items']:
+                    item_tokens = self.count(item) + (separator_tokens if kept else 0)
+                    if used + item_tokens > available:
+                        break
+                    kept.append(item)
+                    used += item_tokens
+                packed[name] = section['separator'].join(kept)
+                full_tokens = self.count(section['separator'].join(section['items']))
+                if len(kept) < len(section['items']):
+                    report['dropped'][name] = {'tokens': full_tokens - used, 'items': len(section['items']) - len(kept)}
+            else:
+                full_tokens = self.count(section['text'])
+                if full_tokens <= available:
+                    packed[name], used = section['text'], full_tokens
+                else:
+                    packed[name] = section['shrink'](section['text'], available, self.model_name)
+                    used = self.count(packed[name])
+                    report['dropped'][name] = {'tokens': full_tokens - used}
+            remaining -= used + MESSAGE_OVERHEAD_TOKENS
+            report['used'] += used + MESSAGE_OVERHEAD_TOKENS
+
+        CONTEXT_PROMPT_TOKENS.observe(report['used'], stage=self.stage)
+        for name, dropped in report['dropped'].items():
+            CONTEXT_DROPPED_TOKENS.inc(dropped['tokens'], stage=self.stage, section=name)
+        if report['dropped']:
+            print(f"[ContextBuilder] {self.stage} 阶段超出预算 {self.budget} tokens，已压缩/丢弃: {report['dropped']}")
+        self.report = report
+        return {name: packed[name] for name in (section['name'] for section in self.sections)}
@@ -0,0 +1,128 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import MODEL_CONFIG, PATENT_CONTEXT_MAX_CHARS, PATENT_CHUNK_CHARS, PATENT_MAP_REDUCE_ENABLED, PATENT_MAP_MAX_CONCURRENCY
+from agents.model_adapter import get_model_adapter, get_async_model_adapter
+from agents.patent_segmenter import chunk_patent, condense_patent, segment_patent, is_independent_claim
+from agents.progress import report_progress
+from agents.context_builder import ContextBuilder
+
+MAP_PROMPT = """你是专利分析助手。下面是一篇专利文件的第{index}/{total}部分（{kind}）。
+请完整提取这一部分中的全部技术特征：
+- 权利要求保留编号，并尽量保留原文措辞，注明是独立还是从属权利要求；
+- 说明书只保留技术方案、关键参数、实施例和所解决的技术问题，省略背景介绍和套话；
+- 不要评价、不要推测，不要输出与本部分无关的内容。"""
+
+REDUCE_PROMPT = """你是专利分析助手。下面是同一篇专利各部分的要点，请合并为一份完整的专利技术要点：
+去除重复内容，保留全部独立权利要求和关键技术特征，按"权利要求要点、技术方案、实施例"组织，总长度不超过{max_chars}字。"""
+
+KIND_NAMES = {'abstract': '摘要', 'claims': '权利要求', 'description': '说明书'}
+
+# 所有 DigestAgent 共享的线程池，限制整个进程同时进行的分块模型调用数
+digest_executor = ThreadPoolExecutor(max_workers=PATENT_MAP_MAX_CONCURRENCY, thread_name_prefix='patent-digest')
+
+
+class DigestAgent:
+    """为超长专利构造可放入 prompt 的上下文
+
+    原文不超过 max_chars 或未开启 map-reduce 时原样返回，由各阶段的 ContextBuilder 按 token 预算压缩；
+    否则按权利要求/摘要/说明书分块，各块并发交给模型提取技术要点（map），再合并为一份上下文（reduce）。
+    全部分块失败时退回到按重要性保留内容的 condense_patent。
+    """
+
+    def __init__(self, max_chars=PATENT_CONTEXT_MAX_CHARS, chunk_chars=PATENT_CHUNK_CHARS, map_reduce=PATENT_MAP_REDUCE_ENABLED):
+        self.model_adapter = get_model_adapter(MODEL_CONFIG)
+        self.max_chars = max_chars
+        self.chunk_chars = chunk_chars
+        self.map_reduce = map_reduce
+
+    def _model_kwargs(self):
+        return {"model": MODEL_CONFIG.get("model_name"), "temperature": 0.2, "stage": "digest"}
+
+    def _map_messages(self, chunk, index, total):
+        prompt = MAP_PROMPT.format(index=index + 1, total=total, kind=KIND_NAMES[chunk['kind']])
+        context = ContextBuilder('digest').add('system', prompt, priority=0).add('chunk', chunk['text'], priority=1).build()
+        return [{"role": "system", "content": context['system']}, {"role": "user", "content": context['chunk']}]
+
+    def _reduce_messages(self, partial_notes):
+        return [
+            {"role": "system", "content": REDUCE_PROMPT.format(max_chars=self.max_chars)},
+            {"role": "user", "content": "\n\n".join(partial_notes)}
+        ]
+
+    @staticmethod
+    def _content(response):
+        if not response:
+            return None
+        return response.choices[0].message.content or None
+
+    def _plan(self, patent_text):
+        """返回需要交给模型的分块；原文足够短或未开启 map-reduce 时返回 None"""
+        if len(patent_text) <= self.max_chars or not self.map_reduce:
+            return None
+        return chunk_patent(patent_text, self.chunk_chars)
+
+    def _merge(self, patent_text, partial_notes):
+        """把各块要点按原文顺序拼接，独立权利要求原文放在最前；仍超长时需要 reduce 则返回 None"""
+        notes = [f"### 第{index + 1}部分要点\n{note}" for index, note in enumerate(partial_notes) if note]
+        if not notes:
+            return condense_patent(patent_text, self.max_chars)
+
+        independent = [claim for claim in segment_patent(patent_text)['claims'] if is_independent_claim(claim)]
+        independent_text = "\n".join(independent)
+        if len(independent_text) > self.max_chars // 2:
+            independent_text = ""
+        context = "\n\n".join(
+            ([f"独立权利要求原文：\n{independent_text}"] if independent_text else []) + notes
+        )
+        return context if len(context) <= self.max_chars else None
+
+    def build_context(self, patent_text, progress_callback=None):
+        chunks = self._plan(patent_text)
+        if chunks is None:
+            return patent_text
+
+        report_progress(progress_callback, 'digest', chunks=len(chunks))
+        futures = [
+            digest_executor.submit(
+                self.model_adapter.get_response, self._map_messages(chunk, index, len(chunks)), **self._model_kwargs()
+            )
+            for index, chunk in enumerate(chunks)
+        ]
+        partial_notes = [self._content(future.result()) for future in futures]
+
+        context = self._merge(patent_text, partial_notes)
+        if context is None:
+            report_progress(progress_callback, 'digest_reduce')
+            reduced = self._content(self.model_adapter.get_response(
+                self._reduce_messages([note for note in partial_notes if note]), **self._model_kwargs()
+            ))
+            context = reduced[:self.max_chars] if reduced else condense_patent(patent_text, self.max_chars)
+        return context
+
+    async def build_context_async(self, patent_text, progress_callback=None):
+        """build_context 的异步版本，各块在当前事件循环中并发请求"""
+        chunks = self._plan(patent_text)
+        if chunks is None:
+            return patent_text
+
+        model_adapter = get_async_model_adapter(MODEL_CONFIG)
+        semaphore = asyncio.Semaphore(PATENT_MAP_MAX_CONCURRENCY)
+
+        async def map_chunk(index, chunk):
+            async with semaphore:
+                return self._content(await model_adapter.get_response(
+                    self._map_messages(chunk, index, len(chunks)), **self._model_kwargs()
+                ))
+
+        report_progress(progress_callback, 'digest', chunks=len(chunks))
+        partial_notes = await asyncio.gather(*(map_chunk(index, chunk) for index, chunk in enumerate(chunks)))
+
+        context = self._merge(patent_text, partial_notes)
+        if context is None:
+            report_progress(progress_callback, 'digest_reduce')
+            reduced = self._content(await model_adapter.get_response(
+                self._reduce_messages([note for note in partial_notes if note]), **self._model_kwargs()
+            ))
+            context = reduced[:self.max_chars] if reduced else condense_patent(patent_text, self.max_chars)
+        return context
@@ -0,0 +1,57 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from agents.sqlite_cache import SQLiteCache
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def save_upload(file_storage, upload_folder, extension='.pdf'):
+    """按内容哈希保存上传的文件，返回保存后的文件名（<sha256><extension>）
+
+    先边写临时文件边计算哈希，再原子地改名；同一内容已存在时直接丢弃临时文件，
+    因此同名的不同文件不会互相覆盖，重复上传的文件也只保存一份。
+    """
+    os.makedirs(upload_folder, exist_ok=True)
+    sha256 = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in iter(lambda: file_storage.stream.read(HASH_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+                tmp.write(chunk)
+        filename = sha256.hexdigest() + extension
+        path = os.path.join(upload_folder, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        return filename
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class DocumentTextStore(SQLiteCache):
+    """以文件内容的 SHA-256 为键保存提取出的全文及元数据（页数、提取后端、提取耗时等）"""
+
+    def __init__(self, db_path, ttl_seconds=365 * 24 * 3600, max_entries=20000):
+        super().__init__(db_path, 'document_text', ttl_seconds, max_entries)
+
+    def get(self, digest):
+        """返回 {text, page_count, backend, extraction_seconds, size, extracted_at}，未命中时返回 None"""
+        return self.get_value(digest)
+
+    def set(self, digest, text, **metadata):
+        self.set_value(digest, {'text': text, 'extracted_at': time.time(), **metadata})
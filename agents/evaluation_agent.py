@@ -1,14 +1,16 @@
 import yaml
 from openai import OpenAI
 # from config.settings import OPENAI_API_KEY, OPENAI_BASE_URL # Remove this line
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from datetime import datetime
 import re
 from prompts.prompt_templates import get_customized_prompt
 # from config.settings import OPENAI_API_KEY, OPENAI_BASE_URL
 from config.settings import MODEL_CONFIG # 修改导入
-from agents.model_adapter import get_model_adapter # 导入适配器工厂函数
+from agents.model_adapter import get_model_adapter, get_async_model_adapter # 导入适配器工厂函数
+from agents.progress import report_progress
+from agents.context_builder import ContextBuilder, shrink_patent
+from agents.clue_scorer import get_clue_scorer
+from agents.patent_segmenter import segment_patent
 
 class EvaluationAgent:
     def __init__(self):
@@ -23,11 +25,21 @@ class EvaluationAgent:
 
     def calculate_match_score(self, patent_claims, clue_text):
         """计算技术特征匹配度得分（基于TF - IDF算法）"""
-        texts = [patent_claims, clue_text]
-        vectorizer = TfidfVectorizer(stop_words='english')
-        tfidf_matrix = vectorizer.fit_transform(texts)
-        similarity = cosine_similarity(tfidf_matrix[0], tfidf_matrix[1])[0][0]
-        return round(similarity * 100, 2)
+        return get_clue_scorer().score(patent_claims, [clue_text])[0]
+
+    @staticmethod
+    def _claims_text(research_materials):
+        """用于相似度打分的专利文本：优先使用权利要求"""
+        claims = segment_patent(research_materials['original_text'])['claims']
+        return "\n".join(claims) if claims else research_materials['original_text']
+
+    def score_clues(self, research_materials):
+        """一次计算全部搜索结果与专利权利要求的相似度，写入每条结果的 similarity 字段"""
+        search_results = research_materials.get('search_results', [])
+        scores = get_clue_scorer().score(self._claims_text(research_materials), [result.get('result', '') for result in search_results])
+        for result, score in zip(search_results, scores):
+            result['similarity'] = score
+        return scores
 
     def validate_time_validity(self, clue_pub_date, target_filing_date):
         """验证公开时间有效性"""
@@ -38,22 +50,42 @@ class EvaluationAgent:
         except:
             return False
 
-    def generate_evaluation_prompt(self, research_materials):
-        """构建评估用对话上下文"""
-        target_patent_text = research_materials['original_text']
-        max_len = 15000
-        if len(target_patent_text) > max_len:
-            target_patent_text = target_patent_text[:max_len] + "\n... (truncated due to length)"
-
-        clues = [f"线索{i + 1}: {clue['result']}" for i, clue in enumerate(research_materials['search_results'])]
+    def generate_evaluation_prompt(self, research_materials, evaluation_prompt=""):
+        """构建评估用对话上下文，专利内容和线索按评估阶段的 token 预算装入"""
+        if 'screened_clues' in research_materials:
+            # 已经过本地预筛：逐条列出相似度最高的线索
+            clues = [
+                f"线索{i + 1}: {clue['snippet']} [URL: {clue.get('link', '')}]\n（本地文本相似度：{clue['similarity']}）"
+                for i, clue in enumerate(research_materials['screened_clues'])
+            ]
+        elif 'documents' in research_materials:
+            # 未预筛但已去重：每个文档只列出一次，并给出命中它的查询
+            documents = research_materials['documents']
+            scores = get_clue_scorer().score(self._claims_text(research_materials),
+                                             [f"{document['title']} {document['snippet']}" for document in documents])
+            clues = [
+                f"线索{i + 1}: {document['snippet']} [URL: {document['link']}]\n（本地文本相似度：{score}；命中查询：{'、'.join(document['queries'])}）"
+                for i, (document, score) in enumerate(zip(documents, scores))
+            ]
+        else:
+            self.score_clues(research_materials)
+            clues = [
+                f"线索{i + 1}: {clue['result']}\n（本地文本相似度：{clue['similarity']}）"
+                for i, clue in enumerate(research_materials['search_results'])
+            ]
+        context = ContextBuilder('evaluation') \
+            .add('system', evaluation_prompt, priority=0) \
+            .add('clues', items=clues, priority=1, max_share=0.5) \
+            .add('patent', research_materials.get('patent_context') or research_materials['original_text'],
+                 priority=2, shrink=shrink_patent) \
+            .build()
         return f"""目标专利内容：
-{target_patent_text}
+{context['patent']}
 
 待评估侵权线索：
-{chr(10).join(clues)}"""
+{context['clues']}"""
 
-    def conduct_evaluation(self, research_materials, evaluation_prompt=None, **kwargs):
-        """多轮评估主流程"""
+    def _start_evaluation(self, research_materials, evaluation_prompt):
         # 如果没有提供自定义 prompt，则使用默认 prompt
         if evaluation_prompt is None:
             evaluation_prompt = get_customized_prompt('evaluation')
@@ -63,40 +95,69 @@ class EvaluationAgent:
         # 第一轮：初步评估
         messages.append({
             "role": "user",
-            "content": self.generate_evaluation_prompt(research_materials)
+            "content": self.generate_evaluation_prompt(research_materials, evaluation_prompt)
         })
+        return messages
+
+    def _model_kwargs(self):
+        return {
+            "model": MODEL_CONFIG.get("model_name"),
+            "temperature": 0.3,  # 降低创造性，确保严谨性
+            "stage": "evaluation"
+        }
+
+    def _handle_reply(self, messages, assistant_msg, **kwargs):
+        """处理一轮模型回复：需要追问时追加对话并返回 None，否则返回解析后的评估结果"""
+        # 提取评估结果或追问问题
+        if "请提供" in assistant_msg.content:
+            # 触发追问，要求用户补充信息（实际场景中可对接企业知识库）
+            messages.append({"role": "assistant", "content": assistant_msg.content}) # Corrected line
+            # 模拟用户回复（实际需对接前端交互）
+            user_reply = "线索A的公开日为2024-05-15，实施地在中国广东"
+            messages.append({"role": "user", "content": user_reply})
+            return None
+        # 解析评估报告
+        return self.parse_evaluation_result(assistant_msg.content, **kwargs) # 将kwargs传递下去
+
+    def conduct_evaluation(self, research_materials, evaluation_prompt=None, **kwargs):
+        """多轮评估主流程"""
+        messages = self._start_evaluation(research_materials, evaluation_prompt)
 
+        progress_callback = kwargs.pop('progress_callback', None)
         max_rounds = 3
-        for _ in range(max_rounds):
-            # response = self.client.chat.completions.create(
-            #     model="deepseek-chat", # 这个模型名也应该来自配置
-            #     messages=messages,
-            #     temperature=0.3  # 降低创造性，确保严谨性
-            # )
-            response = self.model_adapter.get_response(
-                messages,
-                model=MODEL_CONFIG.get("model_name"), 
-                temperature=0.3
-            )
+        for round_index in range(max_rounds):
+            report_progress(progress_callback, 'evaluation_round', round=round_index + 1, max_rounds=max_rounds)
+            response = self.model_adapter.get_response(messages, **self._model_kwargs())
             if not response: # 检查适配器调用是否成功
                 print("Failed to get response from model adapter in EvaluationAgent.")
                 return [] # 或者进行其他错误处理
-            assistant_msg = response.choices[0].message
-
-            # 提取评估结果或追问问题
-            if "请提供" in assistant_msg.content:
-                # 触发追问，要求用户补充信息（实际场景中可对接企业知识库）
-                messages.append({"role": "assistant", "content": assistant_msg.content}) # Corrected line
-                # 模拟用户回复（实际需对接前端交互）
-                user_reply = "线索A的公开日为2024-05-15，实施地在中国广东"
-                messages.append({"role": "user", "content": user_reply})
-            else:
-                # 解析评估报告
-                evaluated_clues = self.parse_evaluation_result(assistant_msg.content, **kwargs) # 将kwargs传递下去
+
+            evaluated_clues = self._handle_reply(messages, response.choices[0].message, **kwargs)
+            if evaluated_clues is not None:
                 return evaluated_clues  # 评估完成
 
         return None  # 超过最大轮次
 
+    async def conduct_evaluation_async(self, research_materials, evaluation_prompt=None, **kwargs):
+        """conduct_evaluation 的异步版本"""
+        model_adapter = get_async_model_adapter(MODEL_CONFIG)
+        messages = self._start_evaluation(research_materials, evaluation_prompt)
+
+        progress_callback = kwargs.pop('progress_callback', None)
+        max_rounds = 3
+        for round_index in range(max_rounds):
+            report_progress(progress_callback, 'evaluation_round', round=round_index + 1, max_rounds=max_rounds)
+            response = await model_adapter.get_response(messages, **self._model_kwargs())
+            if not response:
+                print("Failed to get response from model adapter in EvaluationAgent.")
+                return []
+
+            evaluated_clues = self._handle_reply(messages, response.choices[0].message, **kwargs)
+            if evaluated_clues is not None:
+                return evaluated_clues
+
+        return None
+
     def parse_evaluation_result(self, content, **kwargs): # 添加**kwargs以接收target_companies
         """解析模型返回的结构化评估结果"""
         pattern = r"线索(\d+):\n+匹配度得分：(\d+\.\d+)分\n+法律风险等级：(\w+)\n+证据链完整性：(.*?)\n+"
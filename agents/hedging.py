@@ -0,0 +1,68 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import MODEL_HEDGE_MAX_WORKERS
+
+# 对冲请求在线程池中执行（主请求在调用方线程执行，不占用该线程池），胜出方确定后落后方的连接被关闭
+hedge_executor = ThreadPoolExecutor(max_workers=MODEL_HEDGE_MAX_WORKERS, thread_name_prefix='model-hedge')
+
+
+class HedgePolicy:
+    """对冲请求的触发时机和预算，同一组端点的同步/异步适配器共享
+
+    每个阶段保留最近 window 次调用的首个 chunk 的时间，超过其 percentile 分位数（不低于 min_delay 秒）
+    仍未收到首个 chunk 时才发出对冲请求；样本少于 min_samples 时不对冲。
+    预算为令牌桶：每次调用存入 budget_ratio 个令牌（最多 burst 个），每次对冲消耗 1 个，
+    因此对冲请求长期不超过全部调用的 budget_ratio。
+    """
+
+    def __init__(self, percentile=95, min_delay=1.0, budget_ratio=0.1, min_samples=20, window=200, burst=10):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.window = window
+        self.burst = burst
+        self._samples = {}
+        self._tokens = float(burst)
+        self._lock = threading.Lock()
+
+    def record_ttft(self, stage, seconds):
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def hedge_delay(self, stage):
+        """返回发出对冲请求前等待首个 chunk 的秒数，样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return max(self.min_delay, samples[index])
+
+    def on_request(self):
+        with self._lock:
+            self._tokens = min(float(self.burst), self._tokens + self.budget_ratio)
+
+    def try_hedge(self):
+        """预算允许时消耗一个令牌并返回 True"""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+_hedge_policies = {}
+_hedge_policies_lock = threading.Lock()
+
+
+def get_hedge_policy(name, **kwargs):
+    """返回端点（或一组端点）对应的进程内共享对冲策略"""
+    with _hedge_policies_lock:
+        policy = _hedge_policies.get(name)
+        if policy is None:
+            policy = HedgePolicy(**kwargs)
+            _hedge_policies[name] = policy
+        return policy
@@ -0,0 +1,193 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# 总结 token 先在任务内缓冲，攒够这么多字符或距缓冲开始超过这么多秒时合并成一个 token 事件
+TOKEN_FLUSH_CHARS = 200
+TOKEN_FLUSH_SECONDS = 0.2
+
+
+class JobQueueFullError(Exception):
+    """等待中的任务数已达上限"""
+    pass
+
+
+class Job:
+    """一个后台分析任务及其状态"""
+
+    def __init__(self, job_id, func, args, kwargs):
+        self.job_id = job_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = 'pending'  # pending / running / done / failed
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # 进度事件日志，供 SSE 推送；事件 id 递增，任务结束后 token 事件被移除，id 不再与下标对应
+        self.events = []
+        self._next_event_id = 0
+        self._token_buffer = []
+        self._token_buffer_chars = 0
+        self._token_buffer_started_at = None
+        self._events_cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def publish(self, event, **data):
+        """记录一个进度事件并唤醒等待中的订阅者
+
+        token 事件先缓冲，按 TOKEN_FLUSH_CHARS / TOKEN_FLUSH_SECONDS 合并后再发布；
+        发布其他事件前先发布已缓冲的 token，保证顺序不变。
+        """
+        with self._events_cond:
+            if event == 'token':
+                self._buffer_token(data.get('content') or '')
+            else:
+                self._flush_tokens()
+                self._append(event, data)
+            self._events_cond.notify_all()
+
+    def finish(self, status, event, **data):
+        """原子地更新终态并发布最后一个事件，保证订阅者看到结束状态时也能收到该事件
+
+        结束后完整结果已保存在 result 中，token 事件随之移除，已完成任务只保留阶段事件供晚到的订阅者查看。
+        """
+        with self._events_cond:
+            self.finished_at = time.time()
+            self.status = status
+            self._flush_tokens()
+            self._append(event, data)
+            self.events = [e for e in self.events if e['event'] != 'token']
+            self._events_cond.notify_all()
+
+    def wait_for_events(self, after_id, timeout=None):
+        """等待 id 大于 after_id 的新事件，返回 (新事件列表, 任务是否已结束)
+
+        模型输出停顿时不会再有 publish 触发刷新，因此等待期间缓冲的 token 超过 TOKEN_FLUSH_SECONDS 也会被发布。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._events_cond:
+            while True:
+                self._flush_stale_tokens()
+                if self._next_event_id > after_id + 1 or self.finished:
+                    break
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                wait = None if deadline is None else deadline - now
+                if self._token_buffer_started_at is not None:
+                    flush_in = max(0.0, self._token_buffer_started_at + TOKEN_FLUSH_SECONDS - now)
+                    wait = flush_in if wait is None else min(wait, flush_in)
+                self._events_cond.wait(wait)
+            return [e for e in self.events if e['id'] > after_id], self.finished
+
+    def _append(self, event, data):
+        """调用方需持有锁"""
+        self.events.append({'id': self._next_event_id, 'event': event, 'data': data})
+        self._next_event_id += 1
+
+    def _buffer_token(self, content):
+        """调用方需持有锁"""
+        if self._token_buffer_started_at is None:
+            self._token_buffer_started_at = time.monotonic()
+        self._token_buffer.append(content)
+        self._token_buffer_chars += len(content)
+        if (self._token_buffer_chars >= TOKEN_FLUSH_CHARS
+                or time.monotonic() - self._token_buffer_started_at >= TOKEN_FLUSH_SECONDS):
+            self._flush_tokens()
+
+    def _flush_stale_tokens(self):
+        """调用方需持有锁；缓冲时间超过 TOKEN_FLUSH_SECONDS 时发布缓冲的 token"""
+        if (self._token_buffer_started_at is not None
+                and time.monotonic() - self._token_buffer_started_at >= TOKEN_FLUSH_SECONDS):
+            self._flush_tokens()
+
+    def _flush_tokens(self):
+        """调用方需持有锁；把缓冲的 token 合并成一个 token 事件"""
+        if self._token_buffer:
+            self._append('token', {'content': ''.join(self._token_buffer)})
+        self._token_buffer = []
+        self._token_buffer_chars = 0
+        self._token_buffer_started_at = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """有界的进程内任务队列，由固定大小的线程池执行"""
+
+    def __init__(self, max_workers=2, max_pending=20, max_finished=200, name='analysis-job'):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, job_id=None, **kwargs):
+        """提交任务并立即返回 Job；等待队列已满时抛出 JobQueueFullError
+
+        任务函数会额外收到 progress_callback 关键字参数，调用它即可向订阅者发布进度事件。
+        job_id 为空时自动生成；调用方需要在任务参数中使用任务 ID 时可预先生成并传入。
+        """
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job.status == 'pending')
+            if pending >= self.max_pending:
+                raise JobQueueFullError(f"分析任务队列已满（{pending}个任务等待中），请稍后重试")
+            job = Job(job_id or uuid.uuid4().hex, func, args, kwargs)
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job_id):
+        """返回任务在等待队列中的位置（从1开始），不在等待中则返回0"""
+        with self._lock:
+            position = 0
+            for job in self._jobs.values():
+                if job.status == 'pending':
+                    position += 1
+                    if job.job_id == job_id:
+                        return position
+            return 0
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = job.func(*job.args, progress_callback=job.publish, **job.kwargs)
+            job.finish('done', 'done')
+        except Exception as e:
+            print(f"[JobQueue] 任务 {job.job_id} 执行失败: {str(e)}")
+            traceback.print_exc()
+            job.error = str(e)
+            job.finish('failed', 'error', message=job.error)
+
+    def _prune(self):
+        """只保留最近 max_finished 个已完成的任务，调用方需持有锁"""
+        finished_ids = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished_ids[:max(0, len(finished_ids) - self.max_finished)]:
+            del self._jobs[job_id]
@@ -0,0 +1,106 @@
+import random
+import threading
+
+from agents.metrics import LLM_ENDPOINT_OUTSTANDING, LLM_ENDPOINT_HEALTHY
+
+
+class EndpointState:
+    """一个模型端点在进程内的负载和健康状态，同一端点的同步/异步负载均衡器共享"""
+
+    def __init__(self, name):
+        self.name = name
+        self.outstanding = 0
+        self.healthy = True
+        self._lock = threading.Lock()
+        LLM_ENDPOINT_OUTSTANDING.set(0, endpoint=name)
+        LLM_ENDPOINT_HEALTHY.set(1, endpoint=name)
+
+    def begin(self):
+        with self._lock:
+            self.outstanding += 1
+            LLM_ENDPOINT_OUTSTANDING.set(self.outstanding, endpoint=self.name)
+
+    def end(self):
+        with self._lock:
+            self.outstanding -= 1
+            LLM_ENDPOINT_OUTSTANDING.set(self.outstanding, endpoint=self.name)
+
+    def set_healthy(self, healthy):
+        with self._lock:
+            if healthy == self.healthy:
+                return
+            self.healthy = healthy
+        LLM_ENDPOINT_HEALTHY.set(1 if healthy else 0, endpoint=self.name)
+        print(f"[LoadBalancer] 端点 {self.name} 健康检查{'恢复' if healthy else '失败，暂停分配请求'}")
+
+
+_endpoint_states = {}
+_endpoint_states_lock = threading.Lock()
+
+
+def get_endpoint_state(name):
+    with _endpoint_states_lock:
+        state = _endpoint_states.get(name)
+        if state is None:
+            state = EndpointState(name)
+            _endpoint_states[name] = state
+        return state
+
+
+def order_endpoints(endpoints):
+    """按路由优先级排列 [(state, breaker, adapter)]：健康且未熔断的端点在前，按在途请求数从少到多，
+    相同时随机；其余端点放在最后，只在前面的端点都失败时作为兜底
+    """
+    def available(endpoint):
+        state, breaker, _ = endpoint
+        return state.healthy and not breaker.is_open()
+
+    shuffled = random.sample(endpoints, len(endpoints))
+    return sorted(shuffled, key=lambda endpoint: (not available(endpoint), endpoint[0].outstanding))
+
+
+class HealthChecker:
+    """后台线程定期探测一个端点，探测失败的端点不再分配新请求，恢复后自动重新加入"""
+
+    def __init__(self, state, probe, interval):
+        self.state = state
+        self.probe = probe
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"health-check-{state.name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self):
+        try:
+            healthy = bool(self.probe())
+        except Exception as e:
+            print(f"[LoadBalancer] 端点 {self.state.name} 健康检查出错: {type(e).__name__} - {str(e)}")
+            healthy = False
+        self.state.set_healthy(healthy)
+        return healthy
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+
+_health_checkers = {}
+_health_checkers_lock = threading.Lock()
+
+
+def start_health_check(name, probe, interval):
+    """为端点启动健康检查（每个端点只启动一个），interval 不大于 0 时不检查"""
+    if not interval or interval <= 0:
+        return None
+    with _health_checkers_lock:
+        checker = _health_checkers.get(name)
+        if checker is None:
+            checker = HealthChecker(get_endpoint_state(name), probe, interval)
+            _health_checkers[name] = checker
+            checker.start()
+        return checker
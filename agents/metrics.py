@@ -0,0 +1,240 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# 默认直方图分桶（秒），覆盖从毫秒级的本地操作到数分钟的完整分析
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._render_samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    metric_type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    metric_type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def set(self, value, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # label values -> [各分桶计数, 总和, 样本数]
+
+    def observe(self, value, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """以代码块的执行时间作为一个样本"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._series.get(self._label_values(labels))
+            return series[2] if series else 0
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted((key, ([*series[0]], series[1], series[2])) for key, series in self._series.items())
+        lines = []
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, ("le", _format_value(upper_bound)))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """按 Prometheus 文本格式（0.0.4）输出全部指标"""
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+# 模型调用，stage 为发起调用的分析阶段（research / evaluation / summary）
+LLM_REQUEST_SECONDS = registry.histogram(
+    'llm_request_duration_seconds', '模型调用总耗时（含重试）', ('stage', 'outcome'))
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = registry.histogram(
+    'llm_time_to_first_token_seconds', '从发送请求到收到第一个 token 的时间', ('stage',))
+LLM_TOKENS_PER_SECOND = registry.histogram(
+    'llm_tokens_per_second', '首个 token 之后的输出速度（按流式增量片段计数）', ('stage',),
+    buckets=(1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400))
+CONTEXT_PROMPT_TOKENS = registry.histogram(
+    'context_prompt_tokens', '各阶段装入预算后的 prompt token 数', ('stage',),
+    buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000))
+CONTEXT_DROPPED_TOKENS = registry.counter(
+    'context_dropped_tokens_total', '因超出阶段预算被压缩或丢弃的 token 数', ('stage', 'section'))
+LLM_RETRIES = registry.counter(
+    'llm_retries_total', '模型调用重试次数', ('error_class',))
+LLM_CIRCUIT_STATE = registry.gauge(
+    'llm_circuit_state', '模型端点熔断状态（0 关闭，1 半开，2 打开）', ('endpoint',))
+LLM_CIRCUIT_REJECTIONS = registry.counter(
+    'llm_circuit_rejections_total', '熔断打开期间被直接拒绝的模型调用数', ('endpoint',))
+LLM_CONCURRENCY_LIMIT = registry.gauge(
+    'llm_concurrency_limit', '模型端点当前的自适应并发上限', ('endpoint',))
+LLM_CONCURRENCY_IN_FLIGHT = registry.gauge(
+    'llm_concurrency_in_flight', '模型端点当前在途的调用数', ('endpoint',))
+LLM_CONCURRENCY_QUEUE_DEPTH = registry.gauge(
+    'llm_concurrency_queue_depth', '等待并发名额的模型调用数', ('endpoint',))
+LLM_ENDPOINT_OUTSTANDING = registry.gauge(
+    'llm_endpoint_outstanding_requests', '负载均衡时各模型端点的在途请求数', ('endpoint',))
+LLM_ENDPOINT_HEALTHY = registry.gauge(
+    'llm_endpoint_healthy', '模型端点健康检查结果（1 正常，0 异常）', ('endpoint',))
+LLM_FAILOVERS = registry.counter(
+    'llm_failovers_total', '端点调用失败后转到其他端点重试的次数', ('endpoint',))
+LLM_HEDGES = registry.counter(
+    'llm_hedges_total', '对冲请求次数，result 为胜出方（primary / hedge / failed）或 budget_exhausted（预算不足未对冲）',
+    ('stage', 'result'))
+
+# SerpAPI 搜索
+SERPAPI_REQUEST_SECONDS = registry.histogram(
+    'serpapi_request_duration_seconds', 'SerpAPI 请求耗时', ('outcome',))
+SERPAPI_RESULTS = registry.histogram(
+    'serpapi_results', '每次搜索返回的结果数', (),
+    buckets=(0, 1, 5, 10, 20, 30, 50, 100))
+SEARCH_CACHE_REQUESTS = registry.counter(
+    'search_cache_requests_total', '搜索缓存查询次数', ('result',))
+SEARCH_INDEX_REQUESTS = registry.counter(
+    'search_index_requests_total', '本地搜索索引查询次数（hit 表示本地召回足够，未请求 SerpAPI）', ('result',))
+
+# 文档处理与分析流程
+PDF_EXTRACTION_SECONDS = registry.histogram(
+    'pdf_extraction_duration_seconds', 'PDF 文本提取耗时')
+PDF_PAGE_CACHE_REQUESTS = registry.counter(
+    'pdf_page_cache_requests_total', 'PDF 页文本缓存查询的页数', ('result',))
+DOCUMENT_STORE_REQUESTS = registry.counter(
+    'document_store_requests_total', '按内容哈希查询已提取全文的次数', ('result',))
+ANALYSIS_STAGE_SECONDS = registry.histogram(
+    'analysis_stage_duration_seconds', 'analyze_patent 各阶段耗时', ('stage',))
+ANALYSIS_SECONDS = registry.histogram(
+    'analysis_duration_seconds', 'analyze_patent 端到端耗时', ('outcome',))
@@ -1,317 +1,1174 @@
 from abc import ABC, abstractmethod
-from openai import OpenAI, APIError, APIConnectionError, RateLimitError, AuthenticationError
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from requests.adapters import HTTPAdapter
+from agents.response_cache import ResponseCache
+from agents.metrics import LLM_REQUEST_SECONDS, LLM_TIME_TO_FIRST_TOKEN_SECONDS, LLM_TOKENS_PER_SECOND, LLM_FAILOVERS, LLM_HEDGES
+from agents.retry_policy import (
+    DEFAULT_RETRY_BUDGETS, RetryPolicy, StreamInterruptedError, RequestCancelled, call_with_retry, call_with_retry_async, get_circuit_breaker
+)
+from agents.concurrency_limiter import get_concurrency_limiter
+from agents.load_balancer import get_endpoint_state, order_endpoints, start_health_check
+from agents.hedging import hedge_executor, get_hedge_policy
 import httpx
 import requests
+import asyncio
+import importlib.util
 import json
-import traceback
+import threading
+import weakref
 import os
 import time
 
+# 模拟OpenAI的completion对象结构，各适配器统一返回这些类型
+class MockFunction:
+    def __init__(self, name, arguments):
+        self.name = name
+        self.arguments = arguments
+
+
+class MockToolCall:
+    def __init__(self, tool_call_id, name, arguments):
+        self.id = tool_call_id
+        self.type = "function"
+        self.function = MockFunction(name, arguments)
+
+
+class MockMessage:
+    def __init__(self, content, tool_calls=None):
+        self.content = content
+        self.tool_calls = tool_calls or None
+
+
+class MockChoice:
+    def __init__(self, content, tool_calls=None, finish_reason="stop"):
+        self.message = MockMessage(content, tool_calls)
+        self.finish_reason = finish_reason
+
+
+class MockCompletion:
+    def __init__(self, content, model=None, response_id=None, tool_calls=None, finish_reason="stop"):
+        self.choices = [MockChoice(content, tool_calls, finish_reason)]
+        self.model = model
+        self.id = response_id if response_id else "streamed_response"
+        # Initialize other common attributes to None or default values
+        self.created = int(time.time()) # Unix timestamp
+        self.object = "chat.completion" # Default object type for chat completions
+        self.system_fingerprint = None
+        self.usage = None # Usage info is not typically available directly from stream in this manner
+
+
 class BaseModelAdapter(ABC):
     @abstractmethod
     def get_response(self, messages, **kwargs):
+        """发送对话请求，返回类似 OpenAI completion 的对象，失败时返回 None
+
+        可选关键字参数：
+            on_token: 每收到一段增量内容时以该字符串调用，用于流式推送
+            stage: 调用所属的分析阶段（research / evaluation / summary），用于按阶段控制缓存
+            hedge_attempt: 对冲调用中的一个请求（_HedgeAttempt），由对冲适配器传入：
+                拿到响应流后以关闭函数调用 opened()，每收到一个 chunk 调用 chunk()
+        """
+        pass
+
+    def close(self):
+        """释放底层连接池"""
         pass
 
-class OpenAIAdapter(BaseModelAdapter):
-    def __init__(self, api_key, base_url, model_name, request_timeout=120, max_retries=5, initial_backoff_seconds=2, proxy_url=None, proxy_username=None, proxy_password=None):
+
+class BaseAsyncModelAdapter(ABC):
+    """BaseModelAdapter 的 asyncio 版本，get_response 的参数和返回值与同步版本一致"""
+
+    @abstractmethod
+    async def get_response(self, messages, **kwargs):
+        pass
+
+    async def close(self):
+        pass
+
+class _StreamStats:
+    """统计一次请求的首 token 时间和输出速度，每次重试需调用 restart"""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.restart()
+
+    def restart(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.tokens = 0
+
+    def on_token(self):
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+            LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(now - self.started_at, stage=self.stage)
+        self.tokens += 1
+
+    def finish(self):
+        if self.first_token_at is None or self.tokens < 2:
+            return
+        elapsed = time.perf_counter() - self.first_token_at
+        if elapsed > 0:
+            LLM_TOKENS_PER_SECOND.observe((self.tokens - 1) / elapsed, stage=self.stage)
+
+
+def _observe_request(stage, started_at, response):
+    LLM_REQUEST_SECONDS.observe(
+        time.perf_counter() - started_at,
+        stage=stage,
+        outcome='success' if response is not None else 'failure'
+    )
+
+
+def _http2_available():
+    """httpx 需要安装 h2 才能启用 HTTP/2"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def _build_proxy_url(proxy_url, proxy_username=None, proxy_password=None):
+    """拼接完整的代理地址，URL 中未包含认证信息时使用单独传入的用户名和密码"""
+    # Separate scheme from the host/auth part
+    scheme = "http" # Default scheme
+    host_auth_part = proxy_url
+
+    if "://" in proxy_url:
+        scheme, host_auth_part = proxy_url.split("://", 1)
+
+    # Check if host_auth_part (e.g., user:pass@host:port or host:port) already contains credentials
+    if "@" in host_auth_part:
+        # Credentials are in the URL, use it as is with its original scheme (or default if none was stripped)
+        return f"{scheme}://{host_auth_part}"
+    if proxy_username:
+        # Credentials provided as parameters, prepend them to the host_auth_part
+        auth_string = proxy_username
+        if proxy_password:
+            auth_string += f":{proxy_password}"
+        return f"{scheme}://{auth_string}@{host_auth_part}"
+    # No credentials in URL and no credentials in parameters
+    return f"{scheme}://{host_auth_part}"
+
+
+def _build_openai_params(base_url, model_name, messages, kwargs):
+    """构造 chat.completions.create 的参数，始终使用流式输出"""
+    # Prioritize model from kwargs if provided, otherwise use model_name
+    params = {
+        "messages": messages,
+        **kwargs
+    }
+    if 'model' not in params:
+        params['model'] = model_name
+
+    params['stream'] = True # Enable streaming
+
+    print(f"[OpenAIAdapter get_response] Using OpenAI client with base_url: {base_url}")
+    # Attempt to convert params to string for logging, handling potential circular references or complex objects if any.
+    try:
+        params_str = str(params)
+    except Exception:
+        params_str = "Could not convert params to string for logging."
+    print(f"[OpenAIAdapter get_response] Attempting to send request with parameters: {params_str}")
+    return params
+
+
+class _StreamCollector:
+    """把流式 chunk 累积成完整的 completion：正文、工具调用和 finish_reason"""
+
+    def __init__(self, on_token, stream_stats, hedge_attempt=None):
+        self.on_token = on_token
+        self.stream_stats = stream_stats
+        self.hedge_attempt = hedge_attempt
+        self.collected_content = []
+        self.collected_tool_calls = {} # 按 index 累积工具调用的增量片段
+        self.finish_reason = "stop"
+        self.last_chunk = None # To store the last chunk for model/id if needed
+
+    def add(self, chunk):
+        self.last_chunk = chunk # Keep track of the last chunk
+        if self.hedge_attempt is not None:
+            self.hedge_attempt.chunk()
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        if choice.delta and (choice.delta.content or choice.delta.tool_calls):
+            self.stream_stats.on_token()
+        if choice.delta and choice.delta.content is not None:
+            self.collected_content.append(choice.delta.content)
+            if self.on_token is not None:
+                self.on_token(choice.delta.content)
+        if choice.delta and choice.delta.tool_calls:
+            for tool_call_delta in choice.delta.tool_calls:
+                entry = self.collected_tool_calls.setdefault(tool_call_delta.index, {"id": None, "name": "", "arguments": []})
+                if tool_call_delta.id:
+                    entry["id"] = tool_call_delta.id
+                if tool_call_delta.function:
+                    if tool_call_delta.function.name:
+                        entry["name"] += tool_call_delta.function.name
+                    if tool_call_delta.function.arguments:
+                        entry["arguments"].append(tool_call_delta.function.arguments)
+        if choice.finish_reason is not None:
+            self.finish_reason = choice.finish_reason
+            print(f"[OpenAIAdapter get_response] Stream finished with reason: {choice.finish_reason}")
+
+    def build(self, default_model):
+        self.stream_stats.finish()
+        full_response_content = "".join(self.collected_content)
+        print(f"[OpenAIAdapter get_response] Collected full content from stream: {full_response_content}")
+
+        tool_calls = [
+            MockToolCall(entry["id"], entry["name"], "".join(entry["arguments"]))
+            for _, entry in sorted(self.collected_tool_calls.items())
+        ]
+
+        model_name_to_use = default_model
+        response_id_to_use = None
+        if self.last_chunk: # Safely access attributes from the last chunk
+            if hasattr(self.last_chunk, 'model') and self.last_chunk.model:
+                model_name_to_use = self.last_chunk.model
+            if hasattr(self.last_chunk, 'id') and self.last_chunk.id:
+                response_id_to_use = self.last_chunk.id
+
+        return MockCompletion(
+            full_response_content, model_name_to_use, response_id_to_use,
+            tool_calls=tool_calls, finish_reason=self.finish_reason
+        )
+
+
+class _RetryMixin:
+    """同步和异步适配器共用的重试策略和熔断器配置，熔断器按端点在进程内共享"""
+
+    def _init_retry(self, endpoint, max_retries, initial_backoff_seconds, max_backoff_seconds, retry_budgets,
+                    circuit_failure_threshold, circuit_reset_seconds, concurrency_limiter=None):
+        budgets = dict(DEFAULT_RETRY_BUDGETS, **(retry_budgets or {}))
+        if max_retries is not None:
+            budgets['server'] = max_retries  # 兼容原有配置：max_retries 为 5xx 的重试次数
+        self.endpoint = str(endpoint)
+        self.retry_policy = RetryPolicy(base_delay=initial_backoff_seconds, max_delay=max_backoff_seconds, budgets=budgets)
+        self.circuit_breaker = get_circuit_breaker(self.endpoint, circuit_failure_threshold, circuit_reset_seconds)
+        self.concurrency_limiter = concurrency_limiter
+
+
+def _stream_failed(e, name, streamed, hedge_attempt=None):
+    """流式读取中途出错：已向调用方推送过内容时改为不可重试的 StreamInterruptedError，否则原样抛出交给重试策略
+
+    对冲中落后的请求被关闭连接后读取出错，改为 RequestCancelled，不重试
+    """
+    if isinstance(e, RequestCancelled):
+        raise e
+    if hedge_attempt is not None and hedge_attempt.cancelled:
+        raise RequestCancelled() from e
+    print(f"[{name} get_response] Error while processing stream: {type(e).__name__} - {str(e)}")
+    if streamed:
+        raise StreamInterruptedError(str(e)) from e
+    raise e
+
+
+class OpenAIAdapter(_RetryMixin, BaseModelAdapter):
+    def __init__(self, api_key, base_url, model_name, request_timeout=120, max_retries=5, initial_backoff_seconds=2, proxy_url=None, proxy_username=None, proxy_password=None,
+                 max_connections=100, max_keepalive_connections=20, keepalive_expiry=30, http2=None,
+                 max_backoff_seconds=60, retry_budgets=None, circuit_failure_threshold=5, circuit_reset_seconds=30,
+                 concurrency_limiter=None):
         print(f"[OpenAIAdapter __init__] Initializing with base_url: {base_url}")
         print(f"[OpenAIAdapter __init__] Initial request_timeout: {request_timeout}, max_retries: {max_retries}")
         self.model_name = model_name
         self.request_timeout = request_timeout
-        self.max_retries = max_retries
-        self.initial_backoff_seconds = initial_backoff_seconds
-
-        if proxy_url:
-            original_http_proxy = os.environ.get('HTTP_PROXY')
-            original_https_proxy = os.environ.get('HTTPS_PROXY')
-
-            # Refined logic for full_proxy_url construction:
-            temp_proxy_url = proxy_url # Work with a temporary variable
-
-            # Separate scheme from the host/auth part
-            scheme = "http" # Default scheme
-            host_auth_part = temp_proxy_url
-
-            if "://" in temp_proxy_url:
-                scheme, host_auth_part = temp_proxy_url.split("://", 1)
-
-            # Check if host_auth_part (e.g., user:pass@host:port or host:port) already contains credentials
-            if "@" in host_auth_part:
-                # Credentials are in the URL, use it as is with its original scheme (or default if none was stripped)
-                full_proxy_url = f"{scheme}://{host_auth_part}"
-            elif proxy_username:
-                # Credentials provided as parameters, prepend them to the host_auth_part
-                auth_string = proxy_username
-                if proxy_password:
-                    auth_string += f":{proxy_password}"
-                full_proxy_url = f"{scheme}://{auth_string}@{host_auth_part}"
-            else:
-                # No credentials in URL and no credentials in parameters
-                full_proxy_url = f"{scheme}://{host_auth_part}"
+        self._init_retry(base_url, max_retries, initial_backoff_seconds, max_backoff_seconds, retry_budgets,
+                         circuit_failure_threshold, circuit_reset_seconds, concurrency_limiter)
 
-            try:
-                os.environ['HTTP_PROXY'] = full_proxy_url
-                os.environ['HTTPS_PROXY'] = full_proxy_url
-
-                print(f"[OpenAIAdapter __init__] Attempting to use proxy: {full_proxy_url}")
-                print(f"[OpenAIAdapter __init__] HTTP_PROXY before httpx.Client(): {os.environ.get('HTTP_PROXY')}")
-                print(f"[OpenAIAdapter __init__] HTTPS_PROXY before httpx.Client(): {os.environ.get('HTTPS_PROXY')}")
-
-                # httpx.Client() will pick up proxy settings from env vars
-                # Pass a new httpx_client to OpenAI so it picks up the env vars at its initialization time
-                httpx_client = httpx.Client()
-                self.client = OpenAI(
-                    api_key=api_key,
-                    base_url=base_url,
-                    http_client=httpx_client
-                )
-                print(f"[OpenAIAdapter __init__] OpenAI client configured with custom httpx.Client for proxy.")
-            finally:
-                # Restore original environment variables
-                if original_http_proxy is None:
-                    os.environ.pop('HTTP_PROXY', None)
-                else:
-                    os.environ['HTTP_PROXY'] = original_http_proxy
+        # 长连接池：适配器在进程内共享（见 get_model_adapter），避免每次请求重新握手和建立代理连接
+        if http2 is None:
+            http2 = _http2_available()
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        full_proxy_url = _build_proxy_url(proxy_url, proxy_username, proxy_password) if proxy_url else None
+        if full_proxy_url:
+            print(f"[OpenAIAdapter __init__] Using proxy: {proxy_url}")
 
-                if original_https_proxy is None:
-                    os.environ.pop('HTTPS_PROXY', None)
-                else:
-                    os.environ['HTTPS_PROXY'] = original_https_proxy
-            print(f"# original_http_proxy='{original_http_proxy}' original_https_proxy='{original_https_proxy}'")
-            print(f"# '{self}', '{api_key}', '{base_url}', '{model_name}', '{request_timeout}', '{max_retries}', '{initial_backoff_seconds}', '{proxy_url}', '{proxy_username}', '{proxy_password}'")
-        else:
-            # If no proxy_url, initialize OpenAI client without custom http_client
-            # It will use its own default httpx.Client()
-            self.client = OpenAI(api_key=api_key, base_url=base_url)
-            print(f"[OpenAIAdapter __init__] OpenAI client configured without custom proxy httpx.Client.")
+        self.http_client = DefaultHttpxClient(limits=limits, http2=http2, proxy=full_proxy_url)
+        # 重试统一由 RetryPolicy 处理，关闭 SDK 自带的重试以免叠加
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client, max_retries=0)
+        print(f"[OpenAIAdapter __init__] OpenAI client configured with pooled httpx.Client "
+              f"(max_connections={max_connections}, keepalive={max_keepalive_connections}, http2={http2}).")
+
+    def close(self):
+        self.http_client.close()
 
     def get_response(self, messages, **kwargs):
-        retries = 0
-        backoff_seconds = self.initial_backoff_seconds
+        stage = kwargs.pop('stage', None) or 'unknown'
+        started_at = time.perf_counter()
+        response = self._get_response(messages, stage, **kwargs)
+        _observe_request(stage, started_at, response)
+        return response
 
-        # Prepare parameters for the API call (moved here to be available for initial print)
-        # Prioritize model from kwargs if provided, otherwise use self.model_name
-        params = {
-            "messages": messages,
-            **kwargs
-        }
-        if 'model' not in params:
-            params['model'] = self.model_name
+    def _get_response(self, messages, stage, **kwargs):
+        on_token = kwargs.pop('on_token', None)
+        hedge_attempt = kwargs.pop('hedge_attempt', None)
+        stream_stats = _StreamStats(stage)
+        params = _build_openai_params(self.client.base_url, self.model_name, messages, kwargs)
 
-        params['stream'] = True # Enable streaming
+        def attempt():
+            stream_stats.restart()
+            completion_stream = self.client.chat.completions.create(**params, timeout=self.request_timeout)
+            print("[OpenAIAdapter get_response] Request was sent with stream=True. Processing stream...")
+            if hedge_attempt is not None:
+                hedge_attempt.opened(completion_stream.close)
+            collector = _StreamCollector(on_token, stream_stats, hedge_attempt)
+            try:
+                for chunk in completion_stream:
+                    collector.add(chunk)
+            except Exception as e:
+                _stream_failed(e, 'OpenAIAdapter', on_token is not None and collector.collected_content, hedge_attempt)
+            return collector.build(params['model'])
 
-        print(f"[OpenAIAdapter get_response] Using OpenAI client with base_url: {self.client.base_url}")
-        # Attempt to convert params to string for logging, handling potential circular references or complex objects if any.
-        try:
-            params_str = str(params)
-        except Exception:
-            params_str = "Could not convert params to string for logging."
-        print(f"[OpenAIAdapter get_response] Attempting to send request with parameters: {params_str}")
+        return call_with_retry(attempt, self.retry_policy, self.circuit_breaker, self.endpoint,
+                               self.concurrency_limiter, stage)
 
-        while retries <= self.max_retries:
-            try:
-                completion_stream = self.client.chat.completions.create(**params, timeout=self.request_timeout)
 
-                print("[OpenAIAdapter get_response] Request was sent with stream=True. Processing stream...")
-                collected_content = []
-                last_chunk = None # To store the last chunk for model/id if needed
+class AsyncOpenAIAdapter(_RetryMixin, BaseAsyncModelAdapter):
+    """OpenAIAdapter 的 asyncio 版本，基于 AsyncOpenAI 和共享的 httpx.AsyncClient 连接池"""
 
-                try:
-                    for chunk in completion_stream:
-                        print(f"[OpenAIAdapter get_response] Received stream chunk: {chunk.model_dump_json(indent=2)}")
-                        last_chunk = chunk # Keep track of the last chunk
-                        if chunk.choices:
-                            choice = chunk.choices[0]
-                            if choice.delta and choice.delta.content is not None:
-                                collected_content.append(choice.delta.content)
-                            if choice.finish_reason is not None:
-                                print(f"[OpenAIAdapter get_response] Stream finished with reason: {choice.finish_reason}")
-
-                    full_response_content = "".join(collected_content)
-                    print(f"[OpenAIAdapter get_response] Collected full content from stream: {full_response_content}")
-
-                    class MockMessage:
-                        def __init__(self, content):
-                            self.content = content
-                            self.tool_calls = None
-
-                    class MockChoice:
-                        def __init__(self, content):
-                            self.message = MockMessage(content)
-                            self.finish_reason = "stop"
-
-                    class MockCompletion:
-                        def __init__(self, content, model_name_from_stream=None, response_id=None):
-                            self.choices = [MockChoice(content)]
-                            self.model = model_name_from_stream if model_name_from_stream else params.get('model')
-                            self.id = response_id if response_id else "streamed_response"
-                            # Initialize other common attributes to None or default values
-                            self.created = int(time.time()) # Unix timestamp
-                            self.object = "chat.completion" # Default object type for chat completions
-                            self.system_fingerprint = None
-                            self.usage = None # Usage info is not typically available directly from stream in this manner
-
-                    model_name_to_use = None
-                    response_id_to_use = None
-                    if last_chunk: # Safely access attributes from the last chunk
-                        if hasattr(last_chunk, 'model') and last_chunk.model:
-                            model_name_to_use = last_chunk.model
-                        if hasattr(last_chunk, 'id') and last_chunk.id:
-                            response_id_to_use = last_chunk.id
-
-                    final_completion_response = MockCompletion(full_response_content, model_name_to_use, response_id_to_use)
-                    return final_completion_response
+    def __init__(self, api_key, base_url, model_name, request_timeout=120, max_retries=5, initial_backoff_seconds=2, proxy_url=None, proxy_username=None, proxy_password=None,
+                 max_connections=100, max_keepalive_connections=20, keepalive_expiry=30, http2=None,
+                 max_backoff_seconds=60, retry_budgets=None, circuit_failure_threshold=5, circuit_reset_seconds=30,
+                 concurrency_limiter=None):
+        self.model_name = model_name
+        self.request_timeout = request_timeout
+        self._init_retry(base_url, max_retries, initial_backoff_seconds, max_backoff_seconds, retry_budgets,
+                         circuit_failure_threshold, circuit_reset_seconds, concurrency_limiter)
 
-                except Exception as e:
-                    print(f"[OpenAIAdapter get_response] Error while processing stream: {type(e).__name__} - {str(e)}")
-                    traceback.print_exc()
-                    return None
-
-            except httpx.TimeoutException as e:
-                print(f"OpenAI API Call failed due to httpx.TimeoutException: {type(e).__name__} - {str(e)}")
-                print(f"URL that was requested: {e.request.url if e.request else 'N/A'}")
-                traceback.print_exc()
-                # For timeout, retrying might be applicable depending on strategy, here we just return None after retries exhausted
-                # Fall through to retry logic if desired, or handle specifically. For now, let it be caught by retry logic for 5xx.
-                # If we want to retry httpx.TimeoutException specifically, need to adjust retry logic or add a specific retry counter here.
-                # For this change, we are just logging and then it will be handled by the generic retry for 5xx or fail.
-                # A more robust solution might involve specific retry conditions for timeouts.
-                # For now, let's print and let the existing retry logic (if any applicable) or failure occur.
-                # The current retry logic is for APIError 5xx, so this will likely fall through to the generic Exception or fail immediately.
-                # Let's make it return None for now, consistent with other specific error handlers.
-                return None
-            except httpx.RequestError as e:
-                print(f"OpenAI API Call failed due to httpx.RequestError: {type(e).__name__} - {str(e)}")
-                print(f"URL that was requested: {e.request.url if e.request else 'N/A'}")
-                traceback.print_exc()
-                return None
-            except APIConnectionError as e:
-                print(f"OpenAI API ConnectionError: Failed to connect to OpenAI at {self.client.base_url}. Error.")
-                traceback.print_exc()
-                http_proxy = os.getenv('HTTP_PROXY')
-                https_proxy = os.getenv('HTTPS_PROXY')
-                print(f"Proxy Information: HTTP_PROXY='{http_proxy}' HTTPS_PROXY='{https_proxy}'")
-                return None
-            except RateLimitError as e:
-                print(f"OpenAI API RateLimitError: Rate limit exceeded for {self.client.base_url}. Error. ")
-                traceback.print_exc()
-                return None
-            except AuthenticationError as e:
-                print(f"OpenAI API AuthenticationError: Authentication failed for {self.client.base_url}. Error. ")
-                traceback.print_exc()
-                return None
-            except APIError as e: # Catch other OpenAI API errors
-                if hasattr(e, 'status_code') and 500 <= e.status_code <= 599:
-                    if retries < self.max_retries:
-                        print(f"OpenAI API 5xx error (Status: {e.status_code}). Retrying in {backoff_seconds}s... (Attempt {retries + 1}/{self.max_retries})")
-                        time.sleep(backoff_seconds)
-                        backoff_seconds *= 2
-                        retries += 1
-                        continue
-                    else:
-                        print(f"OpenAI API call failed after {self.max_retries} retries for a 5xx error (Status: {e.status_code}).")
-                        traceback.print_exc()
-                        return None
-
-                # Handle non-5xx APIErrors or if retries exhausted for 5xx
-                print(f"OpenAI APIError: Encountered API error of type '{type(e).__name__}' with {self.client.base_url}.")
-
-                if hasattr(e, 'status_code') and e.status_code is not None:
-                    print(f"  Status Code: {e.status_code}")
-                else:
-                    print(f"  Status Code: Not available")
+        if http2 is None:
+            http2 = _http2_available()
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        full_proxy_url = _build_proxy_url(proxy_url, proxy_username, proxy_password) if proxy_url else None
+        self.http_client = DefaultAsyncHttpxClient(limits=limits, http2=http2, proxy=full_proxy_url)
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client, max_retries=0)
+        print(f"[AsyncOpenAIAdapter __init__] AsyncOpenAI client configured with base_url: {base_url}")
 
-                if hasattr(e, 'code') and e.code is not None:
-                     print(f"  Error Code: {e.code}")
-                else:
-                    print(f"  Error Code: Not available")
+    async def close(self):
+        await self.http_client.aclose()
 
-                if hasattr(e, 'body') and e.body is not None:
-                    body_info = f"type: {type(e.body).__name__}, length: {len(str(e.body))}"
-                    print(f"  Error Body Info: {body_info}. Content omitted for brevity. Enable debug for full body.")
-                else:
-                    print(f"  Error Body Info: Not available or empty.")
+    async def get_response(self, messages, **kwargs):
+        stage = kwargs.pop('stage', None) or 'unknown'
+        started_at = time.perf_counter()
+        response = await self._get_response(messages, stage, **kwargs)
+        _observe_request(stage, started_at, response)
+        return response
+
+    async def _get_response(self, messages, stage, **kwargs):
+        on_token = kwargs.pop('on_token', None)
+        hedge_attempt = kwargs.pop('hedge_attempt', None)
+        stream_stats = _StreamStats(stage)
+        params = _build_openai_params(self.client.base_url, self.model_name, messages, kwargs)
 
-                print("  Traceback:")
-                traceback.print_exc()
-                return None
+        async def attempt():
+            stream_stats.restart()
+            completion_stream = await self.client.chat.completions.create(**params, timeout=self.request_timeout)
+            collector = _StreamCollector(on_token, stream_stats, hedge_attempt)
+            try:
+                async for chunk in completion_stream:
+                    collector.add(chunk)
             except Exception as e:
-                print(f"OpenAI API call failed (unexpected error): Could not process request for {self.client.base_url}. Error.")
-                traceback.print_exc()
-                return None
+                _stream_failed(e, 'AsyncOpenAIAdapter', on_token is not None and collector.collected_content)
+            return collector.build(params['model'])
 
-        # If loop finishes, all retries failed for 5xx errors
-        if retries > self.max_retries: # Should be retries == self.max_retries + 1 if loop exited due to retries
-            print(f"OpenAI API call failed after {self.max_retries} retries for a 5xx error.")
-        return None
+        return await call_with_retry_async(attempt, self.retry_policy, self.circuit_breaker, self.endpoint,
+                                           self.concurrency_limiter, stage)
 
 
-class OllamaAdapter(BaseModelAdapter):
-    def __init__(self, base_url="http://localhost:11434", model_name="qwen2:7b"):
+class OllamaAdapter(_RetryMixin, BaseModelAdapter):
+    def __init__(self, base_url="http://localhost:11434", model_name="qwen2:7b", request_timeout=300, max_connections=100,
+                 max_retries=None, initial_backoff_seconds=2, max_backoff_seconds=60, retry_budgets=None,
+                 circuit_failure_threshold=5, circuit_reset_seconds=30,
+                 concurrency_limiter=None):
         self.base_url = base_url
         self.model_name = model_name
         self.api_endpoint = f"{self.base_url}/api/chat"
+        self.request_timeout = request_timeout
+        self._init_retry(base_url, max_retries, initial_backoff_seconds, max_backoff_seconds, retry_budgets,
+                         circuit_failure_threshold, circuit_reset_seconds, concurrency_limiter)
+
+        # 复用 Session 以保持长连接，连接池大小与并发分析数匹配
+        self.session = requests.Session()
+        pool_adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount("http://", pool_adapter)
+        self.session.mount("https://", pool_adapter)
+
+    def close(self):
+        self.session.close()
 
     def get_response(self, messages, **kwargs):
+        stage = kwargs.pop('stage', None) or 'unknown'
+        started_at = time.perf_counter()
+        response = self._get_response(messages, stage, **kwargs)
+        _observe_request(stage, started_at, response)
+        return response
+
+    def _get_response(self, messages, stage, **kwargs):
+        on_token = kwargs.pop('on_token', None)
+        hedge_attempt = kwargs.pop('hedge_attempt', None)
+        stream_stats = _StreamStats(stage)
         payload = {
             "model": self.model_name,
             "messages": messages,
-            "stream": False, # 根据需要设置是否流式输出
+            "stream": on_token is not None, # 需要逐 token 推送时使用流式输出
             **kwargs
         }
-        try:
-            response = requests.post(self.api_endpoint, json=payload)
+
+        def attempt():
+            stream_stats.restart()
+            # 对冲时延迟读取响应体，落后的一方可以随时关闭连接
+            response = self.session.post(self.api_endpoint, json=payload, stream=payload["stream"] or hedge_attempt is not None,
+                                         timeout=self.request_timeout)
             response.raise_for_status() # 如果请求失败则抛出HTTPError
-            # Ollama的响应格式可能与OpenAI不同，需要适配
-            # 假设Ollama返回的格式中，消息内容在 response.json()['message']['content']
-            # 并且需要构造成与OpenAI completion对象类似的结构，至少包含 choices[0].message.content
-            # 这是一个简化的示例，您可能需要根据Ollama的实际输出来调整
-            class MockChoice:
-                def __init__(self, content):
-                    self.message = MockMessage(content)
-            class MockMessage:
-                def __init__(self, content):
-                    self.content = content
-                    self.tool_calls = None # 假设Ollama当前不支持tool_calls，或需要额外处理
-            
-            response_data = response.json()
-            # 检查Ollama的响应结构，提取需要的内容
-            # 例如，如果Ollama的响应是 {'model': 'qwen2:7b', 'created_at': '...', 'message': {'role': 'assistant', 'content': '...'}, 'done': True, ...}
-            assistant_content = response_data.get('message', {}).get('content', '')
-            
-            # 模拟OpenAI的completion对象结构
-            class MockCompletion:
-                def __init__(self, content):
-                    self.choices = [MockChoice(content)]
-            
-            return MockCompletion(assistant_content)
-
-        except requests.exceptions.RequestException as e:
-            print(f"Ollama API call failed: {str(e)}")
-            return None
-        except json.JSONDecodeError:
-            print(f"Failed to decode Ollama API response: {response.text}")
-            return None
-
-# 可以在这里添加一个工厂函数来根据配置创建适配器实例
-def get_model_adapter(config):
+            if hedge_attempt is not None:
+                hedge_attempt.opened(response.close)
+            # Ollama的响应格式与OpenAI不同，需要构造成与OpenAI completion对象类似的结构，至少包含 choices[0].message.content
+            # 假设Ollama当前不支持tool_calls，或需要额外处理
+            if payload["stream"]:
+                # 流式响应为逐行 JSON，每行包含一段增量 message.content，最后一行 done 为 True
+                collected_content = []
+                try:
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if hedge_attempt is not None:
+                            hedge_attempt.chunk()
+                        token = chunk.get('message', {}).get('content', '')
+                        if token:
+                            stream_stats.on_token()
+                            collected_content.append(token)
+                            on_token(token)
+                        if chunk.get('done'):
+                            break
+                except Exception as e:
+                    _stream_failed(e, 'OllamaAdapter', collected_content, hedge_attempt)
+                stream_stats.finish()
+                assistant_content = "".join(collected_content)
+            else:
+                # 例如 {'model': 'qwen2:7b', 'created_at': '...', 'message': {'role': 'assistant', 'content': '...'}, 'done': True, ...}
+                try:
+                    body = response.json()
+                except Exception as e:
+                    _stream_failed(e, 'OllamaAdapter', False, hedge_attempt)
+                if hedge_attempt is not None:
+                    hedge_attempt.chunk()
+                assistant_content = body.get('message', {}).get('content', '')
+
+            return MockCompletion(assistant_content, model=payload["model"])
+
+        return call_with_retry(attempt, self.retry_policy, self.circuit_breaker, self.endpoint,
+                               self.concurrency_limiter, stage)
+
+class AsyncOllamaAdapter(_RetryMixin, BaseAsyncModelAdapter):
+    """OllamaAdapter 的 asyncio 版本，基于 httpx.AsyncClient"""
+
+    def __init__(self, base_url="http://localhost:11434", model_name="qwen2:7b", request_timeout=300, max_connections=100,
+                 max_retries=None, initial_backoff_seconds=2, max_backoff_seconds=60, retry_budgets=None,
+                 circuit_failure_threshold=5, circuit_reset_seconds=30,
+                 concurrency_limiter=None):
+        self.base_url = base_url
+        self.model_name = model_name
+        self.api_endpoint = f"{self.base_url}/api/chat"
+        self._init_retry(base_url, max_retries, initial_backoff_seconds, max_backoff_seconds, retry_budgets,
+                         circuit_failure_threshold, circuit_reset_seconds, concurrency_limiter)
+        self.client = httpx.AsyncClient(
+            timeout=request_timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def get_response(self, messages, **kwargs):
+        stage = kwargs.pop('stage', None) or 'unknown'
+        started_at = time.perf_counter()
+        response = await self._get_response(messages, stage, **kwargs)
+        _observe_request(stage, started_at, response)
+        return response
+
+    async def _get_response(self, messages, stage, **kwargs):
+        on_token = kwargs.pop('on_token', None)
+        hedge_attempt = kwargs.pop('hedge_attempt', None)
+        stream_stats = _StreamStats(stage)
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "stream": on_token is not None, # 需要逐 token 推送时使用流式输出
+            **kwargs
+        }
+
+        async def attempt():
+            stream_stats.restart()
+            if payload["stream"]:
+                collected_content = []
+                async with self.client.stream("POST", self.api_endpoint, json=payload) as response:
+                    response.raise_for_status()
+                    try:
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            if hedge_attempt is not None:
+                                hedge_attempt.chunk()
+                            token = chunk.get('message', {}).get('content', '')
+                            if token:
+                                stream_stats.on_token()
+                                collected_content.append(token)
+                                on_token(token)
+                            if chunk.get('done'):
+                                break
+                    except Exception as e:
+                        _stream_failed(e, 'AsyncOllamaAdapter', collected_content)
+                stream_stats.finish()
+                assistant_content = "".join(collected_content)
+            else:
+                response = await self.client.post(self.api_endpoint, json=payload)
+                response.raise_for_status()
+                if hedge_attempt is not None:
+                    hedge_attempt.chunk()
+                assistant_content = response.json().get('message', {}).get('content', '')
+
+            return MockCompletion(assistant_content, model=payload["model"])
+
+        return await call_with_retry_async(attempt, self.retry_policy, self.circuit_breaker, self.endpoint,
+                                           self.concurrency_limiter, stage)
+
+
+class _ResponseCacheMixin:
+    """同步和异步缓存适配器共用的缓存键计算、命中回放和写入逻辑"""
+
+    def _init_cache(self, adapter, cache, stages):
+        self.adapter = adapter
+        self.cache = cache
+        self.stages = set(stages or [])
+        self.model_name = getattr(adapter, 'model_name', None)
+
+    def _cache_key(self, messages, kwargs):
+        params = {k: v for k, v in kwargs.items() if k not in ('on_token', 'stage', 'model')}
+        model = kwargs.get('model') or self.model_name
+        return ResponseCache.make_key(model, messages, params), model
+
+    def _replay(self, cached, key, kwargs):
+        print(f"[CachedModelAdapter] 命中响应缓存 (stage={kwargs.get('stage')}, key={key[:12]})")
+        on_token = kwargs.get('on_token')
+        if on_token is not None and cached["content"]:
+            on_token(cached["content"])
+        tool_calls = [MockToolCall(tc["id"], tc["name"], tc["arguments"]) for tc in cached.get("tool_calls", [])]
+        return MockCompletion(cached["content"], cached.get("model"), cached.get("id"), tool_calls=tool_calls)
+
+    @staticmethod
+    def _cache_entry(response, model):
+        message = response.choices[0].message
+        return {
+            "content": message.content,
+            "model": getattr(response, 'model', None) or model,
+            "id": getattr(response, 'id', None),
+            "tool_calls": [{
+                "id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments
+            } for tc in (message.tool_calls or [])]
+        }
+
+
+class CachedModelAdapter(_ResponseCacheMixin, BaseModelAdapter):
+    """在任意适配器外层加响应缓存，只缓存 stages 中列出的阶段的调用"""
+
+    def __init__(self, adapter, cache, stages):
+        self._init_cache(adapter, cache, stages)
+
+    def close(self):
+        self.adapter.close()
+
+    def get_response(self, messages, **kwargs):
+        if kwargs.get('stage') not in self.stages:
+            return self.adapter.get_response(messages, **kwargs)
+
+        key, model = self._cache_key(messages, kwargs)
+        cached = self.cache.get_value(key)
+        if cached is not None:
+            return self._replay(cached, key, kwargs)
+
+        response = self.adapter.get_response(messages, **kwargs)
+        if response is not None:
+            self.cache.set_value(key, self._cache_entry(response, model))
+        return response
+
+
+class AsyncCachedModelAdapter(_ResponseCacheMixin, BaseAsyncModelAdapter):
+    """CachedModelAdapter 的 asyncio 版本，SQLite 读写放到线程中执行以免阻塞事件循环"""
+
+    def __init__(self, adapter, cache, stages):
+        self._init_cache(adapter, cache, stages)
+
+    async def close(self):
+        await self.adapter.close()
+
+    async def get_response(self, messages, **kwargs):
+        if kwargs.get('stage') not in self.stages:
+            return await self.adapter.get_response(messages, **kwargs)
+
+        key, model = self._cache_key(messages, kwargs)
+        cached = await asyncio.to_thread(self.cache.get_value, key)
+        if cached is not None:
+            return self._replay(cached, key, kwargs)
+
+        response = await self.adapter.get_response(messages, **kwargs)
+        if response is not None:
+            await asyncio.to_thread(self.cache.set_value, key, self._cache_entry(response, model))
+        return response
+
+
+def _track_tokens(kwargs):
+    """包装 on_token 以记录是否已有内容推送给调用方"""
+    streamed = []
+    on_token = kwargs.get('on_token')
+    if on_token is not None:
+        def track(token):
+            streamed.append(True)
+            on_token(token)
+        kwargs['on_token'] = track
+    return streamed
+
+
+class _LoadBalancerMixin:
+    """多个端点间的负载均衡：按在途请求数最少选择端点，跳过健康检查失败和熔断中的端点，
+    端点调用失败时转到下一个端点（已通过 on_token 推送过内容时不再转移，避免重复输出）
+    """
+
+    def _init_endpoints(self, adapters, retry_policy=None, max_rounds=1):
+        self.adapters = adapters
+        self.endpoints = [(get_endpoint_state(adapter.endpoint), adapter.circuit_breaker, adapter) for adapter in adapters]
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.max_rounds = max(1, max_rounds)
+
+    def _round_delay(self, round_index):
+        """一轮中所有端点都失败后，开始下一轮之前的退避秒数"""
+        delay = self.retry_policy.backoff(round_index - 1)
+        print(f"[LoadBalancer] 所有端点均调用失败，{delay:.1f} 秒后开始第 {round_index + 1}/{self.max_rounds} 轮")
+        return delay
+
+    @staticmethod
+    def _failover(state, streamed, kwargs):
+        hedge_attempt = kwargs.get('hedge_attempt')
+        if hedge_attempt is not None and hedge_attempt.cancelled:
+            # 对冲中落后的请求被放弃，不是端点故障
+            return False
+        if streamed:
+            print(f"[LoadBalancer] 端点 {state.name} 在流式输出中途失败，已推送内容，不再转移")
+            return False
+        LLM_FAILOVERS.inc(endpoint=state.name)
+        print(f"[LoadBalancer] 端点 {state.name} 调用失败，转到下一个端点")
+        return True
+
+
+class LoadBalancedModelAdapter(_LoadBalancerMixin, BaseModelAdapter):
+    """把请求分发到多个同类型端点的适配器
+
+    各端点适配器应不做重试（见 _balanced_endpoint_config），第一次基础设施错误即转到下一个端点；
+    一轮中所有端点都失败时按 retry_policy 退避后重新开始，最多 max_rounds 轮。
+    """
+
+    def __init__(self, adapters, retry_policy=None, max_rounds=1):
+        self._init_endpoints(adapters, retry_policy, max_rounds)
+
+    def close(self):
+        for adapter in self.adapters:
+            adapter.close()
+
+    def get_response(self, messages, **kwargs):
+        streamed = _track_tokens(kwargs)
+        for round_index in range(self.max_rounds):
+            if round_index:
+                time.sleep(self._round_delay(round_index))
+            for state, _, adapter in order_endpoints(self.endpoints):
+                state.begin()
+                try:
+                    response = adapter.get_response(messages, **kwargs)
+                finally:
+                    state.end()
+                if response is not None or not self._failover(state, streamed, kwargs):
+                    return response
+        return None
+
+
+class AsyncLoadBalancedModelAdapter(_LoadBalancerMixin, BaseAsyncModelAdapter):
+    """LoadBalancedModelAdapter 的 asyncio 版本，端点的在途请求数与同步版本合并统计"""
+
+    def __init__(self, adapters, retry_policy=None, max_rounds=1):
+        self._init_endpoints(adapters, retry_policy, max_rounds)
+
+    async def close(self):
+        for adapter in self.adapters:
+            await adapter.close()
+
+    async def get_response(self, messages, **kwargs):
+        streamed = _track_tokens(kwargs)
+        for round_index in range(self.max_rounds):
+            if round_index:
+                await asyncio.sleep(self._round_delay(round_index))
+            for state, _, adapter in order_endpoints(self.endpoints):
+                state.begin()
+                try:
+                    response = await adapter.get_response(messages, **kwargs)
+                finally:
+                    state.end()
+                if response is not None or not self._failover(state, streamed, kwargs):
+                    return response
+        return None
+
+
+class _HedgeRace:
+    """一次对冲调用中各请求的竞争：先收到首个 chunk（或先成功返回）的请求胜出，
+    胜出方确定后关闭落后方已打开的响应流，落后方随后收到 chunk 或读取出错时抛出 RequestCancelled 放弃
+    """
+
+    def __init__(self, changed):
+        self.changed = changed  # threading.Event 或 asyncio.Event，胜出方确定或有请求结束时置位
+        self.winner = None
+        self._closers = {}
+        self._lock = threading.Lock()
+
+    def claim(self, index):
+        losers = []
+        with self._lock:
+            if self.winner is None:
+                self.winner = index
+                self.changed.set()
+                losers = [close for other, close in self._closers.items() if other != index]
+            won = self.winner == index
+        for close in losers:
+            self._close(close)
+        return won
+
+    def lost(self, index):
+        return self.winner is not None and self.winner != index
+
+    def opened(self, index, close):
+        """记录请求的响应流；已经落后时立即关闭并放弃"""
+        with self._lock:
+            lost = self.lost(index)
+            if not lost:
+                self._closers[index] = close
+        if lost:
+            self._close(close)
+            raise RequestCancelled()
+
+    @staticmethod
+    def _close(close):
+        try:
+            close()
+        except Exception as e:
+            print(f"[HedgedModelAdapter] 关闭落后请求的响应流出错: {type(e).__name__} - {str(e)}")
+
+    def finished(self, index, response):
+        if response is not None:
+            self.claim(index)
+        self.changed.set()
+
+
+class _HedgeAttempt:
+    """对冲调用中的一个请求，以 hedge_attempt 关键字参数传给内层适配器
+
+    首个 chunk 到达时记录首 chunk 时间（包括只有工具调用的 chunk），不改变调用方是否传入 on_token，
+    因此不会把非流式调用变成流式，也不影响流式中断时的重试判断。
+    """
+
+    def __init__(self, race, index, policy, stage):
+        self.race = race
+        self.index = index
+        self.policy = policy
+        self.stage = stage
+        self.started_at = time.perf_counter()
+        self.first_chunk = True
+
+    @property
+    def cancelled(self):
+        return self.race.lost(self.index)
+
+    def opened(self, close):
+        self.race.opened(self.index, close)
+
+    def chunk(self):
+        if self.first_chunk:
+            self.first_chunk = False
+            self.policy.record_ttft(self.stage, time.perf_counter() - self.started_at)
+        if not self.race.claim(self.index):
+            raise RequestCancelled()
+
+
+class _HedgeMixin:
+    """对冲请求：首个 chunk 迟迟不到时再发一个相同的请求，取先开始输出的一方，放弃另一方
+
+    等待时间为该阶段最近首 chunk 时间的分位数，对冲次数受 HedgePolicy 的预算限制。
+    内层为负载均衡适配器时，对冲请求会被分配到在途请求较少的其他端点。
+    """
+
+    def _init_hedge(self, adapter, policy):
+        self.adapter = adapter
+        self.policy = policy
+
+    def _attempt_kwargs(self, kwargs, race, index, stage):
+        return dict(kwargs, hedge_attempt=_HedgeAttempt(race, index, self.policy, stage))
+
+    @staticmethod
+    def _should_retry(response, race, streamed, hedged):
+        """发出过对冲且胜出方在开始输出后失败时，另一方已被放弃，没有可用的结果；尚未向调用方推送内容时应不对冲重试一次"""
+        return hedged and response is None and race.winner is not None and not streamed
+
+    @staticmethod
+    def _observe_hedge(stage, race, hedged):
+        if hedged:
+            LLM_HEDGES.inc(stage=stage, result={0: 'primary', 1: 'hedge'}.get(race.winner, 'failed'))
+
+
+class HedgedModelAdapter(_HedgeMixin, BaseModelAdapter):
+    """在任意适配器外层加对冲请求；主请求在调用方线程执行，只有对冲请求提交到 hedge_executor
+
+    主请求开始时启动计时器，delay 秒内未收到首个 chunk 时发出对冲请求。胜出方确定后立即关闭落后方的响应流，
+    释放线程和连接；落后方还在等待响应头时无法关闭，要等响应头到达（随即关闭）或 request_timeout 超时后才释放。
+    """
+
+    def __init__(self, adapter, policy):
+        self._init_hedge(adapter, policy)
+
+    def close(self):
+        self.adapter.close()
+
+    def get_response(self, messages, **kwargs):
+        stage = kwargs.get('stage') or 'unknown'
+        self.policy.on_request()
+        delay = self.policy.hedge_delay(stage)
+        race = _HedgeRace(threading.Event())
+        if delay is None:
+            # 样本不足时不对冲，只记录首 chunk 时间
+            return self.adapter.get_response(messages, **self._attempt_kwargs(kwargs, race, 0, stage))
+
+        streamed = _track_tokens(kwargs)
+        hedges = []
+        primary_done = [False]
+        launch_lock = threading.Lock()
+
+        def launch_hedge():
+            with launch_lock:
+                if primary_done[0] or race.winner is not None:
+                    return
+                if not self.policy.try_hedge():
+                    LLM_HEDGES.inc(stage=stage, result='budget_exhausted')
+                    return
+                print(f"[HedgedModelAdapter] {stage} 阶段 {delay:.1f}s 内未收到首个 chunk，发出对冲请求")
+                future = hedge_executor.submit(self.adapter.get_response, messages, **self._attempt_kwargs(kwargs, race, 1, stage))
+                future.add_done_callback(lambda f: race.finished(1, None if f.exception() else f.result()))
+                hedges.append(future)
+
+        timer = threading.Timer(delay, launch_hedge)
+        timer.daemon = True
+        timer.start()
+        try:
+            response = self.adapter.get_response(messages, **self._attempt_kwargs(kwargs, race, 0, stage))
+        finally:
+            timer.cancel()
+            with launch_lock:
+                primary_done[0] = True
+        race.finished(0, response)
+
+        if response is None and hedges:
+            response = hedges[0].result()
+        self._observe_hedge(stage, race, bool(hedges))
+        if self._should_retry(response, race, streamed, bool(hedges)):
+            print(f"[HedgedModelAdapter] {stage} 阶段胜出的请求在输出后失败，不对冲重试一次")
+            response = self.adapter.get_response(messages, **kwargs)
+        return response
+
+
+class AsyncHedgedModelAdapter(_HedgeMixin, BaseAsyncModelAdapter):
+    """HedgedModelAdapter 的 asyncio 版本，落后方的任务直接取消，连接随之关闭"""
+
+    def __init__(self, adapter, policy):
+        self._init_hedge(adapter, policy)
+
+    async def close(self):
+        await self.adapter.close()
+
+    async def get_response(self, messages, **kwargs):
+        stage = kwargs.get('stage') or 'unknown'
+        self.policy.on_request()
+        delay = self.policy.hedge_delay(stage)
+        race = _HedgeRace(asyncio.Event())
+        if delay is None:
+            return await self.adapter.get_response(messages, **self._attempt_kwargs(kwargs, race, 0, stage))
+
+        streamed = _track_tokens(kwargs)
+        tasks = []
+
+        def launch():
+            index = len(tasks)
+            task = asyncio.ensure_future(
+                self.adapter.get_response(messages, **self._attempt_kwargs(kwargs, race, index, stage)))
+            task.add_done_callback(lambda t: race.finished(index, None if t.cancelled() or t.exception() else t.result()))
+            tasks.append(task)
+
+        launch()
+        hedged = False
+        try:
+            try:
+                await asyncio.wait_for(race.changed.wait(), delay)
+            except asyncio.TimeoutError:
+                if self.policy.try_hedge():
+                    print(f"[AsyncHedgedModelAdapter] {stage} 阶段 {delay:.1f}s 内未收到首个 chunk，发出对冲请求")
+                    launch()
+                    hedged = True
+                else:
+                    LLM_HEDGES.inc(stage=stage, result='budget_exhausted')
+
+            while True:
+                race.changed.clear()
+                if race.winner is not None or all(task.done() for task in tasks):
+                    break
+                await race.changed.wait()
+            self._observe_hedge(stage, race, hedged)
+            response = await tasks[race.winner or 0]
+        finally:
+            # 取消落后的一方；调用方被取消时胜出方也一起取消
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        if self._should_retry(response, race, streamed, hedged):
+            print(f"[AsyncHedgedModelAdapter] {stage} 阶段胜出的请求在输出后失败，不对冲重试一次")
+            response = await self.adapter.get_response(messages, **kwargs)
+        return response
+
+
+# 进程内共享的适配器注册表：相同配置的调用方复用同一个适配器及其连接池
+_adapter_registry = {}
+_adapter_registry_lock = threading.Lock()
+# 异步适配器的连接绑定在事件循环上，因此按事件循环分别注册
+_async_adapter_registry = weakref.WeakKeyDictionary()
+
+
+def _adapter_registry_key(config):
+    return json.dumps(config, sort_keys=True, default=str)
+
+
+def _create_response_cache(config):
+    return ResponseCache(
+        config.get("response_cache_path"),
+        ttl_seconds=config.get("response_cache_ttl_seconds") or 30 * 24 * 3600,
+        max_entries=config.get("response_cache_max_entries") or 5000
+    )
+
+
+def _concurrency_limiter(config):
+    """同一端点的全部适配器（同步/异步、不同模型）共享一个自适应并发限流器"""
+    if not config.get("concurrency_limit_enabled"):
+        return None
+    return get_concurrency_limiter(
+        str(config.get("base_url")),
+        initial_limit=config.get("concurrency_initial_limit") or 8,
+        min_limit=config.get("concurrency_min_limit") or 1,
+        max_limit=config.get("concurrency_max_limit") or 64,
+        latency_tolerance=config.get("concurrency_latency_tolerance") or 2.0
+    )
+
+
+def _retry_kwargs(config):
+    return dict(
+        initial_backoff_seconds=config.get("initial_backoff_seconds") or 2,
+        max_backoff_seconds=config.get("max_backoff_seconds") or 60,
+        retry_budgets=config.get("retry_budgets"),
+        circuit_failure_threshold=config.get("circuit_failure_threshold") or 5,
+        circuit_reset_seconds=config.get("circuit_reset_seconds") or 30,
+        concurrency_limiter=_concurrency_limiter(config)
+    )
+
+
+def _openai_adapter_kwargs(config):
+    return dict(
+        api_key=config.get("api_key"),
+        base_url=config.get("base_url"),
+        model_name=config.get("model_name"),
+        request_timeout=config.get("request_timeout", 120),
+        max_retries=config.get("max_retries", 5),
+        proxy_url=config.get("proxy_url"),
+        proxy_username=config.get("proxy_username"),
+        proxy_password=config.get("proxy_password"),
+        max_connections=config.get("max_connections") or 100,
+        max_keepalive_connections=config.get("max_keepalive_connections") or 20,
+        keepalive_expiry=config.get("keepalive_expiry") or 30,
+        http2=config.get("http2"),
+        **_retry_kwargs(config)
+    )
+
+
+def _ollama_adapter_kwargs(config):
+    return dict(
+        base_url=config.get("base_url", "http://localhost:11434"),
+        model_name=config.get("model_name", "qwen2:7b"), # 默认为qwen2:7b
+        request_timeout=config.get("request_timeout") or 300,
+        max_connections=config.get("max_connections") or 100,
+        max_retries=config.get("max_retries"),
+        **_retry_kwargs(config)
+    )
+
+
+def _endpoint_configs(config):
+    """config["endpoints"] 中的每一项（base_url 字符串，或覆盖 base_url/api_key 等字段的字典）展开为单端点配置"""
+    configs = []
+    for endpoint in config.get("endpoints") or []:
+        overrides = {"base_url": endpoint} if isinstance(endpoint, str) else endpoint
+        configs.append(dict(config, endpoints=None, **overrides))
+    return configs
+
+
+def _health_probe(config):
+    """返回探测端点是否可用的函数：OpenAI 兼容网关请求 /models，Ollama 请求 /api/tags
+
+    2xx/3xx 和 429（繁忙但可用）视为可用；401/403/404 等说明密钥或地址配置错误，与 5xx 一样视为不可用
+    """
+    base_url = str(config.get("base_url")).rstrip('/')
+    timeout = config.get("health_check_timeout_seconds") or 5
+    headers = {}
+    proxy = None
+    if config.get("type") == "openai":
+        url = f"{base_url}/models"
+        headers["Authorization"] = f"Bearer {config.get('api_key')}"
+        if config.get("proxy_url"):
+            proxy = _build_proxy_url(config.get("proxy_url"), config.get("proxy_username"), config.get("proxy_password"))
+    else:
+        url = f"{base_url}/api/tags"
+
+    def probe():
+        status_code = httpx.get(url, headers=headers, timeout=timeout, proxy=proxy).status_code
+        return status_code < 400 or status_code == 429
+    return probe
+
+
+def _create_endpoint_adapter(config):
     model_type = config.get("type")
     if model_type == "openai":
-        return OpenAIAdapter(
-            api_key=config.get("api_key"),
-            base_url=config.get("base_url"),
-            model_name=config.get("model_name"),
-            request_timeout=config.get("request_timeout", 120),
-            max_retries=config.get("max_retries", 5),
-            initial_backoff_seconds=config.get("initial_backoff_seconds", 2),
-            proxy_url=config.get("proxy_url"),
-            proxy_username=config.get("proxy_username"),
-            proxy_password=config.get("proxy_password")
-        )
-    elif model_type == "ollama":
-        return OllamaAdapter(
-            base_url=config.get("base_url", "http://localhost:11434"),
-            model_name=config.get("model_name", "qwen2:7b") # 默认为qwen2:7b
-        )
+        return OpenAIAdapter(**_openai_adapter_kwargs(config))
+    if model_type == "ollama":
+        return OllamaAdapter(**_ollama_adapter_kwargs(config))
+    raise ValueError(f"Unsupported model type: {model_type}")
+
+
+def _create_async_endpoint_adapter(config):
+    model_type = config.get("type")
+    if model_type == "openai":
+        return AsyncOpenAIAdapter(**_openai_adapter_kwargs(config))
+    if model_type == "ollama":
+        return AsyncOllamaAdapter(**_ollama_adapter_kwargs(config))
+    raise ValueError(f"Unsupported model type: {model_type}")
+
+
+def _balanced_endpoint_config(config):
+    """负载均衡下的单端点配置：端点自身不重试，出错立即转到下一个端点，重试由负载均衡适配器按轮次进行"""
+    return dict(config, max_retries=0, retry_budgets={error_class: 0 for error_class in DEFAULT_RETRY_BUDGETS})
+
+
+def _load_balancer_kwargs(config):
+    return dict(
+        retry_policy=RetryPolicy(base_delay=config.get("initial_backoff_seconds") or 2,
+                                 max_delay=config.get("max_backoff_seconds") or 60),
+        max_rounds=config.get("lb_retry_rounds") or 3
+    )
+
+
+def _start_health_checks(configs):
+    for endpoint_config in configs:
+        start_health_check(str(endpoint_config.get("base_url")), _health_probe(endpoint_config),
+                           endpoint_config.get("health_check_interval_seconds"))
+
+
+def _hedge_policy(config):
+    """同一组端点的同步/异步适配器共享首 token 时间样本和对冲预算"""
+    return get_hedge_policy(
+        json.dumps([config.get("base_url"), config.get("endpoints")], default=str),
+        percentile=config.get("hedge_percentile") or 95,
+        min_delay=config.get("hedge_min_delay_seconds") or 1.0,
+        budget_ratio=config.get("hedge_budget_ratio") or 0.1,
+        min_samples=config.get("hedge_min_samples") or 20
+    )
+
+
+def create_model_adapter(config):
+    """根据配置创建一个新的适配器实例（不经过注册表）；配置了 endpoints 时创建多端点负载均衡适配器"""
+    endpoint_configs = _endpoint_configs(config)
+    if endpoint_configs:
+        _start_health_checks(endpoint_configs)
+        adapter = LoadBalancedModelAdapter([_create_endpoint_adapter(_balanced_endpoint_config(c)) for c in endpoint_configs],
+                                           **_load_balancer_kwargs(config))
     else:
-        raise ValueError(f"Unsupported model type: {model_type}")
+        adapter = _create_endpoint_adapter(config)
+
+    if config.get("hedge_enabled"):
+        adapter = HedgedModelAdapter(adapter, _hedge_policy(config))
+
+    if config.get("response_cache_enabled"):
+        adapter = CachedModelAdapter(adapter, _create_response_cache(config), config.get("response_cache_stages"))
+    return adapter
+
+
+def create_async_model_adapter(config):
+    """create_model_adapter 的异步版本"""
+    endpoint_configs = _endpoint_configs(config)
+    if endpoint_configs:
+        _start_health_checks(endpoint_configs)
+        adapter = AsyncLoadBalancedModelAdapter([_create_async_endpoint_adapter(_balanced_endpoint_config(c)) for c in endpoint_configs],
+                                                **_load_balancer_kwargs(config))
+    else:
+        adapter = _create_async_endpoint_adapter(config)
+
+    if config.get("hedge_enabled"):
+        adapter = AsyncHedgedModelAdapter(adapter, _hedge_policy(config))
+
+    if config.get("response_cache_enabled"):
+        adapter = AsyncCachedModelAdapter(adapter, _create_response_cache(config), config.get("response_cache_stages"))
+    return adapter
+
+
+def get_model_adapter(config):
+    """返回与配置对应的共享适配器，首次调用时创建"""
+    key = _adapter_registry_key(config)
+    with _adapter_registry_lock:
+        adapter = _adapter_registry.get(key)
+        if adapter is None:
+            adapter = create_model_adapter(config)
+            _adapter_registry[key] = adapter
+        return adapter
+
+
+def get_async_model_adapter(config):
+    """返回当前事件循环中与配置对应的共享异步适配器，必须在协程中调用"""
+    loop = asyncio.get_running_loop()
+    key = _adapter_registry_key(config)
+    with _adapter_registry_lock:
+        adapters = _async_adapter_registry.setdefault(loop, {})
+        adapter = adapters.get(key)
+        if adapter is None:
+            adapter = create_async_model_adapter(config)
+            adapters[key] = adapter
+        return adapter
+
+
+def close_model_adapters():
+    """关闭并清空注册表中的全部适配器"""
+    with _adapter_registry_lock:
+        adapters = list(_adapter_registry.values())
+        _adapter_registry.clear()
+    for adapter in adapters:
+        adapter.close()
+
+
+async def close_async_model_adapters():
+    """关闭并清空当前事件循环中注册的全部异步适配器"""
+    loop = asyncio.get_running_loop()
+    with _adapter_registry_lock:
+        adapters = list(_async_adapter_registry.pop(loop, {}).values())
+    for adapter in adapters:
+        await adapter.close()
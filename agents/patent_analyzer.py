@@ -1,42 +1,379 @@
 from agents.research_agent import ResearchAgent
 from agents.summary_agent import SummaryAgent
 from agents.evaluation_agent import EvaluationAgent
+from agents.digest_agent import DigestAgent
+from agents.clue_screener import screen_clues
+from agents.search_dedup import dedup_research_materials, dedup_search_results
 from prompts.prompt_templates import get_customized_prompt
-from config.settings import ENABLE_EVALUATION # 导入新的配置项
+from config.settings import ENABLE_EVALUATION, CLUE_PRESCREEN_ENABLED # 导入新的配置项
+from config.settings import ANALYSIS_CHECKPOINT_ENABLED, ANALYSIS_CHECKPOINT_PATH, ANALYSIS_CHECKPOINT_TTL_SECONDS
+from config.settings import RESEARCH_HISTORY_ENABLED, RESEARCH_HISTORY_PATH, RESEARCH_HISTORY_TTL_SECONDS
+from agents.checkpoint_store import CheckpointStore, CHECKPOINT_STAGES
+from agents.research_history import ResearchHistory, patent_hash
+from agents.progress import report_progress
+from agents.metrics import ANALYSIS_STAGE_SECONDS, ANALYSIS_SECONDS
+import time
+from datetime import date
+
+# analyze_patent 在这些结果下视为失败
+FAILED_RESULTS = ("分析失败", "总结失败")
+
+# 按任务 ID 保存各阶段产出，失败的任务可以从最后一个成功的阶段继续
+checkpoint_store = CheckpointStore(ANALYSIS_CHECKPOINT_PATH, ANALYSIS_CHECKPOINT_TTL_SECONDS) if ANALYSIS_CHECKPOINT_ENABLED else None
+# 按专利原文哈希保存最近一次分析的研究材料，增量复查时复用
+research_history = ResearchHistory(RESEARCH_HISTORY_PATH, RESEARCH_HISTORY_TTL_SECONDS) if RESEARCH_HISTORY_ENABLED else None
+
+INCREMENTAL_RESEARCH_NOTE = """
+
+【增量复查】本专利已于 {since} 完成过分析，此前的搜索结果已保留。
+本次只需检索 {since} 之后新出现的产品、技术和新闻，所有搜索均会限定在该日期之后。"""
 
 class PatentAnalyzer:
     def __init__(self):
         self.research_agent = ResearchAgent()
         self.summary_agent = SummaryAgent()
         self.evaluation_agent = EvaluationAgent()
+        self.digest_agent = DigestAgent()
+        self.research_materials = None  # 最近一次分析的研究材料（含评估结果和报告 markdown）
 
     def extract_text(self, file_input):
         return self.research_agent.extract_text(file_input)
 
+    async def extract_text_async(self, file_input):
+        return await self.research_agent.extract_text_async(file_input)
+
+    def analyze_with_params(self, patent_text, analysis_params, progress_callback=None, job_id=None):
+        """根据页面/批量任务提交的分析参数生成 prompt 并执行完整分析；传入 job_id 时按阶段保存检查点并可续跑
+
+        analysis_params 中 incremental 为真时，若该专利分析过则只检索上次分析之后的新结果。
+        """
+        company_name = analysis_params.get('company_name', '国际知名ICT企业')
+
+        # 处理目标企业和排除企业列表
+        target_companies = analysis_params.get('target_companies', '')
+        if target_companies:
+            target_companies = [company.strip() for company in target_companies.split(',')]
+
+        exclude_companies = analysis_params.get('exclude_companies', '')
+        if exclude_companies:
+            exclude_companies = [company.strip() for company in exclude_companies.split(',')]
+
+        focus_area = analysis_params.get('focus_area', '')
+
+        # 获取自定义的 prompt
+        research_prompt = get_customized_prompt(
+            'research', 
+            company_name=company_name,
+            target_companies=target_companies,
+            exclude_companies=exclude_companies,
+            focus_area=focus_area
+        )
+        
+        summary_prompt = get_customized_prompt(
+            'summary', 
+            company_name=company_name,
+            target_companies=target_companies
+        )
+
+        # 传递分析参数到分析器
+        return self.analyze_patent(
+            patent_text, 
+            research_prompt, 
+            summary_prompt,
+            company_name=company_name,
+            target_companies=target_companies,
+            progress_callback=progress_callback,
+            job_id=job_id,
+            incremental=bool(analysis_params.get('incremental'))
+        )
+
     def analyze_patent(self, patent_text, research_prompt, summary_prompt, **kwargs):
-        # 第一阶段：研究代理收集信息
-        research_materials = self.research_agent.conduct_research(patent_text, research_prompt)
-        if not research_materials:
-            return "分析失败"
+        started_at = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = self._analyze_patent(patent_text, research_prompt, summary_prompt, **kwargs)
+            outcome = 'failure' if result in FAILED_RESULTS else 'success'
+            return result
+        finally:
+            ANALYSIS_SECONDS.observe(time.perf_counter() - started_at, outcome=outcome)
+
+    async def analyze_patent_async(self, patent_text, research_prompt, summary_prompt, **kwargs):
+        """analyze_patent 的异步版本：模型调用走异步适配器，多个分析可在同一个事件循环中并发执行"""
+        started_at = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = await self._analyze_patent_async(patent_text, research_prompt, summary_prompt, **kwargs)
+            outcome = 'failure' if result in FAILED_RESULTS else 'success'
+            return result
+        finally:
+            ANALYSIS_SECONDS.observe(time.perf_counter() - started_at, outcome=outcome)
+
+    def _analyze_patent(self, patent_text, research_prompt, summary_prompt, **kwargs):
+        progress_callback = kwargs.get('progress_callback')
+        job_id = kwargs.get('job_id')
+
+        checkpoint_hash = self._begin_checkpoints(job_id, patent_text)
+        summary = self._load_checkpoint(job_id, 'summary', checkpoint_hash)
+        if summary is not None:
+            self.research_materials = self._restore_research_materials(job_id, checkpoint_hash)
+            return summary
+
+        previous, research_prompt = self._begin_incremental(patent_text, research_prompt, kwargs.get('incremental'))
+        research_materials = self._load_checkpoint(job_id, 'research', checkpoint_hash)
+        if research_materials is None:
+            # 研究阶段重新执行后，之前的评估结果不再对应新的研究材料
+            self._discard_checkpoints_after(job_id, 'research')
+            # 长专利先分块提取要点，供后续各阶段的 prompt 使用
+            with ANALYSIS_STAGE_SECONDS.time(stage='digest'):
+                patent_context = self.digest_agent.build_context(patent_text, progress_callback)
+
+            # 第一阶段：研究代理收集信息
+            report_progress(progress_callback, 'stage', stage='research')
+            with ANALYSIS_STAGE_SECONDS.time(stage='research'):
+                research_materials = self.research_agent.conduct_research(
+                    patent_text, research_prompt, progress_callback=progress_callback, patent_context=patent_context
+                )
+            if not research_materials:
+                return "分析失败"
+            self._dedup(research_materials, previous)
+            self._save_checkpoint(job_id, 'research', research_materials, checkpoint_hash)
+        self.research_materials = research_materials
 
         evaluated_clues = [] # 初始化为空列表
         if ENABLE_EVALUATION: # 检查是否启用了评估功能
-            # 获取评估阶段的自定义 prompt
-            patent_info = self.extract_patent_info(research_materials)
-            evaluation_prompt = get_customized_prompt(
-                'evaluation', 
-                company_name=kwargs.get('company_name', '全球知名ICT公司'),
-                patent_info=patent_info,
-                target_companies=kwargs.get('target_companies', [])
+            # 增量复查时只评估新增的文档
+            evaluation_materials = self._evaluation_materials(research_materials)
+            self._prescreen(evaluation_materials, progress_callback)
+            evaluated_clues = self._load_checkpoint(job_id, 'evaluation', checkpoint_hash)
+            if evaluated_clues is None and self._has_clues_to_evaluate(evaluation_materials):
+                # 第二阶段：评估代理验证侵权线索
+                report_progress(progress_callback, 'stage', stage='evaluation')
+                with ANALYSIS_STAGE_SECONDS.time(stage='evaluation'):
+                    evaluated_clues = self.evaluation_agent.conduct_evaluation(
+                        evaluation_materials, 
+                        self._evaluation_prompt(research_materials, **kwargs),
+                        target_companies=kwargs.get('target_companies', []),
+                        progress_callback=progress_callback
+                    )
+                self._save_checkpoint(job_id, 'evaluation', evaluated_clues, checkpoint_hash)
+            evaluated_clues = self._merge_evaluation(research_materials, evaluation_materials, previous, evaluated_clues)
+        self._inject_evaluated_clues(research_materials, evaluated_clues)
+
+        # 第三阶段：总结代理生成报告
+        report_progress(progress_callback, 'stage', stage='summary')
+        with ANALYSIS_STAGE_SECONDS.time(stage='summary'):
+            summary = self.summary_agent.generate_summary(
+                research_materials, summary_prompt, progress_callback=progress_callback
             )
-            
-            # 第二阶段：评估代理验证侵权线索
-            evaluated_clues = self.evaluation_agent.conduct_evaluation(
-                research_materials, 
-                evaluation_prompt,
-                target_companies=kwargs.get('target_companies', [])
+        self._save_checkpoint(job_id, 'summary', summary, checkpoint_hash)
+        self._save_history(patent_text, research_materials, evaluated_clues, summary)
+        return summary
+
+    async def _analyze_patent_async(self, patent_text, research_prompt, summary_prompt, **kwargs):
+        progress_callback = kwargs.get('progress_callback')
+        job_id = kwargs.get('job_id')
+
+        checkpoint_hash = self._begin_checkpoints(job_id, patent_text)
+        summary = self._load_checkpoint(job_id, 'summary', checkpoint_hash)
+        if summary is not None:
+            self.research_materials = self._restore_research_materials(job_id, checkpoint_hash)
+            return summary
+
+        previous, research_prompt = self._begin_incremental(patent_text, research_prompt, kwargs.get('incremental'))
+        research_materials = self._load_checkpoint(job_id, 'research', checkpoint_hash)
+        if research_materials is None:
+            # 研究阶段重新执行后，之前的评估结果不再对应新的研究材料
+            self._discard_checkpoints_after(job_id, 'research')
+            with ANALYSIS_STAGE_SECONDS.time(stage='digest'):
+                patent_context = await self.digest_agent.build_context_async(patent_text, progress_callback)
+
+            report_progress(progress_callback, 'stage', stage='research')
+            with ANALYSIS_STAGE_SECONDS.time(stage='research'):
+                research_materials = await self.research_agent.conduct_research_async(
+                    patent_text, research_prompt, progress_callback=progress_callback, patent_context=patent_context
+                )
+            if not research_materials:
+                return "分析失败"
+            self._dedup(research_materials, previous)
+            self._save_checkpoint(job_id, 'research', research_materials, checkpoint_hash)
+        self.research_materials = research_materials
+
+        evaluated_clues = []
+        if ENABLE_EVALUATION:
+            evaluation_materials = self._evaluation_materials(research_materials)
+            self._prescreen(evaluation_materials, progress_callback)
+            evaluated_clues = self._load_checkpoint(job_id, 'evaluation', checkpoint_hash)
+            if evaluated_clues is None and self._has_clues_to_evaluate(evaluation_materials):
+                report_progress(progress_callback, 'stage', stage='evaluation')
+                with ANALYSIS_STAGE_SECONDS.time(stage='evaluation'):
+                    evaluated_clues = await self.evaluation_agent.conduct_evaluation_async(
+                        evaluation_materials,
+                        self._evaluation_prompt(research_materials, **kwargs),
+                        target_companies=kwargs.get('target_companies', []),
+                        progress_callback=progress_callback
+                    )
+                self._save_checkpoint(job_id, 'evaluation', evaluated_clues, checkpoint_hash)
+            evaluated_clues = self._merge_evaluation(research_materials, evaluation_materials, previous, evaluated_clues)
+        self._inject_evaluated_clues(research_materials, evaluated_clues)
+
+        report_progress(progress_callback, 'stage', stage='summary')
+        with ANALYSIS_STAGE_SECONDS.time(stage='summary'):
+            summary = await self.summary_agent.generate_summary_async(
+                research_materials, summary_prompt, progress_callback=progress_callback
             )
-        
+        self._save_checkpoint(job_id, 'summary', summary, checkpoint_hash)
+        self._save_history(patent_text, research_materials, evaluated_clues, summary)
+        return summary
+
+    def _begin_checkpoints(self, job_id, patent_text):
+        """返回本次分析的检查点校验哈希；同一任务 ID 换了另一篇专利时丢弃该任务的全部旧检查点"""
+        if job_id is None or checkpoint_store is None:
+            return None
+        checkpoint_hash = patent_hash(patent_text)
+        if checkpoint_store.has_other_patent(job_id, checkpoint_hash):
+            print(f"[PatentAnalyzer] 任务 {job_id} 的检查点与当前专利不一致，重新分析")
+            checkpoint_store.discard(job_id)
+        return checkpoint_hash
+
+    def _load_checkpoint(self, job_id, stage, checkpoint_hash):
+        if job_id is None or checkpoint_store is None:
+            return None
+        value = checkpoint_store.get(job_id, stage, checkpoint_hash)
+        if value is not None:
+            print(f"[PatentAnalyzer] 任务 {job_id} 从 {stage} 阶段检查点恢复")
+        return value
+
+    def _restore_research_materials(self, job_id, checkpoint_hash):
+        """从总结检查点直接返回时恢复研究材料和评估结果，供调用方归档；研究检查点已不存在时返回 None"""
+        research_materials = self._load_checkpoint(job_id, 'research', checkpoint_hash)
+        if research_materials is not None:
+            self._inject_evaluated_clues(research_materials, self._load_checkpoint(job_id, 'evaluation', checkpoint_hash))
+        return research_materials
+
+    def _discard_checkpoints_after(self, job_id, stage):
+        if job_id is None or checkpoint_store is None:
+            return
+        checkpoint_store.discard(job_id, CHECKPOINT_STAGES[CHECKPOINT_STAGES.index(stage) + 1:])
+
+    def _save_checkpoint(self, job_id, stage, value, checkpoint_hash):
+        """只保存成功的阶段产出：研究失败、评估未得到线索或总结失败时不写入，续跑时重新执行该阶段"""
+        if job_id is None or checkpoint_store is None or not value or value in FAILED_RESULTS:
+            return
+        checkpoint_store.set(job_id, stage, value, checkpoint_hash)
+
+    def _begin_incremental(self, patent_text, research_prompt, incremental):
+        """增量复查：取出该专利上次的分析结果，把本次搜索限定在上次分析日期之后
+
+        返回 (上次的分析结果或 None, 本次使用的研究 prompt)；没有历史记录时按完整分析执行。
+        """
+        previous = research_history.get(patent_text) if incremental and research_history is not None else None
+        if previous is None:
+            self.research_agent.after_date_floor = None
+            return None, research_prompt
+        since = previous['analyzed_at']
+        print(f"[PatentAnalyzer] 增量复查，上次分析日期 {since}")
+        self.research_agent.after_date_floor = since
+        return previous, research_prompt + INCREMENTAL_RESEARCH_NOTE.format(since=since)
+
+    def _dedup(self, research_materials, previous=None):
+        """跨查询合并重复的搜索结果，评估和总结阶段只看到每个文档一次
+
+        增量复查时先并入上次去重后的文档；每条搜索记录带 is_new 标记，去重后按标记区分历史文档和新增文档。
+        """
+        with ANALYSIS_STAGE_SECONDS.time(stage='dedup'):
+            if previous is None:
+                dedup_research_materials(research_materials)
+                return
+            previous_records = [
+                {'query': document.get('query', ''), 'is_new': False,
+                 'items': [{'snippet': document['snippet'], 'link': document.get('link', ''), 'title': document.get('title', '')}]}
+                for document in self._previous_documents(previous)
+            ]
+            new_records = [dict(record, is_new=True) for record in research_materials['search_results']]
+            research_materials['search_results'] = previous_records + new_records
+            documents = dedup_research_materials(research_materials)
+            new_documents = sum(1 for document in documents if document['is_new'])
+            research_materials['incremental'] = {
+                'since': previous['analyzed_at'],
+                'previous_documents': len(documents) - new_documents,
+                'new_documents': new_documents,
+                'previous_clues': len(previous['evaluated_clues']),
+            }
+
+    @staticmethod
+    def _previous_documents(previous):
+        """上次保存的去重文档；兼容只保存了原始搜索结果的旧记录"""
+        materials = previous['research_materials']
+        if 'documents' in materials:
+            return materials['documents']
+        return dedup_search_results(materials.get('search_results', []))[0]
+
+    def _evaluation_materials(self, research_materials):
+        """评估阶段使用的研究材料：增量复查时只包含本次新发现的文档"""
+        if not research_materials.get('incremental'):
+            return research_materials
+        new_documents = [document for document in research_materials['documents'] if document.get('is_new')]
+        new_duplicates = [duplicate for duplicate in research_materials['dedup']['duplicates'] if duplicate.get('is_new')]
+        return dict(research_materials, documents=new_documents, dedup={
+            'total': len(new_documents) + len(new_duplicates),
+            'unique': len(new_documents),
+            'duplicates': new_duplicates,
+        })
+
+    @staticmethod
+    def _has_clues_to_evaluate(evaluation_materials):
+        """增量复查没有发现新文档时不再调用评估模型"""
+        return not (evaluation_materials.get('incremental') and not evaluation_materials['documents'])
+
+    def _merge_evaluation(self, research_materials, evaluation_materials, previous, evaluated_clues):
+        """增量复查时把上次评估出的线索与本次新增线索合并，预筛记录写回完整的研究材料
+
+        评估代理每次都从 1 开始编号，合并时新增线索接着历史线索的最大编号继续编号，
+        并以 is_new 区分本次新增（True）和历史（False）线索，供总结和归档使用。
+        """
+        if 'screening' in evaluation_materials:
+            research_materials['screening'] = evaluation_materials['screening']
+        if previous is None:
+            return evaluated_clues
+        previous_clues = [dict(clue, is_new=False) for clue in previous['evaluated_clues']]
+        next_id = max((int(clue['clue_id']) for clue in previous_clues if str(clue.get('clue_id', '')).isdigit()), default=0) + 1
+        new_clues = [dict(clue, clue_id=next_id + i, is_new=True) for i, clue in enumerate(evaluated_clues or [])]
+        return previous_clues + new_clues
+
+    def _save_history(self, patent_text, research_materials, evaluated_clues, summary):
+        """每次分析成功后记录去重后的文档和全部评估线索，作为下次增量复查的基础
+
+        完整分析也会记录，因此第一次增量复查就能复用此前的结果；只保存去重文档（每个文档一条），
+        多次复查后历史记录只随不同文档数增长。
+        """
+        if research_history is None or summary in FAILED_RESULTS:
+            return
+        documents = [
+            {key: document.get(key, '') for key in ('snippet', 'link', 'title', 'query')}
+            for document in research_materials.get('documents', [])
+        ]
+        research_history.set(patent_text, date.today().isoformat(), {'documents': documents}, evaluated_clues or [])
+
+    def _prescreen(self, research_materials, progress_callback=None):
+        """在本地对搜索结果去重和排序，只把最相关的线索交给评估模型"""
+        if not CLUE_PRESCREEN_ENABLED:
+            return
+        with ANALYSIS_STAGE_SECONDS.time(stage='prescreen'):
+            screen_clues(research_materials)
+        screening = research_materials['screening']
+        report_progress(progress_callback, 'prescreen', total=screening['total'], unique=screening['unique'], kept=screening['kept'])
+
+    def _evaluation_prompt(self, research_materials, **kwargs):
+        """获取评估阶段的自定义 prompt"""
+        patent_info = self.extract_patent_info(research_materials)
+        return get_customized_prompt(
+            'evaluation', 
+            company_name=kwargs.get('company_name', '全球知名ICT公司'),
+            patent_info=patent_info,
+            target_companies=kwargs.get('target_companies', [])
+        )
+
+    def _inject_evaluated_clues(self, research_materials, evaluated_clues):
         # 注释掉这个检查，即使评估失败也继续执行
         # if not evaluated_clues:
         #     return "评估失败，线索信息不完整"
@@ -47,9 +384,6 @@ class PatentAnalyzer:
         # 过滤无效线索（保留高风险线索）
         high_risk_clues = [clue for clue in evaluated_clues if clue.get("match_score", 0) >= 70]
         research_materials['evaluated_clues'] = high_risk_clues  # 注入评估结果
-
-        # 第三阶段：总结代理生成报告
-        return self.summary_agent.generate_summary(research_materials, summary_prompt)
     
     def extract_patent_info(self, research_materials):
         """从研究材料中提取专利信息，用于定制评估 prompt"""
@@ -0,0 +1,160 @@
+import re
+
+TRUNCATION_NOTE = "\n... (truncated due to length)"
+
+# 章节标题独占一行，兼容中文专利文本和英文专利文本
+SECTION_PATTERNS = (
+    ('abstract', re.compile(r'^\s*(说明书摘要|摘\s*要|abstract(\s+of\s+the\s+disclosure)?)\s*[:：]?\s*$', re.I)),
+    ('claims', re.compile(r'^\s*(权\s*利\s*要\s*求\s*书?|claims?|what\s+is\s+claimed\s+is|(we|i)\s+claim)\s*[:：]?\s*$', re.I)),
+    ('description', re.compile(
+        r'^\s*(说\s*明\s*书|技术领域|背景技术|发明内容|具体实施方式|description(\s+of\s+.*)?|detailed\s+description.*|'
+        r'background(\s+of\s+the\s+invention)?|(technical\s+)?field(\s+of\s+the\s+invention)?|summary(\s+of\s+the\s+invention)?)'
+        r'\s*[:：]?\s*$', re.I)),
+)
+CLAIM_NUMBER = re.compile(r'^\s*(\d{1,3})\s*[.、．]\s*', re.M)
+# 引用其他权利要求的为从属权利要求
+CLAIM_REFERENCE = re.compile(
+    r'(根据|如|按照|依据)\s*权利要求\s*\d|权利要求\s*\d+\s*(所述|中任一|至)|'
+    r'\b(of|to|in|with|by)\s+(any\s+(one\s+)?of\s+)?claims?\s+\d', re.I)
+
+
+def segment_patent(text):
+    """把专利全文切分为 {abstract, claims, description}；claims 为按编号拆分的权利要求列表
+
+    无法识别章节标题时整篇作为 description。标题之前的内容（著录项目等）并入 description 开头。
+    """
+    segments = {'abstract': [], 'claims': [], 'description': []}
+    current = 'description'
+    for line in text.splitlines(keepends=True):
+        for kind, pattern in SECTION_PATTERNS:
+            if len(line) < 80 and pattern.match(line):
+                current = kind
+                break
+        else:
+            segments[current].append(line)
+
+    return {
+        'abstract': "".join(segments['abstract']).strip(),
+        'claims': split_claims("".join(segments['claims'])),
+        'description': "".join(segments['description']).strip(),
+    }
+
+
+def split_claims(claims_text):
+    """按 1. 2. 3. …… 的顺序编号拆分权利要求；只接受依次递增的编号，避免误切权利要求内部的列表"""
+    starts = []
+    expected = 1
+    for match in CLAIM_NUMBER.finditer(claims_text):
+        if int(match.group(1)) == expected:
+            starts.append(match.start())
+            expected += 1
+    if not starts:
+        return [claims_text.strip()] if claims_text.strip() else []
+    bounds = starts + [len(claims_text)]
+    return [claims_text[bounds[i]:bounds[i + 1]].strip() for i in range(len(starts))]
+
+
+def is_independent_claim(claim):
+    return CLAIM_REFERENCE.search(claim) is None
+
+
+def _split_long_text(text, max_chars):
+    """按段落（优先空行，其次换行）把文本切成不超过 max_chars 的片段，超长段落再按长度硬切"""
+    pieces = []
+    current = ""
+    for paragraph in re.split(r'(?<=\n)', text):
+        while len(paragraph) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if len(current) + len(paragraph) > max_chars:
+            pieces.append(current)
+            current = ""
+        current += paragraph
+    if current.strip():
+        pieces.append(current)
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+
+def chunk_patent(text, max_chars):
+    """把专利切成若干不超过 max_chars 的块，返回 [{'kind', 'text'}]
+
+    权利要求只在权利要求之间断开，说明书在段落之间断开，摘要单独成块。
+    """
+    segments = segment_patent(text)
+    chunks = []
+    if segments['abstract']:
+        chunks.extend({'kind': 'abstract', 'text': piece} for piece in _split_long_text(segments['abstract'], max_chars))
+
+    current = []
+    for claim in segments['claims']:
+        if current and len("\n".join(current)) + len(claim) + 1 > max_chars:
+            chunks.append({'kind': 'claims', 'text': "\n".join(current)})
+            current = []
+        if len(claim) > max_chars:
+            chunks.extend({'kind': 'claims', 'text': piece} for piece in _split_long_text(claim, max_chars))
+        else:
+            current.append(claim)
+    if current:
+        chunks.append({'kind': 'claims', 'text': "\n".join(current)})
+
+    if segments['description']:
+        chunks.extend({'kind': 'description', 'text': piece} for piece in _split_long_text(segments['description'], max_chars))
+    return chunks
+
+
+def condense_patent(text, max_chars):
+    """在 max_chars 以内保留专利中最重要的内容，代替直接截取开头
+
+    优先级：独立权利要求 > 摘要 > 从属权利要求 > 说明书。无法识别章节时退回到截取开头。
+    """
+    if len(text) <= max_chars:
+        return text
+
+    segments = segment_patent(text)
+    if not segments['claims'] and not segments['abstract']:
+        return text[:max_chars] + TRUNCATION_NOTE
+
+    claims = segments['claims']
+    budget = max_chars
+    kept_claims = {}
+
+    def keep_claims(indices):
+        nonlocal budget
+        for index in indices:
+            if len(claims[index]) + 1 > budget:
+                continue
+            kept_claims[index] = claims[index]
+            budget -= len(claims[index]) + 1
+
+    def take(content):
+        nonlocal budget
+        if budget <= 0 or not content:
+            return ""
+        taken = content if len(content) <= budget else content[:budget] + TRUNCATION_NOTE
+        budget -= len(taken)
+        return taken
+
+    # 按优先级分配篇幅，再按原文顺序输出
+    independent = [index for index, claim in enumerate(claims) if is_independent_claim(claim)]
+    keep_claims(independent)
+    if independent and not kept_claims:
+        kept_claims[independent[0]] = take(claims[independent[0]])
+    abstract_text = take(segments['abstract'])
+    keep_claims(index for index in range(len(claims)) if index not in independent)
+    description_text = take(segments['description'])
+
+    claims_text = "\n".join(kept_claims[index] for index in sorted(kept_claims))
+    if len(kept_claims) < len(claims):
+        claims_text += f"\n（其余 {len(claims) - len(kept_claims)} 项权利要求因篇幅省略）"
+
+    parts = []
+    if abstract_text:
+        parts.append(f"摘要：\n{abstract_text}")
+    if claims_text:
+        parts.append(f"权利要求书：\n{claims_text}")
+    if description_text:
+        parts.append(f"说明书（节选）：\n{description_text}")
+    return "\n\n".join(parts)
@@ -0,0 +1,315 @@
+import argparse
+import hashlib
+import importlib.util
+import io
+import multiprocessing
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+
+from agents.metrics import PDF_PAGE_CACHE_REQUESTS
+from agents.sqlite_cache import SQLiteCache
+from config.settings import (
+    PDF_EXTRACTOR_BACKEND, PDF_PARALLEL_MIN_PAGES, PDF_EXTRACTION_WORKERS,
+    PDF_PAGE_CACHE_ENABLED, PDF_PAGE_CACHE_PATH, PDF_PAGE_CACHE_TTL_SECONDS, PDF_PAGE_CACHE_MAX_ENTRIES
+)
+
+
+class PdfBackend(ABC):
+    """PDF 文本提取后端：按页提取，输入为 PDF 文件的字节内容
+
+    子类需定义 name、module（用于判断依赖是否已安装）并实现 page_count 和 extract_pages。
+    """
+    name = None
+    module = None
+
+    @classmethod
+    def available(cls):
+        return importlib.util.find_spec(cls.module) is not None
+
+    @abstractmethod
+    def page_count(self, data):
+        pass
+
+    @abstractmethod
+    def extract_pages(self, data, start, stop):
+        """返回第 start 到 stop-1 页的文本列表，无文本的页为空字符串"""
+        pass
+
+
+class PyPDF2Backend(PdfBackend):
+    name = 'pypdf2'
+    module = 'PyPDF2'
+
+    def _reader(self, data):
+        from PyPDF2 import PdfReader
+        return PdfReader(io.BytesIO(data))
+
+    def page_count(self, data):
+        return len(self._reader(data).pages)
+
+    def extract_pages(self, data, start, stop):
+        reader = self._reader(data)
+        return [reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+
+class PypdfBackend(PyPDF2Backend):
+    """PyPDF2 的后继版本，接口相同但提取速度更快"""
+    name = 'pypdf'
+    module = 'pypdf'
+
+    def _reader(self, data):
+        from pypdf import PdfReader
+        return PdfReader(io.BytesIO(data))
+
+
+class PyMuPDFBackend(PdfBackend):
+    """基于 MuPDF 的 C 实现，通常是最快的后端"""
+    name = 'pymupdf'
+    module = 'fitz'
+
+    def page_count(self, data):
+        import fitz
+        with fitz.open(stream=data, filetype='pdf') as document:
+            return document.page_count
+
+    def extract_pages(self, data, start, stop):
+        import fitz
+        with fitz.open(stream=data, filetype='pdf') as document:
+            return [document[index].get_text() for index in range(start, stop)]
+
+
+class PdfminerBackend(PdfBackend):
+    name = 'pdfminer'
+    module = 'pdfminer'
+
+    def page_count(self, data):
+        from pdfminer.pdfpage import PDFPage
+        return sum(1 for _ in PDFPage.get_pages(io.BytesIO(data)))
+
+    def extract_pages(self, data, start, stop):
+        from pdfminer.high_level import extract_text
+        pages = []
+        for index in range(start, stop):
+            pages.append(extract_text(io.BytesIO(data), page_numbers=[index]))
+        return pages
+
+
+# 后端注册表，auto 模式按 BACKEND_PREFERENCE 顺序选择第一个可用的后端
+BACKENDS = {backend.name: backend for backend in (PyMuPDFBackend, PypdfBackend, PdfminerBackend, PyPDF2Backend)}
+BACKEND_PREFERENCE = ('pymupdf', 'pypdf', 'pypdf2', 'pdfminer')
+
+
+def register_backend(backend_class):
+    BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+def available_backends():
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+def get_backend(name='auto'):
+    if name == 'auto':
+        for candidate in BACKEND_PREFERENCE:
+            if candidate in BACKENDS and BACKENDS[candidate].available():
+                return BACKENDS[candidate]()
+        raise RuntimeError("没有可用的 PDF 提取后端，请安装 PyPDF2、pypdf 或 PyMuPDF")
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"不支持的 PDF 提取后端: {name}")
+    if not backend.available():
+        raise RuntimeError(f"PDF 提取后端 {name} 未安装（缺少 {backend.module}）")
+    return backend()
+
+
+def _extract_page_range(backend_name, data, start, stop):
+    """进程池中执行的任务，必须是模块级函数才能被序列化"""
+    return BACKENDS[backend_name]().extract_pages(data, start, stop)
+
+
+# 进程池在第一次需要并行提取时创建，进程内共享。使用 spawn 启动子进程，
+# 避免在已有多个线程（Flask、分析任务线程池）的进程中 fork 导致死锁
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool(max_workers):
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown()
+            _process_pool = None
+
+
+class PdfPageCache(SQLiteCache):
+    """按 (后端, 文件内容哈希, 页码) 缓存每页提取出的文本，同一文件重复上传时无需再次解析"""
+
+    def __init__(self, db_path, ttl_seconds=90 * 24 * 3600, max_entries=200000):
+        super().__init__(db_path, 'pdf_pages', ttl_seconds, max_entries)
+
+    @staticmethod
+    def make_key(backend_name, digest, page_index):
+        return f"{backend_name}:{digest}:{page_index}"
+
+    def get_pages(self, backend_name, digest, page_count):
+        """返回 {页码: 文本}，只包含命中的页"""
+        keys = {self.make_key(backend_name, digest, index): index for index in range(page_count)}
+        return {keys[key]: text for key, text in self.get_values(list(keys)).items()}
+
+    def set_pages(self, backend_name, digest, pages):
+        """pages 为 {页码: 文本}"""
+        self.set_values({self.make_key(backend_name, digest, index): text for index, text in pages.items()})
+
+
+class PdfTextExtractor:
+    """PDF 文本提取：可选后端、按页缓存，页数较多时把页拆分到进程池中并行提取"""
+
+    def __init__(self, backend=PDF_EXTRACTOR_BACKEND, page_cache=None, parallel_min_pages=PDF_PARALLEL_MIN_PAGES,
+                 max_workers=PDF_EXTRACTION_WORKERS):
+        self.backend = get_backend(backend) if isinstance(backend, str) else backend
+        self.page_cache = page_cache
+        self.parallel_min_pages = parallel_min_pages
+        self.max_workers = max_workers
+
+    def extract(self, data):
+        """提取 PDF 字节内容中的全部文本，按页顺序以换行连接；没有任何文本时返回 None"""
+        return self.extract_document(data)['text']
+
+    def extract_document(self, data, digest=None):
+        """提取全部文本并返回 {text, page_count, backend}，digest 为调用方已算好的内容哈希"""
+        page_count = self.backend.page_count(data)
+        digest = digest or hashlib.sha256(data).hexdigest()
+
+        pages = {}
+        if self.page_cache is not None:
+            pages = self.page_cache.get_pages(self.backend.name, digest, page_count)
+            PDF_PAGE_CACHE_REQUESTS.inc(len(pages), result='hit')
+            PDF_PAGE_CACHE_REQUESTS.inc(page_count - len(pages), result='miss')
+
+        missing = [index for index in range(page_count) if index not in pages]
+        if missing:
+            extracted = self._extract_missing(data, missing)
+            pages.update(extracted)
+            if self.page_cache is not None:
+                self.page_cache.set_pages(self.backend.name, digest, extracted)
+
+        text = "\n".join(pages[index] for index in range(page_count) if pages[index])
+        return {'text': text + "\n" if text else None, 'page_count': page_count, 'backend': self.backend.name}
+
+    def _extract_missing(self, data, missing):
+        """提取缺失的页，返回 {页码: 文本}；连续的缺失页合并为一个区间交给同一个任务"""
+        parallel = self.max_workers > 1 and len(missing) >= self.parallel_min_pages
+        ranges = _split_ranges(missing, self._chunk_size(len(missing)) if parallel else len(missing))
+        if parallel and len(ranges) > 1:
+            try:
+                pool = _get_process_pool(self.max_workers)
+                futures = [pool.submit(_extract_page_range, self.backend.name, data, start, stop) for start, stop in ranges]
+                return {
+                    index: text
+                    for (start, stop), future in zip(ranges, futures)
+                    for index, text in zip(range(start, stop), future.result())
+                }
+            except Exception as e:
+                # 进程池不可用（如受限环境无法创建子进程）时退回到当前进程中提取
+                print(f"[PdfTextExtractor] 并行提取失败，改为串行: {type(e).__name__} - {str(e)}")
+
+        pages = {}
+        for start, stop in ranges:
+            pages.update(zip(range(start, stop), self.backend.extract_pages(data, start, stop)))
+        return pages
+
+    def _chunk_size(self, page_count):
+        # 每个工作进程分到约两个区间，兼顾负载均衡和重复解析文档结构的开销
+        return max(1, -(-page_count // (self.max_workers * 2)))
+
+
+def _split_ranges(indices, chunk_size):
+    """把有序页码列表切成 [start, stop) 区间：遇到不连续或达到 chunk_size 时断开"""
+    ranges = []
+    for index in indices:
+        if ranges and ranges[-1][1] == index and ranges[-1][1] - ranges[-1][0] < chunk_size:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+    return [tuple(item) for item in ranges]
+
+
+_default_extractor = None
+_default_extractor_lock = threading.Lock()
+
+
+def get_pdf_extractor():
+    """返回按配置创建的进程内共享提取器"""
+    global _default_extractor
+    with _default_extractor_lock:
+        if _default_extractor is None:
+            page_cache = None
+            if PDF_PAGE_CACHE_ENABLED:
+                page_cache = PdfPageCache(PDF_PAGE_CACHE_PATH, PDF_PAGE_CACHE_TTL_SECONDS, PDF_PAGE_CACHE_MAX_ENTRIES)
+            _default_extractor = PdfTextExtractor(page_cache=page_cache)
+        return _default_extractor
+
+
+def benchmark(paths, backends=None, repeat=3, max_workers=PDF_EXTRACTION_WORKERS):
+    """比较各后端在串行和并行模式下的提取耗时（不使用页缓存），返回结果行列表"""
+    rows = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        for name in backends or available_backends():
+            backend = get_backend(name)
+            pages = backend.page_count(data)
+            for mode, extractor in (
+                ('serial', PdfTextExtractor(backend, parallel_min_pages=pages + 1, max_workers=1)),
+                ('parallel', PdfTextExtractor(backend, parallel_min_pages=1, max_workers=max_workers)),
+            ):
+                timings = []
+                text = None
+                for _ in range(repeat):
+                    started_at = time.perf_counter()
+                    text = extractor.extract(data)
+                    timings.append(time.perf_counter() - started_at)
+                rows.append({
+                    'file': path,
+                    'backend': name,
+                    'mode': mode,
+                    'pages': pages,
+                    'chars': len(text or ""),
+                    'best_seconds': min(timings),
+                    'mean_seconds': sum(timings) / len(timings),
+                })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较各 PDF 提取后端的速度")
+    parser.add_argument('files', nargs='+', help="用于测试的 PDF 文件")
+    parser.add_argument('-b', '--backend', action='append', help=f"要测试的后端，可重复指定，默认测试全部已安装的后端（{', '.join(BACKENDS)}）")
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('-j', '--workers', type=int, default=PDF_EXTRACTION_WORKERS)
+    args = parser.parse_args(argv)
+
+    # 预先启动进程池，避免把子进程的启动时间计入第一次并行提取
+    pool = _get_process_pool(args.workers)
+    for future in [pool.submit(available_backends) for _ in range(args.workers)]:
+        future.result()
+
+    print(f"{'file':<30} {'backend':<10} {'mode':<9} {'pages':>6} {'chars':>9} {'best(s)':>9} {'mean(s)':>9}")
+    for row in benchmark(args.files, args.backend, args.repeat, args.workers):
+        print(f"{row['file'][-30:]:<30} {row['backend']:<10} {row['mode']:<9} {row['pages']:>6} {row['chars']:>9} "
+              f"{row['best_seconds']:>9.3f} {row['mean_seconds']:>9.3f}")
+    shutdown_process_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+def report_progress(progress_callback, event, **data):
+    """向进度回调发送一个事件；未设置回调时直接忽略，回调自身出错不影响分析流程"""
+    if progress_callback is None:
+        return
+    try:
+        progress_callback(event, **data)
+    except Exception as e:
+        print(f"[report_progress] 进度回调失败: {type(e).__name__} - {str(e)}")
@@ -0,0 +1,36 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """线程安全的令牌桶限速器，多个线程共享同一个实例即可共享速率配额"""
+
+    def __init__(self, rate, burst=1):
+        """
+        Args:
+            rate: 每秒补充的令牌数，<=0 表示不限速
+            burst: 桶容量，即允许的最大突发请求数
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取走一个令牌，令牌不足时阻塞等待，返回实际等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+            waited += wait_seconds
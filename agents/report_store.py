@@ -0,0 +1,219 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+from html import unescape
+
+from agents.search_index import index_tokens
+
+HTML_TAG = re.compile(r'<[^>]+>')
+# 全文检索只在最新的这么多条命中中按相关度排序，命中数很大时查询耗时不随归档规模增长
+MAX_SEARCH_CANDIDATES = 1000
+
+
+def new_report_id():
+    return f"HW-PAT-{datetime.now().year}-{uuid.uuid4().hex[:10].upper()}"
+
+
+def build_archive_entry(research_materials, analysis_params=None, patent_info=None, result=""):
+    """从一次分析的研究材料中整理出归档检索用的字段
+
+    报告正文优先使用总结阶段生成的 markdown，没有时从 HTML 中去掉标签。
+    """
+    analysis_params = analysis_params or {}
+    patent_info = patent_info or {}
+    research_materials = research_materials or {}
+    clues = [
+        ("新增 " if clue.get('is_new') else "") + f"{clue.get('risk_level', '')} {clue.get('match_score', '')} {clue.get('evidence', '')}"
+        for clue in research_materials.get('evaluated_clues', [])
+    ]
+    return {
+        'patent_number': patent_info.get('patent_number') or '',
+        'filing_date': patent_info.get('filing_date') or '',
+        'company_name': analysis_params.get('company_name', ''),
+        'target_companies': analysis_params.get('target_companies', ''),
+        'focus_area': analysis_params.get('focus_area', ''),
+        'queries': [record.get('query', '') for record in research_materials.get('search_results', [])],
+        'clues': clues,
+        'content': research_materials.get('report_markdown') or unescape(HTML_TAG.sub(' ', result)),
+    }
+
+
+def _match_expression(text, columns=None, prefix=False):
+    """把用户输入转换为 FTS5 查询：全部词都需出现（AND），可限定在某些列中；prefix 为 True 时按前缀匹配"""
+    tokens = list(dict.fromkeys(index_tokens(text)))
+    if not tokens:
+        return None
+    expression = " AND ".join(f'"{token}"' + ('*' if prefix else '') for token in tokens)
+    return f"{{{' '.join(columns)}}} : ({expression})" if columns else f"({expression})"
+
+
+class ReportStore:
+    """服务端报告存储：每次分析的报告 HTML 以 zlib 压缩后存入 SQLite，按稳定的报告 ID 读取
+
+    会话中只保存报告 ID，报告可在之后任意时间重新打开，无需重新分析。
+    保存时附带归档字段的报告同时写入 FTS5 索引，可按专利号、企业、关注领域或报告内容检索。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """调用方需持有锁"""
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    report_id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    source_type TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    analysis_params TEXT NOT NULL,
+                    result BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at);
+                CREATE TABLE IF NOT EXISTS report_archive (
+                    id INTEGER PRIMARY KEY,
+                    report_id TEXT NOT NULL UNIQUE,
+                    created_at REAL NOT NULL,
+                    patent_number TEXT NOT NULL,
+                    filing_date TEXT NOT NULL,
+                    company_name TEXT NOT NULL,
+                    target_companies TEXT NOT NULL,
+                    focus_area TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_report_archive_created ON report_archive (created_at);
+                CREATE VIRTUAL TABLE IF NOT EXISTS report_archive_fts USING fts5(
+                    patent_number, companies, focus_area, queries, clues, content
+                );
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def save(self, result, source_type='', source='', analysis_params=None, report_id=None, archive=None):
+        """保存报告 HTML，返回报告 ID；archive 为 build_archive_entry 的返回值时同时写入检索索引"""
+        report_id = report_id or new_report_id()
+        created_at = time.time()
+        row = (
+            report_id,
+            created_at,
+            source_type,
+            source,
+            json.dumps(analysis_params or {}, ensure_ascii=False),
+            zlib.compress(result.encode('utf-8')),
+        )
+        with self._lock:
+            conn = self._connection()
+            conn.execute("""
+                INSERT OR REPLACE INTO reports (report_id, created_at, source_type, source, analysis_params, result)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, row)
+            if archive is not None:
+                self._archive(conn, report_id, created_at, archive)
+            conn.commit()
+        return report_id
+
+    def _archive(self, conn, report_id, created_at, archive):
+        previous = conn.execute("SELECT id FROM report_archive WHERE report_id = ?", (report_id,)).fetchone()
+        if previous is not None:
+            conn.execute("DELETE FROM report_archive WHERE id = ?", previous)
+            conn.execute("DELETE FROM report_archive_fts WHERE rowid = ?", previous)
+        cursor = conn.execute("""
+            INSERT INTO report_archive (report_id, created_at, patent_number, filing_date, company_name, target_companies, focus_area)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (report_id, created_at, archive['patent_number'], archive['filing_date'],
+              archive['company_name'], archive['target_companies'], archive['focus_area']))
+        # 索引列保存分词结果（中文双字），FTS5 默认分词器无法切分中文
+        conn.execute("""
+            INSERT INTO report_archive_fts (rowid, patent_number, companies, focus_area, queries, clues, content)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (cursor.lastrowid,
+              " ".join(index_tokens(archive['patent_number'])),
+              " ".join(index_tokens(f"{archive['company_name']} {archive['target_companies']}")),
+              " ".join(index_tokens(archive['focus_area'])),
+              " ".join(index_tokens(" ".join(archive['queries']))),
+              " ".join(index_tokens(" ".join(archive['clues']))),
+              " ".join(index_tokens(archive['content']))))
+
+    def get(self, report_id):
+        """返回 {report_id, created_at, source_type, source, analysis_params, result}，不存在时返回 None"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT report_id, created_at, source_type, source, analysis_params, result FROM reports WHERE report_id = ?",
+                (report_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'report_id': row[0],
+            'created_at': datetime.fromtimestamp(row[1]),
+            'source_type': row[2],
+            'source': row[3],
+            'analysis_params': json.loads(row[4]),
+            'result': zlib.decompress(row[5]).decode('utf-8'),
+        }
+
+    def search(self, query='', patent_number='', company='', focus_area='', page=1, per_page=20):
+        """检索归档的报告；各条件之间为 AND，全部为空时按时间倒序列出
+
+        有检索条件时，在最新的 MAX_SEARCH_CANDIDATES 条命中中按 BM25 相关度排序，total 最多计到该数量，
+        超出时 total_capped 为 True，此时应增加检索条件缩小范围。
+        返回 {total, total_capped, page, per_page, results: [{report_id, created_at, patent_number, filing_date,
+        company_name, target_companies, focus_area}]}
+        """
+        expressions = [expression for expression in (
+            _match_expression(query),
+            _match_expression(patent_number, ['patent_number'], prefix=True),
+            _match_expression(company, ['companies', 'clues']),
+            _match_expression(focus_area, ['focus_area']),
+        ) if expression]
+        page = max(page, 1)
+        offset = (page - 1) * per_page
+        columns = "a.report_id, a.created_at, a.patent_number, a.filing_date, a.company_name, a.target_companies, a.focus_area"
+
+        with self._lock:
+            conn = self._connection()
+            if expressions:
+                match = " AND ".join(expressions)
+                total = conn.execute("""
+                    SELECT COUNT(*) FROM (
+                        SELECT rowid FROM report_archive_fts WHERE report_archive_fts MATCH ? LIMIT ?
+                    )
+                """, (match, MAX_SEARCH_CANDIDATES + 1)).fetchone()[0]
+                rows = conn.execute(f"""
+                    SELECT {columns} FROM (
+                        SELECT rowid, rank FROM report_archive_fts WHERE report_archive_fts MATCH ?
+                        ORDER BY rowid DESC LIMIT ?
+                    ) f JOIN report_archive a ON a.id = f.rowid
+                    ORDER BY f.rank LIMIT ? OFFSET ?
+                """, (match, MAX_SEARCH_CANDIDATES, per_page, offset)).fetchall()
+            else:
+                total = conn.execute("SELECT COUNT(*) FROM report_archive").fetchone()[0]
+                rows = conn.execute(f"""
+                    SELECT {columns} FROM report_archive a ORDER BY a.created_at DESC LIMIT ? OFFSET ?
+                """, (per_page, offset)).fetchall()
+
+        keys = ('report_id', 'created_at', 'patent_number', 'filing_date', 'company_name', 'target_companies', 'focus_area')
+        results = []
+        for row in rows:
+            result = dict(zip(keys, row))
+            result['created_at'] = datetime.fromtimestamp(result['created_at']).strftime('%Y-%m-%d %H:%M')
+            results.append(result)
+        return {
+            'total': min(total, MAX_SEARCH_CANDIDATES),
+            'total_capped': total > MAX_SEARCH_CANDIDATES,
+            'page': page,
+            'per_page': per_page,
+            'results': results,
+        }
@@ -1,11 +1,29 @@
+import hashlib
 import requests
+import asyncio
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
-from PyPDF2 import PdfReader
 # from config.settings import OPENAI_API_KEY, OPENAI_BASE_URL, SERP_API_KEY, SERP_API_URL
 from config.settings import MODEL_CONFIG, SERP_API_KEY, SERP_API_URL # 修改导入
-from agents.model_adapter import get_model_adapter # 导入适配器工厂函数
+from config.settings import SEARCH_MAX_CONCURRENCY, SERP_API_RATE_LIMIT, SERP_API_RATE_BURST
+from config.settings import (
+    SEARCH_CACHE_ENABLED, SEARCH_CACHE_BYPASS, SEARCH_CACHE_PATH, SEARCH_CACHE_TTL_SECONDS, SEARCH_CACHE_MAX_ENTRIES
+)
+from config.settings import (
+    SEARCH_INDEX_ENABLED, SEARCH_INDEX_PATH, SEARCH_INDEX_MAX_DOCUMENTS, SEARCH_INDEX_MIN_HITS, SEARCH_INDEX_MIN_COVERAGE, SEARCH_INDEX_MAX_AGE_SECONDS, SEARCH_OFFLINE
+)
+from config.settings import DOCUMENT_STORE_ENABLED, DOCUMENT_STORE_PATH, DOCUMENT_STORE_TTL_SECONDS, DOCUMENT_STORE_MAX_ENTRIES
+from agents.model_adapter import get_model_adapter, get_async_model_adapter # 导入适配器工厂函数
+from agents.progress import report_progress
+from agents.pdf_extractor import get_pdf_extractor
+from agents.document_store import DocumentTextStore
+from agents.context_builder import ContextBuilder, shrink_patent
+from agents.rate_limiter import RateLimiter
+from agents.search_cache import SearchCache
+from agents.search_index import SearchIndex
+from agents.metrics import SERPAPI_REQUEST_SECONDS, SERPAPI_RESULTS, SEARCH_CACHE_REQUESTS, SEARCH_INDEX_REQUESTS, PDF_EXTRACTION_SECONDS, DOCUMENT_STORE_REQUESTS
 
 # 工具定义
 tools = [
@@ -26,15 +44,27 @@ tools = [
     }
 ]
 
+# 所有 ResearchAgent 共享的搜索线程池和 SerpAPI 限速器，限制整个进程对 SerpAPI 的并发和速率
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_CONCURRENCY, thread_name_prefix='serpapi-search')
+serp_api_rate_limiter = RateLimiter(SERP_API_RATE_LIMIT, SERP_API_RATE_BURST)
+search_cache = SearchCache(SEARCH_CACHE_PATH, SEARCH_CACHE_TTL_SECONDS, SEARCH_CACHE_MAX_ENTRIES) if SEARCH_CACHE_ENABLED else None
+# 历次搜索结果的本地全文索引，随每次分析增长；离线模式下是唯一的搜索来源
+search_index = SearchIndex(SEARCH_INDEX_PATH, SEARCH_INDEX_MAX_DOCUMENTS) if SEARCH_INDEX_ENABLED or SEARCH_OFFLINE else None
+# 按文件内容哈希保存提取出的全文，同一文件重复分析时无需再次解析 PDF
+document_store = DocumentTextStore(DOCUMENT_STORE_PATH, DOCUMENT_STORE_TTL_SECONDS, DOCUMENT_STORE_MAX_ENTRIES) if DOCUMENT_STORE_ENABLED else None
+
 
 class ResearchAgent:
-    def __init__(self):
+    def __init__(self, bypass_search_cache=SEARCH_CACHE_BYPASS, offline=SEARCH_OFFLINE):
         # self.client = OpenAI(
         #     api_key=OPENAI_API_KEY,
         #     base_url=OPENAI_BASE_URL
         # )
         self.model_adapter = get_model_adapter(MODEL_CONFIG)
         self.search_count = 0
+        self.bypass_search_cache = bypass_search_cache
+        self.offline = offline
+        self.after_date_floor = None  # 增量复查时设为上次分析日期，所有搜索只返回该日期之后的结果
         self.research_materials = {
             "original_text": "",
             "search_results": []
@@ -42,12 +72,19 @@ class ResearchAgent:
 
     def extract_text(self, file_input):
         """从PDF文件或文件路径提取文本"""
+        with PDF_EXTRACTION_SECONDS.time():
+            return self._extract_text(file_input)
+
+    async def extract_text_async(self, file_input):
+        """在线程中提取文本，避免 PDF 解析阻塞事件循环"""
+        return await asyncio.to_thread(self.extract_text, file_input)
+
+    def _extract_text(self, file_input):
         if isinstance(file_input, str):
             if file_input.endswith('.pdf'):
                 try:
                     with open(file_input, 'rb') as f:
-                        pdf_reader = PdfReader(f)
-                        return self._extract_pdf_text(pdf_reader)
+                        return self._extract_pdf_bytes(f.read())
                 except Exception as e:
                     print(f"文件读取失败: {str(e)}")
                     return None
@@ -55,27 +92,43 @@ class ResearchAgent:
 
         if hasattr(file_input, 'filename') and file_input.filename.endswith('.pdf'):
             try:
-                pdf_reader = PdfReader(file_input)
-                return self._extract_pdf_text(pdf_reader)
+                return self._extract_pdf_bytes(file_input.read())
             except Exception as e:
                 print(f"PDF解析失败: {str(e)}")
                 return None
 
         return None
 
-    def _extract_pdf_text(self, pdf_reader):
-        """从PDF阅读器提取文本"""
-        text = ""
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        return text if text else None
+    def _extract_pdf_bytes(self, data):
+        """先按内容哈希查询全文存储，未命中时解析 PDF 并写回存储"""
+        digest = hashlib.sha256(data).hexdigest()
+        if document_store is not None:
+            document = document_store.get(digest)
+            DOCUMENT_STORE_REQUESTS.inc(result='hit' if document else 'miss')
+            if document:
+                return document['text']
 
-    def search_internet(self, arguments):
+        started_at = time.perf_counter()
+        document = get_pdf_extractor().extract_document(data, digest=digest)
+        # 提取不到文本的文件不写入，以便换用其他后端后重新提取
+        if document_store is not None and document['text']:
+            document_store.set(
+                digest,
+                document['text'],
+                page_count=document['page_count'],
+                backend=document['backend'],
+                size=len(data),
+                extraction_seconds=round(time.perf_counter() - started_at, 3)
+            )
+        return document['text']
+
+    def _search(self, arguments):
+        """执行一次SerpAPI搜索，返回 (格式化结果, 搜索记录)；不修改共享状态，可在线程池中并发调用"""
         try:
             query = arguments["query"]
             after_date = arguments.get("after_date", "")
+            if self.after_date_floor and (not after_date or after_date < self.after_date_floor):
+                after_date = self.after_date_floor
 
             params = {
                 'api_key': SERP_API_KEY,
@@ -88,28 +141,124 @@ class ResearchAgent:
             if after_date:
                 params['q'] = f'{query} after:{after_date}'
 
-            response = requests.get(SERP_API_URL, params=params, timeout=15)
-            response.raise_for_status()
+            results = None
+            if search_cache is not None and not self.bypass_search_cache:
+                results = search_cache.get(query, after_date, params['engine'], params['num'])
+                SEARCH_CACHE_REQUESTS.inc(result='hit' if results is not None else 'miss')
+                if results is not None:
+                    print(f"[搜索缓存] 命中: {query}")
+
+            if results is None:
+                results = self._search_local(query, after_date)
 
-            results = response.json().get('organic_results', [])
-            self.search_count += len(results)
+            if results is None:
+                serp_api_rate_limiter.acquire()
+                started_at = time.perf_counter()
+                try:
+                    response = requests.get(SERP_API_URL, params=params, timeout=15)
+                    response.raise_for_status()
+                    results = response.json().get('organic_results', [])
+                except Exception:
+                    SERPAPI_REQUEST_SECONDS.observe(time.perf_counter() - started_at, outcome='failure')
+                    raise
+                SERPAPI_REQUEST_SECONDS.observe(time.perf_counter() - started_at, outcome='success')
+                SERPAPI_RESULTS.observe(len(results))
+                if search_cache is not None:
+                    search_cache.set(query, after_date, params['engine'], params['num'], results)
+                if search_index is not None:
+                    search_index.add(query, results)
 
             # 格式化搜索结果
             search_result = "\n".join([f"{i + 1}. {res.get('snippet', '')} [URL: {res.get('link', '')}]"
                                        for i, res in enumerate(results)])
 
-            self.research_materials["search_results"].append({
+            record = {
                 "query": query,
                 "result": search_result,
                 "urls": [res.get('link', '') for res in results],  # 单独保存URL列表
+                # 逐条保存结构化结果，供评估前的本地预筛使用
+                "items": [{"snippet": res.get('snippet', ''), "link": res.get('link', ''), "title": res.get('title', '')}
+                          for res in results],
                 "after_date": after_date  # 保存日期筛选条件
-            })
-
-            return search_result
+            }
+            return search_result, record
 
         except Exception as e:
             print(f"SerpAPI搜索失败: {str(e)}")
-            return "暂时无法获取SerpAPI搜索结果"
+            return "暂时无法获取SerpAPI搜索结果", None
+
+    def _search_local(self, query, after_date):
+        """查询本地索引：召回足够或处于离线模式时返回结果，否则返回 None 交由 SerpAPI 搜索
+
+        本地索引不保存可靠的发布日期，带日期筛选的查询只在离线模式下使用本地结果。
+        在线时只使用 SEARCH_INDEX_MAX_AGE_SECONDS 内写入或刷新过的文档，过期后重新请求 SerpAPI 刷新索引。
+        """
+        if search_index is None or (after_date and not self.offline):
+            return None
+        results = search_index.search(query, limit=30, min_coverage=SEARCH_INDEX_MIN_COVERAGE,
+                                      max_age_seconds=None if self.offline else SEARCH_INDEX_MAX_AGE_SECONDS)
+        if self.offline or len(results) >= SEARCH_INDEX_MIN_HITS:
+            SEARCH_INDEX_REQUESTS.inc(result='hit')
+            print(f"[本地索引] 命中 {len(results)} 条: {query}")
+            return results
+        SEARCH_INDEX_REQUESTS.inc(result='miss')
+        return None
+
+    def _record_search(self, record):
+        if record is None:
+            return
+        self.search_count += len(record["urls"])
+        self.research_materials["search_results"].append(record)
+
+    def search_internet(self, arguments):
+        search_result, record = self._search(arguments)
+        self._record_search(record)
+        return search_result
+
+    def _run_search_tool_call(self, tool_call, progress_callback=None):
+        """执行一次搜索工具调用；参数无法解析时返回错误信息作为 tool 消息，让模型修正后重新调用"""
+        try:
+            arguments = json.loads(tool_call.function.arguments)
+        except json.JSONDecodeError as e:
+            print(f"[执行搜索] 工具参数不是有效的 JSON: {tool_call.function.arguments!r} - {str(e)}")
+            return f"工具参数不是有效的 JSON（{str(e)}），请重新调用 search_internet，参数格式为 {{\"query\": \"搜索关键词\"}}", None
+        if not isinstance(arguments, dict) or not arguments.get('query'):
+            print(f"[执行搜索] 工具参数缺少 query: {tool_call.function.arguments!r}")
+            return "工具参数缺少 query，请重新调用 search_internet，参数格式为 {\"query\": \"搜索关键词\"}", None
+        print(f"\n[执行搜索] 关键词: {arguments['query']} 日期筛选: after:{arguments.get('after_date', '无')}")
+        report_progress(progress_callback, 'search', query=arguments['query'], after_date=arguments.get('after_date', ''))
+        result, record = self._search(arguments)
+        print(f"[搜索结果] 摘要: {result}...")  # 显示部分结果
+        return result, record
+
+    def _collect_tool_responses(self, search_calls, outcomes):
+        """按原 tool_call 顺序记录搜索结果并生成 tool 消息"""
+        tool_responses = []
+        for tool_call, (result, record) in zip(search_calls, outcomes):
+            self._record_search(record)
+            tool_responses.append({
+                "tool_call_id": tool_call.id,
+                "role": "tool",
+                "name": "search_internet",
+                "content": result
+            })
+        return tool_responses
+
+    def _execute_tool_calls(self, tool_calls, progress_callback=None):
+        """在共享线程池中并发执行一轮的全部搜索工具调用，结果按原 tool_call 顺序返回"""
+        search_calls = [tool_call for tool_call in tool_calls if tool_call.function.name == "search_internet"]
+        outcomes = list(search_executor.map(lambda tool_call: self._run_search_tool_call(tool_call, progress_callback), search_calls))
+        return self._collect_tool_responses(search_calls, outcomes)
+
+    async def _execute_tool_calls_async(self, tool_calls, progress_callback=None):
+        """_execute_tool_calls 的异步版本，搜索仍在共享线程池中执行，因此共用并发上限和限速器"""
+        loop = asyncio.get_running_loop()
+        search_calls = [tool_call for tool_call in tool_calls if tool_call.function.name == "search_internet"]
+        outcomes = await asyncio.gather(*(
+            loop.run_in_executor(search_executor, self._run_search_tool_call, tool_call, progress_callback)
+            for tool_call in search_calls
+        ))
+        return self._collect_tool_responses(search_calls, outcomes)
 
     def get_response(self, messages):
         # try:
@@ -127,62 +276,95 @@ class ResearchAgent:
         # 注意：Ollama模型可能不支持OpenAI的tools格式，如果使用Ollama且需要工具调用，
         # OllamaAdapter中的get_response需要特殊处理工具调用逻辑，或者禁用工具调用。
         # 这里假设ResearchAgent的get_response总是需要tools，如果Ollama不支持，需要调整。
-        kwargs_for_model = {"model": MODEL_CONFIG.get("model_name")}
+        return self.model_adapter.get_response(messages, **self._model_kwargs())
+
+    def _model_kwargs(self):
+        kwargs_for_model = {"model": MODEL_CONFIG.get("model_name"), "stage": "research"}
         if MODEL_CONFIG.get("type") == "openai": # 只有OpenAI模型明确支持tools
             kwargs_for_model["tools"] = tools
             kwargs_for_model["tool_choice"] = "auto"
-        
-        return self.model_adapter.get_response(messages, **kwargs_for_model)
+        return kwargs_for_model
 
-    def conduct_research(self, patent_text, research_prompt):
+    def _start_research(self, patent_text, research_prompt, patent_context=None):
+        """记录原文并构造研究阶段的初始对话；patent_context 为长专利预先生成的要点"""
         self.research_materials["original_text"] = patent_text # Store full original text
-    
-        # Truncate patent_text for the prompt if it's too long
-        prompt_patent_text = patent_text
-        max_len = 15000
-        if len(prompt_patent_text) > max_len:
-            prompt_patent_text = prompt_patent_text[:max_len] + "\n... (truncated due to length)"
-
-        messages = [
-            {"role": "system", "content": research_prompt},
-            {"role": "user", "content": prompt_patent_text} # Use truncated text for prompt
+        self.research_materials["patent_context"] = patent_context or patent_text
+
+        # 按研究阶段的 token 预算装入专利内容，超出时优先保留权利要求
+        context = ContextBuilder('research') \
+            .add('system', research_prompt, priority=0) \
+            .add('patent', self.research_materials["patent_context"], priority=1, shrink=shrink_patent) \
+            .build()
+        return [
+            {"role": "system", "content": context['system']},
+            {"role": "user", "content": context['patent']}
         ]
+
+    def _append_assistant_message(self, messages, assistant_msg):
+        # Convert MockMessage to dict before appending if it's not already a dict
+        if hasattr(assistant_msg, 'content'): # Check if it's a MockMessage-like object
+            assistant_entry = {"role": "assistant", "content": assistant_msg.content}
+            if assistant_msg.tool_calls:
+                # 后续的 tool 消息必须对应上一条 assistant 消息中的 tool_calls
+                assistant_entry["tool_calls"] = [{
+                    "id": tool_call.id,
+                    "type": "function",
+                    "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments}
+                } for tool_call in assistant_msg.tool_calls]
+            messages.append(assistant_entry)
+        else: # Assuming it's already a dict (e.g. from OpenAI response)
+            messages.append(assistant_msg)
+
+    def conduct_research(self, patent_text, research_prompt, progress_callback=None, patent_context=None):
+        messages = self._start_research(patent_text, research_prompt, patent_context)
     
         max_rounds = 5
-        for _ in range(max_rounds):
+        for round_index in range(max_rounds):
+            report_progress(progress_callback, 'research_round', round=round_index + 1, max_rounds=max_rounds)
             response = self.get_response(messages)
             if not response:
                 return None
     
             assistant_msg = response.choices[0].message
-            # Convert MockMessage to dict before appending if it's not already a dict
-            if hasattr(assistant_msg, 'content'): # Check if it's a MockMessage-like object
-                messages.append({"role": "assistant", "content": assistant_msg.content})
-            else: # Assuming it's already a dict (e.g. from OpenAI response)
-                messages.append(assistant_msg)
+            self._append_assistant_message(messages, assistant_msg)
     
             if not assistant_msg.tool_calls:
                 if "研究完成" in assistant_msg.content:
                     return self.research_materials
                 continue
     
-            tool_responses = []
-            for tool_call in assistant_msg.tool_calls:
-                if tool_call.function.name == "search_internet":
-                    arguments = json.loads(tool_call.function.arguments)
-                    print(f"\n[执行搜索] 关键词: {arguments['query']} 日期筛选: after:{arguments.get('after_date', '无')}")
-                    result = self.search_internet(arguments)
-                    print(f"[搜索结果] 摘要: {result}...")  # 显示部分结果
-                    tool_responses.append({
-                        "tool_call_id": tool_call.id,
-                        "role": "tool",
-                        "name": "search_internet",
-                        "content": result
-                    })
-    
-            messages.extend(tool_responses)
-            time.sleep(1)  # 避免触发API速率限制
+            # 同一轮的多个搜索并发执行，SerpAPI 速率由共享限速器控制
+            messages.extend(self._execute_tool_calls(assistant_msg.tool_calls, progress_callback))
     
+        self._mark_target_companies(research_prompt)
+        return self.research_materials
+
+    async def conduct_research_async(self, patent_text, research_prompt, progress_callback=None, patent_context=None):
+        """conduct_research 的异步版本，使用当前事件循环中共享的异步模型适配器"""
+        model_adapter = get_async_model_adapter(MODEL_CONFIG)
+        messages = self._start_research(patent_text, research_prompt, patent_context)
+
+        max_rounds = 5
+        for round_index in range(max_rounds):
+            report_progress(progress_callback, 'research_round', round=round_index + 1, max_rounds=max_rounds)
+            response = await model_adapter.get_response(messages, **self._model_kwargs())
+            if not response:
+                return None
+
+            assistant_msg = response.choices[0].message
+            self._append_assistant_message(messages, assistant_msg)
+
+            if not assistant_msg.tool_calls:
+                if "研究完成" in assistant_msg.content:
+                    return self.research_materials
+                continue
+
+            messages.extend(await self._execute_tool_calls_async(assistant_msg.tool_calls, progress_callback))
+
+        self._mark_target_companies(research_prompt)
+        return self.research_materials
+
+    def _mark_target_companies(self, research_prompt):
         # 在处理搜索结果时，添加对目标企业的标记
         # 从 research_prompt 中提取目标企业信息
         target_companies = []
@@ -205,5 +387,3 @@ class ResearchAgent:
                     break
             else:
                 result['is_target_company'] = False
-        
-        return self.research_materials
@@ -0,0 +1,28 @@
+import hashlib
+
+from agents.sqlite_cache import SQLiteCache
+
+
+def patent_hash(patent_text):
+    return hashlib.sha256(patent_text.encode('utf-8')).hexdigest()
+
+
+class ResearchHistory(SQLiteCache):
+    """每篇专利最近一次请求增量复查的分析的研究材料，供下次增量复查使用
+
+    以专利原文的哈希为键，保存 {analyzed_at, research_materials, evaluated_clues}：
+    research_materials 只保留去重后的 documents，evaluated_clues 为评估得到的全部线索（未按匹配度过滤）。
+    """
+
+    def __init__(self, db_path, ttl_seconds=400 * 24 * 3600, max_entries=20000):
+        super().__init__(db_path, 'research_history', ttl_seconds, max_entries)
+
+    def get(self, patent_text):
+        return self.get_value(patent_hash(patent_text))
+
+    def set(self, patent_text, analyzed_at, research_materials, evaluated_clues):
+        self.set_value(patent_hash(patent_text), {
+            'analyzed_at': analyzed_at,
+            'research_materials': research_materials,
+            'evaluated_clues': evaluated_clues,
+        })
@@ -0,0 +1,18 @@
+import hashlib
+import json
+
+from agents.sqlite_cache import SQLiteCache
+
+
+class ResponseCache(SQLiteCache):
+    """模型响应缓存，以模型名、messages、tools 和采样参数的稳定哈希为键（内容寻址）"""
+
+    def __init__(self, db_path, ttl_seconds=30 * 24 * 3600, max_entries=5000):
+        super().__init__(db_path, 'response_cache', ttl_seconds, max_entries)
+
+    @staticmethod
+    def make_key(model, messages, params):
+        """params 包含 tools、tool_choice、temperature 等所有会影响输出的请求参数"""
+        payload = {"model": model, "messages": messages, "params": params}
+        serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
@@ -0,0 +1,291 @@
+import asyncio
+import random
+import threading
+import time
+import traceback
+from email.utils import parsedate_to_datetime
+
+import httpx
+import requests
+from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+from agents.metrics import LLM_RETRIES, LLM_CIRCUIT_STATE, LLM_CIRCUIT_REJECTIONS
+
+# 每类错误在一次调用中最多重试的次数；未列出的错误（认证失败、其他 4xx、解析错误等）不重试
+DEFAULT_RETRY_BUDGETS = {
+    'rate_limit': 6,   # 429：网关繁忙但可用，按 Retry-After 等待
+    'server': 4,       # 5xx
+    'timeout': 2,      # 超时重试代价高（已经等待了整个超时时间）
+    'connection': 3,   # 连接被拒绝、重置、DNS 失败等
+}
+
+
+class StreamInterruptedError(Exception):
+    """流式输出中途失败，且已有内容通过 on_token 推送给调用方；重试会导致重复推送，因此不重试"""
+    pass
+
+
+class RequestCancelled(Exception):
+    """对冲请求中落后的一方被放弃，由 hedge_attempt 抛出；不计入失败，也不重试"""
+    pass
+
+
+def _status_code(e):
+    if isinstance(e, APIStatusError):
+        return e.status_code
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code
+    return None
+
+
+def classify_error(e):
+    """把 OpenAI SDK、httpx 和 requests 的异常归为 rate_limit / server / timeout / connection，不可重试时返回 None"""
+    if isinstance(e, StreamInterruptedError):
+        return None
+    if isinstance(e, RateLimitError):
+        return 'rate_limit'
+    # APITimeoutError 是 APIConnectionError 的子类，需先判断
+    if isinstance(e, (APITimeoutError, httpx.TimeoutException, requests.Timeout)):
+        return 'timeout'
+    if isinstance(e, (APIConnectionError, httpx.TransportError, requests.ConnectionError)):
+        return 'connection'
+    status_code = _status_code(e)
+    if status_code == 429:
+        return 'rate_limit'
+    if status_code is not None and 500 <= status_code <= 599:
+        return 'server'
+    return None
+
+
+def retry_after_seconds(e):
+    """从错误响应的 Retry-After（秒数或 HTTP 日期）或 retry-after-ms 头中读取建议的等待时间"""
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """按错误类别分别计数的重试策略，退避时间使用 full jitter：random(0, min(max_delay, base * 2^n))
+
+    服务端给出 Retry-After 时按它等待（再加少量抖动，避免所有调用方同时醒来）；
+    建议的等待时间超过 max_retry_after 时直接放弃。
+    """
+
+    def __init__(self, base_delay=2, max_delay=60, budgets=None, max_retry_after=120):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budgets = dict(DEFAULT_RETRY_BUDGETS if budgets is None else budgets)
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt, retry_after=None):
+        """第 attempt 次重试（从 0 开始）前的等待秒数"""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def next_delay(self, error, retries):
+        """返回 (错误类别, 等待秒数)；不应重试时等待秒数为 None。retries 为本次调用各类别已重试次数，会被更新"""
+        error_class = classify_error(error)
+        if error_class is None:
+            return None, None
+        used = retries.get(error_class, 0)
+        if used >= self.budgets.get(error_class, 0):
+            return error_class, None
+        retry_after = retry_after_seconds(error) if error_class in ('rate_limit', 'server') else None
+        if retry_after is not None and retry_after > self.max_retry_after:
+            return error_class, None
+        retries[error_class] = used + 1
+        return error_class, self.backoff(sum(retries.values()) - 1, retry_after)
+
+
+class CircuitBreaker:
+    """同一模型端点的熔断器，在进程内所有同步/异步适配器间共享
+
+    连续 failure_threshold 次基础设施故障（5xx、超时、连接失败）后打开，打开期间请求直接失败；
+    reset_timeout 秒后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。
+    429 说明网关仍在工作，不计入故障。
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+    TRIPPING_ERRORS = ('server', 'timeout', 'connection')
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        LLM_CIRCUIT_STATE.set(self.CLOSED, endpoint=name)
+
+    def _set_state(self, state):
+        """调用方需持有锁"""
+        self.state = state
+        LLM_CIRCUIT_STATE.set(state, endpoint=self.name)
+
+    def is_open(self):
+        """熔断打开且未到半开时间时返回 True；不改变状态，供负载均衡挑选端点"""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self):
+        """返回是否允许发出请求"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+        LLM_CIRCUIT_REJECTIONS.inc(endpoint=self.name)
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            if self.state != self.CLOSED:
+                print(f"[CircuitBreaker] {self.name} 恢复，熔断关闭")
+                self._set_state(self.CLOSED)
+
+    def record_failure(self, error_class):
+        with self._lock:
+            self._probe_in_flight = False
+            if error_class not in self.TRIPPING_ERRORS:
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"[CircuitBreaker] {self.name} 连续失败 {self.failures} 次，熔断 {self.reset_timeout} 秒")
+                self.opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name, failure_threshold=5, reset_timeout=30):
+    """返回端点对应的共享熔断器，同一端点的同步和异步适配器使用同一个"""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+            _circuit_breakers[name] = breaker
+        return breaker
+
+
+def _log_failure(name, e, error_class, gave_up):
+    if error_class is None:
+        print(f"[RetryPolicy] {name} 调用失败（不可重试）: {type(e).__name__} - {str(e)}")
+        traceback.print_exc()
+    elif gave_up:
+        print(f"[RetryPolicy] {name} 调用失败，{error_class} 类错误的重试次数已用完: {type(e).__name__} - {str(e)}")
+
+
+def _run_attempt(attempt, limiter, stage):
+    if limiter is None:
+        return attempt()
+    started_at = limiter.acquire()
+    try:
+        result = attempt()
+    except BaseException as e:
+        limiter.release(started_at, stage, classify_error(e) or 'other')
+        raise
+    limiter.release(started_at, stage)
+    return result
+
+
+async def _run_attempt_async(attempt, limiter, stage):
+    if limiter is None:
+        return await attempt()
+    started_at = await limiter.acquire_async()
+    try:
+        result = await attempt()
+    except BaseException as e:
+        # 任务被取消时也要归还名额
+        limiter.release(started_at, stage, classify_error(e) or 'other')
+        raise
+    limiter.release(started_at, stage)
+    return result
+
+
+def call_with_retry(attempt, policy, breaker, name, limiter=None, stage='unknown'):
+    """按重试策略执行 attempt()，成功返回其结果；熔断打开、不可重试或重试用尽时返回 None
+
+    limiter 为 AdaptiveConcurrencyLimiter 时每次尝试前先获取并发名额，退避等待期间不占用名额。
+    """
+    retries = {}
+    while True:
+        if not breaker.allow():
+            print(f"[RetryPolicy] {name} 处于熔断状态，请求直接失败")
+            return None
+        try:
+            result = _run_attempt(attempt, limiter, stage)
+        except RequestCancelled:
+            breaker.record_failure(None)
+            return None
+        except Exception as e:
+            error_class, delay = policy.next_delay(e, retries)
+            breaker.record_failure(error_class)
+            _log_failure(name, e, error_class, delay is None)
+            if delay is None:
+                return None
+            LLM_RETRIES.inc(error_class=error_class)
+            print(f"[RetryPolicy] {name} {error_class} 错误，{delay:.1f} 秒后重试: {type(e).__name__} - {str(e)}")
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+async def call_with_retry_async(attempt, policy, breaker, name, limiter=None, stage='unknown'):
+    """call_with_retry 的异步版本，attempt 为返回协程的函数，等待期间不阻塞事件循环"""
+    retries = {}
+    while True:
+        if not breaker.allow():
+            print(f"[RetryPolicy] {name} 处于熔断状态，请求直接失败")
+            return None
+        try:
+            result = await _run_attempt_async(attempt, limiter, stage)
+        except (RequestCancelled, asyncio.CancelledError) as e:
+            # 释放半开状态下占用的探测名额
+            breaker.record_failure(None)
+            if isinstance(e, RequestCancelled):
+                return None
+            raise
+        except Exception as e:
+            error_class, delay = policy.next_delay(e, retries)
+            breaker.record_failure(error_class)
+            _log_failure(name, e, error_class, delay is None)
+            if delay is None:
+                return None
+            LLM_RETRIES.inc(error_class=error_class)
+            print(f"[RetryPolicy] {name} {error_class} 错误，{delay:.1f} 秒后重试: {type(e).__name__} - {str(e)}")
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
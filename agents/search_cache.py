@@ -0,0 +1,32 @@
+import hashlib
+import json
+
+from agents.sqlite_cache import SQLiteCache
+
+
+class SearchCache(SQLiteCache):
+    """SerpAPI 搜索结果缓存
+
+    以规范化后的 (query, after_date, engine, num) 为键，保存 SerpAPI 返回的原始 organic_results。
+    """
+
+    def __init__(self, db_path, ttl_seconds=7 * 24 * 3600, max_entries=20000):
+        super().__init__(db_path, 'search_cache', ttl_seconds, max_entries)
+
+    @staticmethod
+    def make_key(query, after_date="", engine="google", num=30):
+        """规范化查询参数后计算缓存键：忽略大小写和多余空白"""
+        normalized = {
+            "query": " ".join(str(query).lower().split()),
+            "after_date": (after_date or "").strip(),
+            "engine": engine,
+            "num": int(num),
+        }
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, query, after_date="", engine="google", num=30):
+        """返回缓存的 organic_results 列表，未命中或已过期时返回 None"""
+        return self.get_value(self.make_key(query, after_date, engine, num))
+
+    def set(self, query, after_date, engine, num, results):
+        self.set_value(self.make_key(query, after_date, engine, num), results)
@@ -0,0 +1,124 @@
+import hashlib
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from agents.search_index import index_tokens
+from config.settings import SEARCH_DEDUP_SIMHASH_DISTANCE
+
+# 旧版搜索记录没有 items 字段，只能从格式化后的结果文本中解析
+RESULT_LINE = re.compile(r'^\d+\.\s*(.*?)\s*\[URL:\s*(.*?)\]\s*$')
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|spm|from|source|ref|fbclid|gclid)$')
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4  # 海明距离不超过 3 的两个指纹至少有一段 16 位完全相同
+
+
+def record_items(record):
+    if record.get('items') is not None:
+        return record['items']
+    items = []
+    for line in record.get('result', '').split('\n'):
+        match = RESULT_LINE.match(line)
+        if match:
+            items.append({'snippet': match.group(1), 'link': match.group(2), 'title': ''})
+    return items
+
+
+def normalize_url(url):
+    """去掉协议差异、www 前缀、锚点、末尾斜杠和常见的追踪参数，同一页面的不同写法归为一个键"""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k)))
+    return urlunsplit(('', host, parts.path.rstrip('/'), query, ''))
+
+
+def simhash(text):
+    """基于中文双字/英文词特征的 64 位 SimHash 指纹"""
+    weights = [0] * SIMHASH_BITS
+    for token in index_tokens(text):
+        value = int.from_bytes(hashlib.md5(token.encode('utf-8')).digest()[:8], 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def _bands(fingerprint):
+    width = SIMHASH_BITS // SIMHASH_BANDS
+    return [(band, fingerprint >> (band * width) & ((1 << width) - 1)) for band in range(SIMHASH_BANDS)]
+
+
+def dedup_search_results(search_results, max_distance=SEARCH_DEDUP_SIMHASH_DISTANCE):
+    """跨查询合并搜索结果：链接相同的直接合并，摘要 SimHash 距离不超过 max_distance 的视为近似重复
+
+    返回 (documents, duplicates)：
+        documents   去重后的文档 [{snippet, link, title, query, queries, links}]，按首次出现的顺序，
+                    query 为首次命中的查询，queries/links 记录命中该文档的全部查询和链接
+        duplicates  被合并的结果 [{link, query, reason, duplicate_of}]，reason 为 duplicate_url 或 near_duplicate
+
+    搜索记录带有 is_new 标记（增量复查）时，文档和被合并的结果也带上 is_new：
+    文档的 is_new 取首次发现它的记录，新结果并入历史文档时该文档仍视为历史文档。
+    """
+    documents = []
+    duplicates = []
+    by_url = {}
+    by_band = {}
+    fingerprints = []
+    for record in search_results:
+        query = record.get('query', '')
+        is_new = record.get('is_new')
+        for item in record_items(record):
+            snippet = item.get('snippet', '').strip()
+            if not snippet:
+                continue
+            link = item.get('link', '')
+            url_key = normalize_url(link)
+            fingerprint = simhash(f"{item.get('title', '')} {snippet}")
+
+            index = by_url.get(url_key) if url_key else None
+            reason = 'duplicate_url'
+            if index is None:
+                reason = 'near_duplicate'
+                candidates = {i for band in _bands(fingerprint) for i in by_band.get(band, ())}
+                index = next((i for i in sorted(candidates)
+                              if bin(fingerprints[i] ^ fingerprint).count('1') <= max_distance), None)
+
+            if index is None:
+                index = len(documents)
+                document = {'snippet': snippet, 'link': link, 'title': item.get('title', ''),
+                            'query': query, 'queries': [query], 'links': [link] if link else []}
+                if is_new is not None:
+                    document['is_new'] = is_new
+                documents.append(document)
+                fingerprints.append(fingerprint)
+                for band in _bands(fingerprint):
+                    by_band.setdefault(band, []).append(index)
+            else:
+                document = documents[index]
+                if query not in document['queries']:
+                    document['queries'].append(query)
+                if link and link not in document['links']:
+                    document['links'].append(link)
+                duplicate = {'link': link, 'query': query, 'reason': reason, 'duplicate_of': document['link']}
+                if is_new is not None:
+                    duplicate['is_new'] = is_new
+                duplicates.append(duplicate)
+            if url_key:
+                by_url.setdefault(url_key, index)
+    return documents, duplicates
+
+
+def dedup_research_materials(research_materials):
+    """对研究阶段的全部搜索结果去重，结果写入 research_materials['documents'] 和 ['dedup']"""
+    documents, duplicates = dedup_search_results(research_materials.get('search_results', []))
+    research_materials['documents'] = documents
+    research_materials['dedup'] = {
+        'total': len(documents) + len(duplicates),
+        'unique': len(documents),
+        'duplicates': duplicates,
+    }
+    print(f"[SearchDedup] 共 {len(documents) + len(duplicates)} 条搜索结果，合并重复后 {len(documents)} 条")
+    return documents
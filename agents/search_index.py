@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import threading
+import time
+
+from agents.clue_scorer import TOKEN_PATTERN, CJK_RUN
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+
+def index_tokens(text):
+    """建索引和查询共用的分词：中文按相邻双字（单字词保留单字），英文按词并去掉停用词"""
+    tokens = []
+    for run in TOKEN_PATTERN.findall(text.lower()):
+        if CJK_RUN.match(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        elif CJK_RUN.match(run):
+            tokens.append(run)
+        elif run not in ENGLISH_STOP_WORDS:
+            tokens.append(run)
+    return tokens
+
+
+class SearchIndex:
+    """历史搜索结果的本地全文索引（SQLite FTS5，BM25 排序）
+
+    每次 SerpAPI 返回的结果按链接去重后写入；查询时先用 FTS5 召回，再按查询词覆盖率判断结果是否足够相关。
+    """
+
+    def __init__(self, db_path, max_documents=500000):
+        self.db_path = db_path
+        self.max_documents = max_documents
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """调用方需持有锁"""
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS search_documents (
+                    id INTEGER PRIMARY KEY,
+                    link TEXT NOT NULL UNIQUE,
+                    title TEXT NOT NULL,
+                    snippet TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    tokens TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_search_documents_last_seen ON search_documents (last_seen);
+                CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5(
+                    tokens, content='search_documents', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+                    INSERT INTO search_documents_fts(rowid, tokens) VALUES (new.id, new.tokens);
+                END;
+                CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+                    INSERT INTO search_documents_fts(search_documents_fts, rowid, tokens) VALUES ('delete', old.id, old.tokens);
+                END;
+                CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE OF tokens ON search_documents BEGIN
+                    INSERT INTO search_documents_fts(search_documents_fts, rowid, tokens) VALUES ('delete', old.id, old.tokens);
+                    INSERT INTO search_documents_fts(rowid, tokens) VALUES (new.id, new.tokens);
+                END;
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def add(self, query, results):
+        """写入一次搜索返回的 organic_results；同一链接只保留一条，更新为最新的摘要"""
+        now = time.time()
+        rows = []
+        for result in results:
+            link = result.get('link', '')
+            snippet = result.get('snippet', '')
+            if not link or not snippet:
+                continue
+            title = result.get('title', '')
+            tokens = " ".join(index_tokens(f"{title} {snippet}"))
+            rows.append((link, title, snippet, result.get('date', ''), query, tokens, now, now))
+        if not rows:
+            return 0
+
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("""
+                INSERT INTO search_documents (link, title, snippet, date, query, tokens, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(link) DO UPDATE SET
+                    title = excluded.title, snippet = excluded.snippet, date = excluded.date,
+                    query = excluded.query, tokens = excluded.tokens, last_seen = excluded.last_seen
+            """, rows)
+            self._prune(conn)
+            conn.commit()
+        return len(rows)
+
+    def _prune(self, conn):
+        count = conn.execute("SELECT COUNT(*) FROM search_documents").fetchone()[0]
+        if count > self.max_documents:
+            conn.execute(
+                "DELETE FROM search_documents WHERE id IN (SELECT id FROM search_documents ORDER BY last_seen ASC LIMIT ?)",
+                (count - self.max_documents,)
+            )
+
+    def search(self, query, limit=30, min_coverage=0.0, max_age_seconds=None):
+        """返回按 BM25 排序的结果 [{snippet, link, title, date, coverage}]
+
+        coverage 为查询词在结果中出现的比例，低于 min_coverage 的结果不返回；
+        指定 max_age_seconds 时只返回该时间内被搜索结果写入或刷新过的文档。
+        """
+        query_tokens = list(dict.fromkeys(index_tokens(query)))
+        if not query_tokens:
+            return []
+        match = " OR ".join(f'"{token}"' for token in query_tokens)
+        seen_after = time.time() - max_age_seconds if max_age_seconds else 0
+        with self._lock:
+            rows = self._connection().execute("""
+                SELECT d.link, d.title, d.snippet, d.date, d.tokens
+                FROM search_documents_fts f JOIN search_documents d ON d.id = f.rowid
+                WHERE search_documents_fts MATCH ? AND d.last_seen >= ?
+                ORDER BY bm25(search_documents_fts)
+                LIMIT ?
+            """, (match, seen_after, limit * 3)).fetchall()
+
+        results = []
+        for link, title, snippet, date, tokens in rows:
+            document_tokens = set(tokens.split())
+            coverage = sum(1 for token in query_tokens if token in document_tokens) / len(query_tokens)
+            if coverage >= min_coverage:
+                results.append({'snippet': snippet, 'link': link, 'title': title, 'date': date, 'coverage': round(coverage, 2)})
+            if len(results) >= limit:
+                break
+        return results
+
+    def stats(self):
+        with self._lock:
+            documents = self._connection().execute("SELECT COUNT(*) FROM search_documents").fetchone()[0]
+        return {"documents": documents}
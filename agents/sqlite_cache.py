@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteCache:
+    """基于 SQLite 的键值缓存，值以 JSON 保存，带过期时间和按最近访问时间淘汰的容量上限
+
+    数据库在第一次使用时才创建，同一实例可在多个线程间共享。
+    """
+
+    def __init__(self, db_path, table, ttl_seconds, max_entries):
+        self.db_path = db_path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """调用方需持有锁"""
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def get_value(self, key):
+        """返回缓存的值，未命中或已过期时返回 None"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return None
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set_value(self, key, value):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def get_values(self, keys):
+        """批量查询，在一个事务内完成；返回 {key: value}，只包含命中的键"""
+        now = time.time()
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for key in keys:
+                row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is None or now - row[1] > self.ttl_seconds:
+                    self.misses += 1
+                    continue
+                found[key] = row[0]
+                self.hits += 1
+            conn.executemany(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", [(now, key) for key in found])
+            conn.commit()
+        return {key: json.loads(value) for key, value in found.items()}
+
+    def set_values(self, items):
+        """批量写入 {key: value}，在一个事务内完成"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False), now, now) for key, value in items.items()]
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def delete_values(self, keys):
+        """批量删除，在一个事务内完成"""
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in keys])
+            conn.commit()
+
+    def _evict(self, conn):
+        """删除过期条目，并在超出容量时删除最久未访问的条目"""
+        conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        count = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self):
+        with self._lock:
+            entries = self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.commit()
@@ -2,8 +2,10 @@ from openai import OpenAI
 import markdown
 # from config.settings import OPENAI_API_KEY, OPENAI_BASE_URL # 不再直接使用这些
 from config.settings import MODEL_CONFIG # 导入新的模型配置
-from agents.model_adapter import get_model_adapter # 导入适配器工厂函数
+from agents.model_adapter import get_model_adapter, get_async_model_adapter # 导入适配器工厂函数
 import json # 确保导入json
+from agents.progress import report_progress
+from agents.context_builder import ContextBuilder, shrink_patent
 
 class SummaryAgent:
     def __init__(self):
@@ -27,8 +29,13 @@ class SummaryAgent:
         return self.model_adapter.get_response(messages, model=MODEL_CONFIG.get("model_name"), **kwargs)
 
     def _summarize_search_results(self, search_results):
-        summary_lines = []
+        return "\n\n".join(self._search_result_blocks(search_results))
+
+    def _search_result_blocks(self, search_results):
+        """每个搜索查询的结果摘要为一个文本块"""
+        blocks = []
         for i, result_item in enumerate(search_results):
+            summary_lines = []
             query = result_item.get('query', '未知查询')
             result_text = result_item.get('result', '无结果')
 
@@ -52,15 +59,26 @@ class SummaryAgent:
             if valid_snippets_found == 0:
                 summary_lines.append("- 无有效片段")
 
-            summary_lines.append("") # 添加空行分隔不同查询的结果
-
-        # Remove the last empty line if summary_lines is not empty, to prevent multiple trailing newlines
-        if summary_lines and summary_lines[-1] == "":
-            summary_lines.pop()
-
-        return "\n".join(summary_lines)
-
-    def generate_summary(self, research_materials, summary_prompt):
+            blocks.append("\n".join(summary_lines))
+
+        return blocks
+
+    def _document_blocks(self, documents, max_snippets_per_query=3):
+        """去重后的搜索结果按首次命中的查询分组，每个文档只出现一次，并注明还被哪些查询命中"""
+        grouped = {}
+        for document in documents:
+            grouped.setdefault(document['query'], []).append(document)
+        blocks = []
+        for i, (query, query_documents) in enumerate(grouped.items()):
+            lines = [f"### 搜索查询 {i+1}: {query or '未知查询'}"]
+            for j, document in enumerate(query_documents[:max_snippets_per_query]):
+                other_queries = [q for q in document['queries'] if q != query]
+                lines.append(f"- 片段 {j+1}: {document['snippet']} [URL: {document['link']}]"
+                             + (f"（亦命中查询：{'、'.join(other_queries)}）" if other_queries else ""))
+            blocks.append("\n".join(lines))
+        return blocks
+
+    def _build_messages(self, research_materials, summary_prompt):
         # 新增评估结果上下文，包含目标企业标记
         evaluation_context = "\n".join([
             f"### 线索{i + 1}评估结果\n"
@@ -68,33 +86,86 @@ class SummaryAgent:
             f"- 风险等级：{clue['risk_level']}\n"
             f"- 证据：{clue['evidence']}"
             + (f"\n- 目标企业：是" if clue.get('is_target_company', False) else "")
+            + (f"\n- 来源：{'本次复查新增' if clue['is_new'] else '历史分析'}" if 'is_new' in clue else "")
             for i, clue in enumerate(research_materials.get('evaluated_clues', []))
         ])
 
-        original_text = research_materials['original_text']
-        max_len = 20000
-        if len(original_text) > max_len:
-            original_text = original_text[:max_len] + "\n... (truncated due to length)"
+        # 评估结果最重要，其次是搜索摘要（最多占一半预算），专利内容使用剩余预算
+        context = ContextBuilder('summary') \
+            .add('system', summary_prompt, priority=0) \
+            .add('evaluation', evaluation_context, priority=1) \
+            .add('search', items=self._document_blocks(research_materials['documents']) if 'documents' in research_materials
+                 else self._search_result_blocks(research_materials['search_results']),
+                 priority=2, separator="\n\n", max_share=0.5) \
+            .add('patent', research_materials.get('patent_context') or research_materials['original_text'],
+                 priority=3, shrink=shrink_patent) \
+            .build()
 
         research_context = f"""原始专利内容：
-{original_text}
+{context['patent']}
 
 评估后侵权线索：
-{evaluation_context}
+{context['evaluation']}
 
 搜索结果摘要：
-{self._summarize_search_results(research_materials['search_results'])}"""
+{context['search']}"""
 
-        messages = [
-            {"role": "system", "content": summary_prompt},
+        return [
+            {"role": "system", "content": context['system']},
             {"role": "user", "content": research_context}
         ]
 
-        response = self.get_response(messages)
+    def _token_callback(self, progress_callback):
+        # 总结内容逐 token 推送给前端，减少用户的等待感
+        if progress_callback is None:
+            return None
+        return lambda token: report_progress(progress_callback, 'token', content=token)
+
+    def generate_summary(self, research_materials, summary_prompt, progress_callback=None):
+        messages = self._build_messages(research_materials, summary_prompt)
+        response = self.get_response(messages, on_token=self._token_callback(progress_callback), stage="summary")
+        return self._render(response, research_materials)
+
+    async def generate_summary_async(self, research_materials, summary_prompt, progress_callback=None):
+        """generate_summary 的异步版本"""
+        model_adapter = get_async_model_adapter(MODEL_CONFIG)
+        messages = self._build_messages(research_materials, summary_prompt)
+        response = await model_adapter.get_response(
+            messages,
+            model=MODEL_CONFIG.get("model_name"),
+            on_token=self._token_callback(progress_callback),
+            stage="summary"
+        )
+        return self._render(response, research_materials)
+
+    def _screening_note(self, research_materials):
+        """本地预筛的统计，附在报告末尾，说明有多少搜索结果未交给模型评估及原因"""
+        screening = research_materials.get('screening')
+        if not screening:
+            return ""
+        reasons = {'duplicate': '重复', 'below_min_score': f"相似度低于 {screening['min_score']}", 'beyond_top_k': f"超出前 {screening['top_k']} 条"}
+        dropped = "，".join(f"{reasons.get(reason, reason)} {count} 条" for reason, count in screening['dropped_by_reason'].items())
+        return (f"### 线索预筛记录\n共获取 {screening['total']} 条搜索结果，去重后 {screening['unique']} 条，"
+                f"送评估 {screening['kept']} 条" + (f"；未送评估：{dropped}" if dropped else "") + "。\n\n")
+
+    def _incremental_note(self, research_materials):
+        """增量复查的说明：上次分析日期，以及本次新增和复用的内容"""
+        incremental = research_materials.get('incremental')
+        if not incremental:
+            return ""
+        return (f"### 增量复查记录\n上次分析日期：{incremental['since']}；本次新增文档 {incremental['new_documents']} 条，"
+                f"复用历史文档 {incremental['previous_documents']} 条、历史评估线索 {incremental['previous_clues']} 条。\n\n")
+
+    def _render(self, response, research_materials=None):
         if not response:
             return "总结失败"
 
         final_answer = f"## 分析结果\n{response.choices[0].message.content}\n\n"
+        if research_materials:
+            final_answer += self._screening_note(research_materials)
+            final_answer += self._incremental_note(research_materials)
         print("final answer:", final_answer)
+        if research_materials is not None:
+            research_materials['report_markdown'] = final_answer  # 供报告归档的全文检索使用
         return markdown.markdown(final_answer)
     
\ No newline at end of file
@@ -1,19 +1,36 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response, stream_with_context, send_from_directory
 import os
+import json
+import uuid
+import threading
 from werkzeug.utils import secure_filename
-from datetime import datetime
-import random
 import requests
-from agents.patent_analyzer import PatentAnalyzer
-from config.settings import UPLOAD_FOLDER, MAX_CONTENT_LENGTH, SECRET_KEY
-from prompts.prompt_templates import get_customized_prompt
-import traceback # 导入 traceback 模块
+from agents.patent_analyzer import PatentAnalyzer, FAILED_RESULTS
+from agents.report_store import ReportStore, build_archive_entry
+from agents.document_store import save_upload
+from agents.batch_analyzer import BatchAnalyzer, MANIFEST_NAME, INPUTS_FOLDER, UPLOAD_ARCHIVE_NAME
+from agents.job_queue import JobQueue, JobQueueFullError
+from agents.progress import report_progress
+from agents.metrics import registry as metrics_registry
+from config.settings import UPLOAD_FOLDER, MAX_CONTENT_LENGTH, SECRET_KEY, ANALYSIS_MAX_WORKERS, ANALYSIS_MAX_PENDING_JOBS, SSE_KEEPALIVE_SECONDS, BATCH_OUTPUT_FOLDER, BATCH_INPUT_FOLDER, BATCH_MAX_RUNNING, BATCH_MAX_PENDING, REPORT_STORE_PATH
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
+# 分析流程耗时较长，放到后台线程池中执行，请求只负责提交任务和查询状态
+job_queue = JobQueue(max_workers=ANALYSIS_MAX_WORKERS, max_pending=ANALYSIS_MAX_PENDING_JOBS)
+# 批次内部还会并发分析多个专利，放到单独的有界队列中，避免挤占单篇分析的名额
+batch_queue = JobQueue(max_workers=BATCH_MAX_RUNNING, max_pending=BATCH_MAX_PENDING, name='batch-job')
+
+# 报告保存在服务端，会话 cookie 中只保存报告 ID
+report_store = ReportStore(REPORT_STORE_PATH)
+
+# 批次 id -> 正在执行该批次的任务，同一批次不允许并发运行（会互相覆盖清单）；提交新批次时清理已结束的条目
+batch_jobs = {}
+batch_jobs_lock = threading.Lock()
+
 # 不再需要读取提示词文件
 # with open('prompts/research_prompt.txt', 'r', encoding='utf-8') as f:
 #     research_prompt = f.read()
@@ -27,27 +44,29 @@ def home():
     return redirect(url_for('upload'))
 
 
+def analysis_params_from_form():
+    return {
+        'company_name': request.form.get('company_name', '国际知名ICT企业'),
+        'target_companies': request.form.get('target_companies', ''),
+        'exclude_companies': request.form.get('exclude_companies', ''),
+        'focus_area': request.form.get('focus_area', ''),
+        'incremental': request.form.get('incremental') == '1'
+    }
+
+
 @app.route('/upload', methods=['GET', 'POST'])
 def upload():
     if request.method == 'POST':
         # 保存用户输入的分析参数到会话
-        session['analysis_params'] = {
-            'company_name': request.form.get('company_name', '国际知名ICT企业'),
-            'target_companies': request.form.get('target_companies', ''),
-            'exclude_companies': request.form.get('exclude_companies', ''),
-            'focus_area': request.form.get('focus_area', '')
-        }
+        session['analysis_params'] = analysis_params_from_form()
         
         # 处理文件上传或URL输入
         if 'file' in request.files and request.files['file'].filename:
             file = request.files['file']
             if file.filename != '':
-                if not os.path.exists(app.config['UPLOAD_FOLDER']):
-                    os.makedirs(app.config['UPLOAD_FOLDER'])
-
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
+                # 按内容哈希保存：同名的不同文件互不覆盖，同一文件只保存一份
+                extension = os.path.splitext(secure_filename(file.filename))[1].lower() or '.pdf'
+                filename = save_upload(file, app.config['UPLOAD_FOLDER'], extension)
 
                 session['source_type'] = 'file'
                 session['source'] = filename
@@ -70,94 +89,259 @@ def analyzing():
     return render_template('analyzing.html')
 
 
+def run_analysis(source_type, source, analysis_params, progress_callback=None, checkpoint_id=None):
+    """在后台任务中执行完整的分析流程，报告保存到报告存储，返回报告 ID
+
+    checkpoint_id 为首次提交该分析的任务 ID，各阶段产出按它保存，续跑时从最后一个成功的阶段继续。
+    """
+    analyzer = PatentAnalyzer()
+    report_progress(progress_callback, 'stage', stage='extract')
+    if source_type == 'file':
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], source)
+        patent_text = analyzer.extract_text(filepath)
+    elif source_type == 'url':
+        try:
+            response = requests.get(source, timeout=10)
+            response.raise_for_status()
+            patent_text = response.text
+        except Exception as e:
+            raise ValueError(f"无法下载网页内容: {str(e)}")
+    else:
+        raise ValueError("无效的输入类型")
+
+    if not patent_text:
+        raise ValueError("无法提取有效文本内容")
+
+    result = analyzer.analyze_with_params(
+        patent_text, analysis_params, progress_callback=progress_callback, job_id=checkpoint_id
+    )
+    if result in FAILED_RESULTS:
+        raise ValueError(result)
+    research_materials = analyzer.research_materials
+    archive = None
+    # 从总结检查点续跑且研究检查点已过期时没有研究材料，只保存报告、不写入检索归档
+    if research_materials is not None:
+        archive = build_archive_entry(
+            research_materials, analysis_params, analyzer.extract_patent_info(research_materials), result
+        )
+    return report_store.save(result, source_type, source, analysis_params, archive=archive)
+
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     if 'source_type' not in session:
         return jsonify(error="无效的会话")
 
-    source_type = session['source_type']
-    source = session['source']
-    patent_text = None
-    
-    # 获取分析参数
-    analysis_params = session.get('analysis_params', {})
-    company_name = analysis_params.get('company_name', '国际知名ICT企业')
-    
-    # 处理目标企业和排除企业列表
-    target_companies = analysis_params.get('target_companies', '')
-    if target_companies:
-        target_companies = [company.strip() for company in target_companies.split(',')]
-    
-    exclude_companies = analysis_params.get('exclude_companies', '')
-    if exclude_companies:
-        exclude_companies = [company.strip() for company in exclude_companies.split(',')]
-    
-    focus_area = analysis_params.get('focus_area', '')
-
+    # 续跑只允许使用本会话上一次分析的检查点
+    job_id = uuid.uuid4().hex
+    resume = (request.get_json(silent=True) or {}).get('resume') and session.get('checkpoint_id')
+    checkpoint_id = session['checkpoint_id'] if resume else job_id
     try:
-        if source_type == 'file':
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], source)
-            patent_text = PatentAnalyzer().extract_text(filepath)
-        elif source_type == 'url':
-            try:
-                response = requests.get(source, timeout=10)
-                response.raise_for_status()
-                patent_text = response.text
-            except Exception as e:
-                return jsonify(error=f"无法下载网页内容: {str(e)}")
-        else:
-            return jsonify(error="无效的输入类型")
-
-        if not patent_text:
-            return jsonify(error="无法提取有效文本内容")
-
-        # 获取自定义的 prompt
-        research_prompt = get_customized_prompt(
-            'research', 
-            company_name=company_name,
-            target_companies=target_companies,
-            exclude_companies=exclude_companies,
-            focus_area=focus_area
-        )
-        
-        summary_prompt = get_customized_prompt(
-            'summary', 
-            company_name=company_name,
-            target_companies=target_companies
+        job = job_queue.submit(
+            run_analysis,
+            session['source_type'],
+            session['source'],
+            session.get('analysis_params', {}),
+            job_id=job_id,
+            checkpoint_id=checkpoint_id
         )
+    except JobQueueFullError as e:
+        return jsonify(error=str(e)), 503
+
+    session['job_id'] = job.job_id
+    session['checkpoint_id'] = checkpoint_id
+    return jsonify(job_id=job.job_id, checkpoint_id=checkpoint_id, status=job.status), 202
+
+
+def find_job(job_id):
+    """在单篇分析和批次两个队列中查找任务，返回 (所在队列, 任务)"""
+    for queue in (job_queue, batch_queue):
+        job = queue.get(job_id)
+        if job is not None:
+            return queue, job
+    return None, None
 
-        analyzer = PatentAnalyzer()
-        # 传递分析参数到分析器
-        result = analyzer.analyze_patent(
-            patent_text, 
-            research_prompt, 
-            summary_prompt,
-            company_name=company_name,
-            target_companies=target_companies
-        )
-        
-        session['analysis_result'] = result
-        return jsonify(result=result)
 
-    except Exception as e:
-        print(f"分析过程中出错: {str(e)}")
-        traceback.print_exc()  # 打印完整的堆栈跟踪到终端
-        return jsonify(error=f"分析过程中出错: {str(e)}")
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    queue, job = find_job(job_id)
+    if job is None:
+        return jsonify(error="任务不存在或已过期"), 404
+
+    status = job.to_dict()
+    status['queue_position'] = queue.queue_position(job_id)
+    return jsonify(status)
+
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """以 Server-Sent Events 推送任务的阶段变化和总结 token，支持 Last-Event-ID 断线续传"""
+    _, job = find_job(job_id)
+    if job is None:
+        return jsonify(error="任务不存在或已过期"), 404
+
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', -1))
+    except ValueError:
+        last_event_id = -1
+
+    def generate():
+        after_id = last_event_id
+        while True:
+            events, finished = job.wait_for_events(after_id, timeout=SSE_KEEPALIVE_SECONDS)
+            for event in events:
+                after_id = event['id']
+                data = json.dumps(event['data'], ensure_ascii=False)
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+            if finished and not events:
+                break
+            if not events:
+                yield ": keep-alive\n\n"  # 防止反向代理因空闲断开连接
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify(error="任务不存在或已过期"), 404
+    if job.status == 'failed':
+        return jsonify(error=f"分析过程中出错: {job.error}")
+    if job.status != 'done':
+        return jsonify(job_id=job_id, status=job.status), 202
+
+    session['report_id'] = job.result
+    return jsonify(report_id=job.result, report_url=url_for('report', report_id=job.result))
+
+
+def run_batch(output_dir, source, analysis_params, progress_callback=None):
+    """在后台任务中执行一个批次；source 为空时续跑已有批次中未完成的文件"""
+    batch = BatchAnalyzer(output_dir, analysis_params=analysis_params)
+    if source:
+        batch.add_source(source)
+    return batch.run(progress_callback=progress_callback)
+
+
+@app.route('/batch', methods=['POST'])
+def batch_analyze():
+    """提交批量分析：上传 zip（archive）或指定 BATCH_INPUT_FOLDER 下的目录（directory）；
+    传入已有的 batch_id 且不带输入时续跑该批次"""
+    batch_id = secure_filename(request.form.get('batch_id', '')) or uuid.uuid4().hex
+    output_dir = os.path.join(BATCH_OUTPUT_FOLDER, batch_id)
+
+    with batch_jobs_lock:
+        running = batch_jobs.get(batch_id)
+    if running is not None and not running.finished:
+        return jsonify(error="该批次正在执行中", job_id=running.job_id, batch_id=batch_id), 409
+
+    source = None
+    if 'archive' in request.files and request.files['archive'].filename:
+        os.makedirs(os.path.join(output_dir, INPUTS_FOLDER), exist_ok=True)
+        source = os.path.join(output_dir, INPUTS_FOLDER, UPLOAD_ARCHIVE_NAME)
+        request.files['archive'].save(source)
+    elif request.form.get('directory'):
+        input_root = os.path.realpath(BATCH_INPUT_FOLDER)
+        source = os.path.realpath(os.path.join(input_root, request.form['directory']))
+        if os.path.commonpath([input_root, source]) != input_root or not os.path.isdir(source):
+            return jsonify(error="目录不存在或不在允许的输入目录下"), 400
+    elif not os.path.exists(os.path.join(output_dir, MANIFEST_NAME)):
+        return jsonify(error="请上传 zip 文件或指定目录"), 400
+
+    with batch_jobs_lock:
+        # 检查和提交在同一把锁内完成，同一批次的并发请求只有一个能提交
+        running = batch_jobs.get(batch_id)
+        if running is not None and not running.finished:
+            return jsonify(error="该批次正在执行中", job_id=running.job_id, batch_id=batch_id), 409
+        try:
+            job = batch_queue.submit(run_batch, output_dir, source, analysis_params_from_form())
+        except JobQueueFullError as e:
+            return jsonify(error=str(e)), 503
+        for finished_id in [key for key, value in batch_jobs.items() if value.finished]:
+            del batch_jobs[finished_id]
+        batch_jobs[batch_id] = job
+    return jsonify(job_id=job.job_id, batch_id=batch_id, status=job.status), 202
+
+
+@app.route('/batch/<batch_id>')
+def batch_status(batch_id):
+    manifest_path = os.path.join(BATCH_OUTPUT_FOLDER, secure_filename(batch_id), MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return jsonify(error="批次不存在"), 404
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    counts = {'pending': 0, 'done': 0, 'failed': 0}
+    for item in manifest['items'].values():
+        counts[item['status']] = counts.get(item['status'], 0) + 1
+    with batch_jobs_lock:
+        job = batch_jobs.get(batch_id)
+    return jsonify(
+        batch_id=batch_id,
+        job_id=job.job_id if job else None,
+        running=job is not None and not job.finished,
+        total=len(manifest['items']),
+        **counts
+    )
+
+
+@app.route('/batch/<batch_id>/<path:filename>')
+def batch_file(batch_id, filename):
+    """批次的组合索引（index.html / index.json）和各专利报告"""
+    return send_from_directory(os.path.abspath(os.path.join(BATCH_OUTPUT_FOLDER, secure_filename(batch_id))), filename)
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus 文本格式的运行指标"""
+    return Response(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 @app.route('/report')
-def report():
-    if 'analysis_result' not in session:
+def latest_report():
+    """当前会话最近一次分析的报告"""
+    if 'report_id' not in session:
         return redirect(url_for('upload'))
+    return redirect(url_for('report', report_id=session['report_id']))
+
+
+@app.route('/reports/search')
+def search_reports():
+    """检索归档的历史报告：q 为全文，patent_number / company / focus_area 限定字段，page / per_page 分页"""
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = min(max(int(request.args.get('per_page', 20)), 1), 100)
+    except ValueError:
+        return jsonify(error="分页参数无效"), 400
+
+    found = report_store.search(
+        query=request.args.get('q', ''),
+        patent_number=request.args.get('patent_number', ''),
+        company=request.args.get('company', ''),
+        focus_area=request.args.get('focus_area', ''),
+        page=page,
+        per_page=per_page
+    )
+    for item in found['results']:
+        item['url'] = url_for('report', report_id=item['report_id'])
+    return jsonify(found)
+
 
-    report_id = f"HW-PAT-{datetime.now().year}-{random.randint(1000, 9999)}"
-    report_time = datetime.now()
+@app.route('/report/<report_id>')
+def report(report_id):
+    stored = report_store.get(report_id)
+    if stored is None:
+        return render_template('upload.html', error="报告不存在"), 404
 
     return render_template(
         'report.html',
-        result=session['analysis_result'],
-        report_id=report_id,
-        report_time=report_time
+        result=stored['result'],
+        report_id=stored['report_id'],
+        report_time=stored['created_at']
     )
 
 
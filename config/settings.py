@@ -6,6 +6,49 @@ import os
 SERP_API_KEY = os.getenv('SERP_API_KEY', 'fd4cbc958a28c07f9ed39872ec94bacf2909e85580322a2473ce0a98ebd894ce')
 SERP_API_URL = os.getenv('SERP_API_URL', 'https://serpapi.com/search.json')
 
+# SerpAPI 并发与限速配置，限速器在进程内所有分析任务间共享
+SEARCH_MAX_CONCURRENCY = int(os.getenv('SEARCH_MAX_CONCURRENCY', '6'))  # 同一轮工具调用中并发执行的搜索数
+SERP_API_RATE_LIMIT = float(os.getenv('SERP_API_RATE_LIMIT', '2'))  # 每秒最多请求数，<=0 表示不限速
+SERP_API_RATE_BURST = int(os.getenv('SERP_API_RATE_BURST', '4'))  # 允许的突发请求数
+
+# 本地缓存目录（搜索结果缓存等）
+CACHE_FOLDER = os.getenv('CACHE_FOLDER', 'cache')
+
+# SerpAPI 搜索结果缓存配置
+SEARCH_CACHE_ENABLED = os.getenv('SEARCH_CACHE_ENABLED', 'True').lower() == 'true'
+SEARCH_CACHE_BYPASS = os.getenv('SEARCH_CACHE_BYPASS', 'False').lower() == 'true'  # 为 True 时跳过读取缓存，但仍写入最新结果
+SEARCH_CACHE_PATH = os.path.join(CACHE_FOLDER, 'search_cache.sqlite3')
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv('SEARCH_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '20000'))
+
+# 本地搜索索引：历次 SerpAPI 结果的全文索引，本地召回足够时不再请求 SerpAPI
+SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'True').lower() == 'true'
+SEARCH_INDEX_PATH = os.path.join(CACHE_FOLDER, 'search_index.sqlite3')
+SEARCH_INDEX_MAX_DOCUMENTS = int(os.getenv('SEARCH_INDEX_MAX_DOCUMENTS', '500000'))
+SEARCH_INDEX_MIN_HITS = int(os.getenv('SEARCH_INDEX_MIN_HITS', '10'))  # 本地结果达到该数量才跳过 SerpAPI
+SEARCH_INDEX_MIN_COVERAGE = float(os.getenv('SEARCH_INDEX_MIN_COVERAGE', '0.6'))  # 结果须覆盖的查询词比例
+# 只有最近这么多秒内由 SerpAPI 写入或刷新过的文档才计入命中数，过期后重新请求 SerpAPI 以获取新结果；离线模式不受限制
+SEARCH_INDEX_MAX_AGE_SECONDS = int(os.getenv('SEARCH_INDEX_MAX_AGE_SECONDS', str(7 * 24 * 3600)))
+SEARCH_OFFLINE = os.getenv('SEARCH_OFFLINE', 'False').lower() == 'true'  # 离线模式：只查本地索引，不请求 SerpAPI
+
+# 搜索结果去重：链接相同或摘要 SimHash 海明距离不超过该值（0-3）的结果合并为一条
+SEARCH_DEDUP_SIMHASH_DISTANCE = int(os.getenv('SEARCH_DEDUP_SIMHASH_DISTANCE', '3'))
+
+# PDF 文本提取配置
+PDF_EXTRACTOR_BACKEND = os.getenv('PDF_EXTRACTOR_BACKEND', 'auto')  # auto / pymupdf / pypdf / pypdf2 / pdfminer
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '40'))  # 达到该页数时才拆分到进程池并行提取
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_PAGE_CACHE_ENABLED = os.getenv('PDF_PAGE_CACHE_ENABLED', 'True').lower() == 'true'
+PDF_PAGE_CACHE_PATH = os.path.join(CACHE_FOLDER, 'pdf_pages.sqlite3')
+PDF_PAGE_CACHE_TTL_SECONDS = int(os.getenv('PDF_PAGE_CACHE_TTL_SECONDS', str(90 * 24 * 3600)))
+PDF_PAGE_CACHE_MAX_ENTRIES = int(os.getenv('PDF_PAGE_CACHE_MAX_ENTRIES', '200000'))
+
+# 已提取全文存储：以文件内容哈希为键，保存全文、页数和提取耗时
+DOCUMENT_STORE_ENABLED = os.getenv('DOCUMENT_STORE_ENABLED', 'True').lower() == 'true'
+DOCUMENT_STORE_PATH = os.path.join(CACHE_FOLDER, 'documents.sqlite3')
+DOCUMENT_STORE_TTL_SECONDS = int(os.getenv('DOCUMENT_STORE_TTL_SECONDS', str(365 * 24 * 3600)))
+DOCUMENT_STORE_MAX_ENTRIES = int(os.getenv('DOCUMENT_STORE_MAX_ENTRIES', '20000'))
+
 # 上传文件夹配置
 UPLOAD_FOLDER = 'uploads'
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024
@@ -13,6 +56,59 @@ MAX_CONTENT_LENGTH = 16 * 1024 * 1024
 # Flask 应用密钥
 SECRET_KEY = 'your-secret-key-123'
 
+# 后台分析任务队列配置
+ANALYSIS_MAX_WORKERS = int(os.getenv('ANALYSIS_MAX_WORKERS', '4'))  # 同时执行的分析任务数
+ANALYSIS_MAX_PENDING_JOBS = int(os.getenv('ANALYSIS_MAX_PENDING_JOBS', '50'))  # 最多排队等待的任务数
+SSE_KEEPALIVE_SECONDS = 15  # 进度事件流在无新事件时发送心跳的间隔
+
+# 分析阶段检查点：按任务 ID 保存研究材料、评估结果和报告，失败后可从最后一个成功的阶段继续
+ANALYSIS_CHECKPOINT_ENABLED = os.getenv('ANALYSIS_CHECKPOINT_ENABLED', 'True').lower() == 'true'
+ANALYSIS_CHECKPOINT_PATH = os.path.join(CACHE_FOLDER, 'checkpoints.sqlite3')
+ANALYSIS_CHECKPOINT_TTL_SECONDS = int(os.getenv('ANALYSIS_CHECKPOINT_TTL_SECONDS', str(7 * 24 * 3600)))
+
+# 增量复查：保存每篇专利最近一次分析的研究材料，复查时只检索上次分析日期之后的新结果、只评估新增线索
+RESEARCH_HISTORY_ENABLED = os.getenv('RESEARCH_HISTORY_ENABLED', 'True').lower() == 'true'
+RESEARCH_HISTORY_PATH = os.path.join(CACHE_FOLDER, 'research_history.sqlite3')
+RESEARCH_HISTORY_TTL_SECONDS = int(os.getenv('RESEARCH_HISTORY_TTL_SECONDS', str(400 * 24 * 3600)))
+
+# 报告存储：分析完成的报告压缩后保存在服务端，会话中只保存报告 ID
+REPORT_STORE_PATH = os.getenv('REPORT_STORE_PATH', os.path.join('data', 'reports.sqlite3'))
+
+# 批量（专利组合）分析配置
+BATCH_OUTPUT_FOLDER = os.getenv('BATCH_OUTPUT_FOLDER', 'batch_output')  # 每个批次一个子目录
+BATCH_INPUT_FOLDER = os.getenv('BATCH_INPUT_FOLDER', 'batch_input')  # 接口只允许读取该目录下的 PDF 目录
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '4'))  # 一个批次内同时分析的专利数
+# 批次使用独立的有界队列，不占用单篇分析的任务名额；同时分析的专利总数不超过
+# ANALYSIS_MAX_WORKERS + BATCH_MAX_RUNNING * BATCH_MAX_CONCURRENCY
+BATCH_MAX_RUNNING = int(os.getenv('BATCH_MAX_RUNNING', '1'))  # 同时执行的批次数
+BATCH_MAX_PENDING = int(os.getenv('BATCH_MAX_PENDING', '10'))  # 最多排队等待的批次数
+
+# 长专利处理：超过 PATENT_CONTEXT_MAX_CHARS 的专利按权利要求/摘要/说明书分块，
+# 各块并发交给模型提取要点后再合并（map-reduce），代替直接截取开头
+PATENT_CONTEXT_MAX_CHARS = int(os.getenv('PATENT_CONTEXT_MAX_CHARS', '15000'))
+PATENT_CHUNK_CHARS = int(os.getenv('PATENT_CHUNK_CHARS', '8000'))
+PATENT_MAP_REDUCE_ENABLED = os.getenv('PATENT_MAP_REDUCE_ENABLED', 'True').lower() == 'true'
+PATENT_MAP_MAX_CONCURRENCY = int(os.getenv('PATENT_MAP_MAX_CONCURRENCY', '8'))  # 进程内同时进行的分块模型调用数
+
+# 上下文预算：各阶段初始 prompt 最多占用模型上下文窗口的比例（按 token 计），
+# 其余留给模型输出以及研究/评估阶段后续轮次追加的对话。安装了 tiktoken 时按其编码计数，否则按字符类别估算
+MODEL_CONTEXT_WINDOW = int(os.getenv('MODEL_CONTEXT_WINDOW', '32768'))
+CONTEXT_BUDGET_RATIOS = {
+    "digest": 0.5,
+    "research": 0.4,
+    "evaluation": 0.7,
+    "summary": 0.7
+}
+
+# 线索相似度打分：设置后加载预先拟合的 IDF 模型（python -m agents.clue_scorer 生成），
+# 未设置时每次分析在专利和线索上单独拟合
+CLUE_SCORER_IDF_PATH = os.getenv('CLUE_SCORER_IDF_PATH', '')
+
+# 评估前的本地预筛：去重后按与权利要求的相似度排序，只把前 CLUE_TOP_K 条且不低于 CLUE_MIN_SCORE 的线索交给模型评估
+CLUE_PRESCREEN_ENABLED = os.getenv('CLUE_PRESCREEN_ENABLED', 'True').lower() == 'true'
+CLUE_TOP_K = int(os.getenv('CLUE_TOP_K', '40'))
+CLUE_MIN_SCORE = float(os.getenv('CLUE_MIN_SCORE', '5'))
+
 # 是否启用评估功能
 ENABLE_EVALUATION = os.getenv('ENABLE_EVALUATION', 'True').lower() == 'true'
 
@@ -30,20 +126,93 @@ ACTIVE_MODEL_CONFIG = {
         "initial_backoff_seconds": 2,
         "proxy_url": os.getenv('OPENAI_PROXY_URL', None),
         "proxy_username": os.getenv('OPENAI_PROXY_USERNAME', None),
-        "proxy_password": os.getenv('OPENAI_PROXY_PASSWORD', None)
+        "proxy_password": os.getenv('OPENAI_PROXY_PASSWORD', None),
+        # 多个网关地址（逗号分隔）时在它们之间负载均衡和故障转移，未设置时只使用 base_url
+        "endpoints": [url.strip() for url in os.getenv('OPENAI_BASE_URLS', '').split(',') if url.strip()]
     },
     "ollama": {
         "base_url": os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'),
-        "default_model": "qwen3:8b" # 确保这个模型已经在Ollama中拉取并可用
+        "default_model": "qwen3:8b", # 确保这个模型已经在Ollama中拉取并可用
+        "endpoints": [url.strip() for url in os.getenv('OLLAMA_BASE_URLS', '').split(',') if url.strip()]
     }
 }
 
+# 模型 HTTP 连接池配置（两种模型类型通用），适配器在进程内共享，连接可跨请求复用
+MODEL_HTTP_POOL_CONFIG = {
+    "max_connections": int(os.getenv('MODEL_MAX_CONNECTIONS', '100')),
+    "max_keepalive_connections": int(os.getenv('MODEL_MAX_KEEPALIVE_CONNECTIONS', '20')),
+    "keepalive_expiry": float(os.getenv('MODEL_KEEPALIVE_EXPIRY', '30')),  # 空闲长连接保留秒数
+    "http2": None  # None 表示安装了 h2 时自动启用 HTTP/2
+}
+
+# 模型调用的重试和熔断（两种模型类型通用）：退避使用 full jitter，429 时按 Retry-After 等待；
+# 每类错误单独计重试次数，OpenAI 的 5xx 重试次数仍由 max_retries 决定
+MODEL_RETRY_CONFIG = {
+    "max_backoff_seconds": float(os.getenv('MODEL_MAX_BACKOFF_SECONDS', '60')),
+    "retry_budgets": {
+        "rate_limit": int(os.getenv('MODEL_RETRY_RATE_LIMIT', '6')),
+        "server": int(os.getenv('MODEL_RETRY_SERVER', '4')),
+        "timeout": int(os.getenv('MODEL_RETRY_TIMEOUT', '2')),
+        "connection": int(os.getenv('MODEL_RETRY_CONNECTION', '3'))
+    },
+    # 同一端点连续失败这么多次（5xx、超时、连接失败）后熔断，熔断期间请求直接失败
+    "circuit_failure_threshold": int(os.getenv('MODEL_CIRCUIT_FAILURE_THRESHOLD', '5')),
+    "circuit_reset_seconds": float(os.getenv('MODEL_CIRCUIT_RESET_SECONDS', '30'))
+}
+
+# 模型调用的自适应并发控制（AIMD）：同一端点在进程内共享一个上限，成功时逐步增加，
+# 遇到 429、超时或耗时超过基线 latency_tolerance 倍时减半，超出上限的调用排队等待
+MODEL_CONCURRENCY_CONFIG = {
+    "concurrency_limit_enabled": os.getenv('MODEL_CONCURRENCY_LIMIT_ENABLED', 'True').lower() == 'true',
+    "concurrency_initial_limit": int(os.getenv('MODEL_CONCURRENCY_INITIAL_LIMIT', '8')),
+    "concurrency_min_limit": int(os.getenv('MODEL_CONCURRENCY_MIN_LIMIT', '1')),
+    "concurrency_max_limit": int(os.getenv('MODEL_CONCURRENCY_MAX_LIMIT', '64')),
+    "concurrency_latency_tolerance": float(os.getenv('MODEL_CONCURRENCY_LATENCY_TOLERANCE', '2.0'))
+}
+
+# 多端点负载均衡：定期探测各端点，探测失败的端点暂停分配请求；间隔为 0 时不做健康检查。
+# 负载均衡时端点自身不重试，出错立即转到下一个端点；所有端点都失败后退避，最多尝试 lb_retry_rounds 轮
+MODEL_HEALTH_CHECK_CONFIG = {
+    "health_check_interval_seconds": float(os.getenv('MODEL_HEALTH_CHECK_INTERVAL_SECONDS', '30')),
+    "health_check_timeout_seconds": float(os.getenv('MODEL_HEALTH_CHECK_TIMEOUT_SECONDS', '5')),
+    "lb_retry_rounds": int(os.getenv('MODEL_LB_RETRY_ROUNDS', '3'))
+}
+
+# 对冲请求（默认关闭）：首个 chunk 超过该阶段最近首 chunk 时间的 hedge_percentile 分位数仍未到达时，
+# 再发一个相同的请求（多端点时发往其他端点），取先开始输出的一方；对冲请求长期不超过调用数的 hedge_budget_ratio
+MODEL_HEDGE_CONFIG = {
+    "hedge_enabled": os.getenv('MODEL_HEDGE_ENABLED', 'False').lower() == 'true',
+    "hedge_percentile": float(os.getenv('MODEL_HEDGE_PERCENTILE', '95')),
+    "hedge_min_delay_seconds": float(os.getenv('MODEL_HEDGE_MIN_DELAY_SECONDS', '1.0')),
+    "hedge_budget_ratio": float(os.getenv('MODEL_HEDGE_BUDGET_RATIO', '0.1')),
+    "hedge_min_samples": int(os.getenv('MODEL_HEDGE_MIN_SAMPLES', '20'))
+}
+# 同步调用中执行对冲请求的线程数（主请求在调用方线程执行，不占用这些线程）
+MODEL_HEDGE_MAX_WORKERS = int(os.getenv('MODEL_HEDGE_MAX_WORKERS', '32'))
+
+# 模型响应缓存：相同模型、消息和参数的请求直接返回缓存结果，按阶段开启
+LLM_CACHE_CONFIG = {
+    "response_cache_enabled": os.getenv('LLM_CACHE_ENABLED', 'False').lower() == 'true',
+    "response_cache_path": os.path.join(CACHE_FOLDER, 'llm_cache.sqlite3'),
+    "response_cache_ttl_seconds": int(os.getenv('LLM_CACHE_TTL_SECONDS', str(30 * 24 * 3600))),
+    "response_cache_max_entries": int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000')),
+    # 研究阶段依赖实时搜索结果，默认只缓存低温度的评估和总结调用
+    "response_cache_stages": [stage.strip() for stage in os.getenv('LLM_CACHE_STAGES', 'evaluation,summary').split(',') if stage.strip()]
+}
+
 # 根据激活的模型类型选择具体配置
 MODEL_CONFIG = {
     "type": ACTIVE_MODEL_CONFIG["type"],
     "api_key": ACTIVE_MODEL_CONFIG.get(ACTIVE_MODEL_CONFIG["type"], {}).get("api_key") if ACTIVE_MODEL_CONFIG["type"] == "openai" else None,
     "base_url": ACTIVE_MODEL_CONFIG.get(ACTIVE_MODEL_CONFIG["type"], {}).get("base_url"),
-    "model_name": ACTIVE_MODEL_CONFIG.get(ACTIVE_MODEL_CONFIG["type"], {}).get("default_model")
+    "model_name": ACTIVE_MODEL_CONFIG.get(ACTIVE_MODEL_CONFIG["type"], {}).get("default_model"),
+    "endpoints": ACTIVE_MODEL_CONFIG.get(ACTIVE_MODEL_CONFIG["type"], {}).get("endpoints"),
+    **MODEL_HTTP_POOL_CONFIG,
+    **MODEL_RETRY_CONFIG,
+    **MODEL_CONCURRENCY_CONFIG,
+    **MODEL_HEALTH_CHECK_CONFIG,
+    **MODEL_HEDGE_CONFIG,
+    **LLM_CACHE_CONFIG
 }
 
 if MODEL_CONFIG["type"] == "openai":
@@ -0,0 +1,100 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import zipfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.batch_analyzer import BatchAnalyzer, _report_name
+
+
+class FakeAnalyzer:
+    """按文件名决定分析结果，记录被分析过的文件"""
+    calls = []
+    failing = set()
+
+    def extract_text(self, path):
+        return os.path.basename(path)
+
+    def analyze_with_params(self, patent_text, analysis_params, progress_callback=None):
+        FakeAnalyzer.calls.append(patent_text)
+        if patent_text in FakeAnalyzer.failing:
+            return "分析失败"
+        return f"<p>{patent_text} 报告</p>"
+
+
+class TestBatchAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.tmp.name, 'input')
+        os.makedirs(os.path.join(self.input_dir, 'sub'))
+        for name in ('a.pdf', 'b.pdf', os.path.join('sub', 'c.pdf'), 'notes.txt'):
+            with open(os.path.join(self.input_dir, name), 'wb') as f:
+                f.write(b'%PDF-1.4')
+        self.output_dir = os.path.join(self.tmp.name, 'output')
+        FakeAnalyzer.calls = []
+        FakeAnalyzer.failing = {'b.pdf'}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _batch(self):
+        return BatchAnalyzer(self.output_dir, {'company_name': '测试公司'}, max_workers=2, analyzer_factory=FakeAnalyzer)
+
+    def test_run_writes_reports_manifest_and_index(self):
+        batch = self._batch()
+        self.assertEqual(batch.add_source(self.input_dir), 3)
+        counts = batch.run()
+        self.assertEqual((counts['done'], counts['failed'], counts['total']), (2, 1, 3))
+
+        with open(os.path.join(self.output_dir, 'manifest.json'), encoding='utf-8') as f:
+            items = json.load(f)['items']
+        self.assertEqual(items['sub/c.pdf']['report'], 'reports/' + _report_name('sub/c.pdf'))
+        self.assertEqual(items['b.pdf']['error'], '分析失败')
+        with open(os.path.join(self.output_dir, 'reports', _report_name('a.pdf')), encoding='utf-8') as f:
+            self.assertIn('<p>a.pdf 报告</p>', f.read())
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'index.html')))
+
+    def test_resume_only_runs_unfinished_files(self):
+        batch = self._batch()
+        batch.add_source(self.input_dir)
+        batch.run()
+
+        FakeAnalyzer.calls = []
+        FakeAnalyzer.failing = set()
+        resumed = BatchAnalyzer(self.output_dir, analyzer_factory=FakeAnalyzer)
+        self.assertEqual(resumed.analysis_params, {'company_name': '测试公司'})
+        self.assertEqual(resumed.add_source(self.input_dir), 0)
+        counts = resumed.run()
+        self.assertEqual(FakeAnalyzer.calls, ['b.pdf'])
+        self.assertEqual(counts['done'], 3)
+
+    def test_skip_failed(self):
+        batch = self._batch()
+        batch.add_source(self.input_dir)
+        batch.run()
+        FakeAnalyzer.calls = []
+        self._batch().run(retry_failed=False)
+        self.assertEqual(FakeAnalyzer.calls, [])
+
+    def test_zip_source(self):
+        archive_path = os.path.join(self.tmp.name, 'portfolio.zip')
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            archive.writestr('../escape/x.pdf', b'%PDF-1.4')
+            archive.writestr('readme.txt', b'ignored')
+        batch = self._batch()
+        self.assertEqual(batch.add_source(archive_path), 1)
+        path = batch.manifest['items']['../escape/x.pdf']['path']
+        self.assertEqual(os.path.dirname(path), os.path.abspath(os.path.join(self.output_dir, 'inputs')))
+
+    def test_report_name(self):
+        self.assertRegex(_report_name('dir/专利 1.pdf'), r'^dir__专利_1-[0-9a-f]{8}\.html$')
+        self.assertRegex(_report_name('../x.pdf'), r'^x-[0-9a-f]{8}\.html$')
+        # 扁平化后同名的不同路径得到不同的文件名
+        self.assertNotEqual(_report_name('a/b.pdf'), _report_name('a__b.pdf'))
+
+
+if __name__ == '__main__':
+    unittest.main()
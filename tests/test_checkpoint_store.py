@@ -0,0 +1,116 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents import patent_analyzer
+from agents.checkpoint_store import CheckpointStore
+from agents.patent_analyzer import PatentAnalyzer
+
+PATENT = "权利要求书\n1. 一种数据传输方法，对数据包进行LZ4压缩。\n"
+
+
+def make_research_materials():
+    return {
+        'original_text': PATENT,
+        'search_results': [{'query': "LZ4 压缩", 'items': [{"snippet": "基站采用LZ4压缩数据包", "link": "https://a.example/1", "title": ""}]}],
+    }
+
+
+class TestAnalysisCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        store = CheckpointStore(os.path.join(self.tmpdir.name, 'checkpoints.sqlite3'))
+        for name, value in (('checkpoint_store', store), ('research_history', None)):
+            patcher = mock.patch.object(patent_analyzer, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.store = store
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_analyzer(self, summary_results):
+        analyzer = PatentAnalyzer()
+        analyzer.digest_agent = mock.Mock(build_context=mock.Mock(side_effect=lambda text, callback=None: text))
+        analyzer.research_agent = mock.Mock(conduct_research=mock.Mock(side_effect=lambda *args, **kwargs: make_research_materials()))
+        analyzer.evaluation_agent = mock.Mock(conduct_evaluation=mock.Mock(return_value=[
+            {'clue_id': '1', 'match_score': 85.0, 'risk_level': '高', 'evidence': '证据'}
+        ]))
+        analyzer.summary_agent = mock.Mock(generate_summary=mock.Mock(side_effect=summary_results))
+        return analyzer
+
+    def test_resume_after_summary_failure(self):
+        first = self.make_analyzer(["总结失败"])
+        self.assertEqual(first.analyze_patent(PATENT, "研究", "总结", job_id="job-1"), "总结失败")
+        self.assertEqual(self.store.stages("job-1"), ['research', 'evaluation'])
+
+        second = self.make_analyzer(["<p>报告</p>"])
+        self.assertEqual(second.analyze_patent(PATENT, "研究", "总结", job_id="job-1"), "<p>报告</p>")
+        second.research_agent.conduct_research.assert_not_called()
+        second.evaluation_agent.conduct_evaluation.assert_not_called()
+        research_materials = second.summary_agent.generate_summary.call_args[0][0]
+        self.assertEqual(research_materials['evaluated_clues'][0]['match_score'], 85.0)
+
+        # 已完成的任务直接返回保存的报告
+        third = self.make_analyzer([])
+        self.assertEqual(third.analyze_patent(PATENT, "研究", "总结", job_id="job-1"), "<p>报告</p>")
+
+    def test_checkpoint_for_other_patent_is_ignored(self):
+        self.make_analyzer(["总结失败"]).analyze_patent(PATENT, "研究", "总结", job_id="job-2")
+        analyzer = self.make_analyzer(["<p>报告</p>"])
+        analyzer.analyze_patent("另一篇专利", "研究", "总结", job_id="job-2")
+        analyzer.research_agent.conduct_research.assert_called_once()
+        analyzer.evaluation_agent.conduct_evaluation.assert_called_once()
+
+    def test_summary_for_other_patent_is_not_returned(self):
+        self.make_analyzer(["<p>报告</p>"]).analyze_patent(PATENT, "研究", "总结", job_id="job-3")
+        analyzer = self.make_analyzer(["<p>另一份报告</p>"])
+        self.assertEqual(analyzer.analyze_patent("另一篇专利", "研究", "总结", job_id="job-3"), "<p>另一份报告</p>")
+        # 旧专利的检查点已被丢弃，不会再被原专利的续跑误用
+        self.assertEqual(self.store.get("job-3", 'summary', patent_analyzer.patent_hash(PATENT)), None)
+
+    def test_rerun_research_discards_later_stages(self):
+        self.make_analyzer(["总结失败"]).analyze_patent(PATENT, "研究", "总结", job_id="job-4")
+        self.store.discard("job-4", ('research',))
+        analyzer = self.make_analyzer(["<p>报告</p>"])
+        analyzer.analyze_patent(PATENT, "研究", "总结", job_id="job-4")
+        analyzer.research_agent.conduct_research.assert_called_once()
+        analyzer.evaluation_agent.conduct_evaluation.assert_called_once()
+
+    def _run_analysis(self, analyzer, report_store):
+        import app
+        analyzer.extract_text = mock.Mock(return_value=PATENT)
+        with mock.patch.object(app, 'PatentAnalyzer', return_value=analyzer), \
+                mock.patch.object(app, 'report_store', report_store):
+            return app.run_analysis('file', 'patent.pdf', {'company_name': '测试公司'}, checkpoint_id="job-5")
+
+    def test_run_analysis_resumes_from_summary_checkpoint(self):
+        # 报告已生成并写入检查点，但保存报告时失败
+        failing_store = mock.Mock(save=mock.Mock(side_effect=OSError("磁盘已满")))
+        with self.assertRaises(OSError):
+            self._run_analysis(self.make_analyzer(["<p>报告</p>"]), failing_store)
+
+        report_store = mock.Mock(save=mock.Mock(return_value="report-1"))
+        analyzer = self.make_analyzer([])
+        self.assertEqual(self._run_analysis(analyzer, report_store), "report-1")
+        analyzer.summary_agent.generate_summary.assert_not_called()
+        archive = report_store.save.call_args.kwargs['archive']
+        self.assertEqual(archive['clues'], ['高 85.0 证据'])
+
+        # 研究检查点已不存在时仍能保存报告，只是不写入检索归档
+        self.store.discard("job-5", ('research',))
+        report_store = mock.Mock(save=mock.Mock(return_value="report-2"))
+        self.assertEqual(self._run_analysis(self.make_analyzer([]), report_store), "report-2")
+        self.assertIsNone(report_store.save.call_args.kwargs['archive'])
+
+    def test_without_job_id_nothing_is_saved(self):
+        self.make_analyzer(["<p>报告</p>"]).analyze_patent(PATENT, "研究", "总结")
+        self.assertEqual(self.store.stats()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import sys
+import os
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.clue_scorer import ClueScorer, cjk_analyzer
+
+PATENT_CLAIMS = "1. 一种基于正交频分复用的数据传输方法，包括对数据包进行LZ4压缩并通过LTE-A信道发送。"
+RELEVANT = "某公司发布支持LTE-A的基站，采用正交频分复用和LZ4压缩传输数据包。"
+IRRELEVANT = "本季度咖啡连锁店新开门店五十家，主打燕麦拿铁。"
+
+
+class TestCjkAnalyzer(unittest.TestCase):
+    def test_chinese_unigrams_and_bigrams(self):
+        self.assertEqual(cjk_analyzer("压缩方法"), ["压", "缩", "方", "法", "压缩", "缩方", "方法"])
+
+    def test_english_words_without_stop_words(self):
+        self.assertEqual(cjk_analyzer("The LTE-A base station and 802.11ax"), ["lte-a", "base", "station", "802.11ax"])
+
+
+class TestClueScorer(unittest.TestCase):
+    def test_scores_keep_clue_order(self):
+        scores = ClueScorer().score(PATENT_CLAIMS, [IRRELEVANT, RELEVANT])
+        self.assertEqual(len(scores), 2)
+        self.assertGreater(scores[1], scores[0])
+        self.assertEqual(ClueScorer().score(PATENT_CLAIMS, []), [])
+
+    def test_empty_vocabulary(self):
+        self.assertEqual(ClueScorer().score("。", ["，", "！"]), [0.0, 0.0])
+
+    def test_persisted_idf_model(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'idf.pkl')
+            ClueScorer().fit([PATENT_CLAIMS, RELEVANT, IRRELEVANT]).save(path)
+            scorer = ClueScorer.load(path)
+            scores = scorer.score(PATENT_CLAIMS, [IRRELEVANT, RELEVANT])
+            self.assertGreater(scores[1], scores[0])
+
+    def test_hundreds_of_clues_in_one_pass(self):
+        clues = [f"{RELEVANT}第{i}条" if i % 2 else f"{IRRELEVANT}第{i}条" for i in range(500)]
+        started_at = time.perf_counter()
+        scores = ClueScorer().score(PATENT_CLAIMS * 20, clues)
+        self.assertLess(time.perf_counter() - started_at, 2)
+        self.assertEqual(len(scores), 500)
+        self.assertGreater(scores[1], scores[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
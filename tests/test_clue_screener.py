@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.clue_screener import screen_clues
+from agents.summary_agent import SummaryAgent
+
+PATENT = """权利要求书
+1. 一种数据传输方法，对数据包进行LZ4压缩并通过LTE-A信道发送。
+"""
+
+
+def make_materials():
+    relevant = {"snippet": "基站采用LZ4压缩数据包并通过LTE-A信道发送", "link": "https://a.example/1", "title": ""}
+    return {
+        'original_text': PATENT,
+        'search_results': [
+            {'query': "LZ4 压缩 基站", 'items': [
+                relevant,
+                {"snippet": "咖啡门店新品燕麦拿铁上市", "link": "https://b.example/2", "title": ""},
+                {"snippet": "LTE-A信道数据传输方案", "link": "https://c.example/3", "title": ""},
+            ]},
+            # 旧格式记录只有格式化文本，同一链接重复出现
+            {'query': "LTE-A 数据传输", 'result': "1. 基站采用LZ4压缩数据包并通过LTE-A信道发送 [URL: https://a.example/1]\n"
+                                                  "2. 数据包压缩传输芯片 [URL: https://d.example/4]"},
+        ]
+    }
+
+
+class TestScreenClues(unittest.TestCase):
+    def test_dedup_rank_and_audit(self):
+        materials = make_materials()
+        kept = screen_clues(materials, top_k=2, min_score=5)
+
+        self.assertEqual(len(kept), 2)
+        self.assertEqual(kept[0]['link'], "https://a.example/1")
+        self.assertGreaterEqual(kept[0]['similarity'], kept[1]['similarity'])
+
+        screening = materials['screening']
+        self.assertEqual((screening['total'], screening['unique'], screening['kept']), (5, 4, 2))
+        self.assertEqual(screening['dropped_by_reason']['duplicate'], 1)
+        reasons = {item['link']: item['reason'] for item in screening['dropped']}
+        self.assertEqual(reasons["https://b.example/2"], 'below_min_score')
+        self.assertEqual(sum(screening['dropped_by_reason'].values()), len(screening['dropped']))
+
+    def test_screening_note_in_report(self):
+        materials = make_materials()
+        screen_clues(materials, top_k=2, min_score=5)
+        note = SummaryAgent()._screening_note(materials)
+        self.assertIn("共获取 5 条搜索结果，去重后 4 条，送评估 2 条", note)
+        self.assertIn("重复 1 条", note)
+
+    def test_no_search_results(self):
+        materials = {'original_text': PATENT, 'search_results': []}
+        self.assertEqual(screen_clues(materials), [])
+        self.assertEqual(materials['screening']['total'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.concurrency_limiter import AdaptiveConcurrencyLimiter, MIN_LATENCY_SAMPLES
+from agents.metrics import LLM_CONCURRENCY_LIMIT, LLM_CONCURRENCY_QUEUE_DEPTH
+from agents.retry_policy import RetryPolicy, CircuitBreaker, call_with_retry
+
+
+class TestAimd(unittest.TestCase):
+    def test_additive_increase(self):
+        limiter = AdaptiveConcurrencyLimiter("test-increase", initial_limit=4, max_limit=6)
+        # 每次成功增加 1/limit，约一轮（limit 次调用）增加 1
+        for _ in range(5):
+            limiter.release(limiter.acquire())
+        self.assertEqual(int(limiter.limit), 5)
+        for _ in range(100):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 6)
+        self.assertEqual(LLM_CONCURRENCY_LIMIT.value(endpoint="test-increase"), 6)
+
+    def test_rate_limit_halves_once_per_window(self):
+        limiter = AdaptiveConcurrencyLimiter("test-halve", initial_limit=16)
+        started = [limiter.acquire() for _ in range(4)]
+        for started_at in started:
+            limiter.release(started_at, error_class='rate_limit')
+        # 同一批在途调用的 429 只减半一次
+        self.assertEqual(limiter.limit, 8)
+        limiter.release(limiter.acquire(), error_class='rate_limit')
+        self.assertEqual(limiter.limit, 4)
+
+    def test_other_errors_keep_limit(self):
+        limiter = AdaptiveConcurrencyLimiter("test-other", initial_limit=4)
+        limiter.release(limiter.acquire(), error_class='other')
+        self.assertEqual(limiter.limit, 4)
+
+    def test_never_below_min_limit(self):
+        limiter = AdaptiveConcurrencyLimiter("test-min", initial_limit=2, min_limit=2)
+        limiter.release(limiter.acquire(), error_class='timeout')
+        self.assertEqual(limiter.limit, 2)
+
+    @patch('agents.concurrency_limiter.time.monotonic')
+    def test_latency_spike_halves(self, mock_monotonic):
+        mock_monotonic.return_value = 0.0
+        limiter = AdaptiveConcurrencyLimiter("test-latency", initial_limit=10, latency_tolerance=2.0)
+        for _ in range(MIN_LATENCY_SAMPLES):
+            started_at = limiter.acquire()
+            mock_monotonic.return_value += 1.0
+            limiter.release(started_at, stage='evaluation')
+        limit = limiter.limit
+        started_at = limiter.acquire()
+        mock_monotonic.return_value += 5.0
+        limiter.release(started_at, stage='evaluation')
+        self.assertAlmostEqual(limiter.limit, limit / 2)
+
+
+class TestQueueing(unittest.TestCase):
+    def test_waiters_get_freed_slots(self):
+        limiter = AdaptiveConcurrencyLimiter("test-queue", initial_limit=1, max_limit=1)
+        first = limiter.acquire()
+        acquired = threading.Event()
+
+        def wait_for_slot():
+            limiter.release(limiter.acquire())
+            acquired.set()
+
+        thread = threading.Thread(target=wait_for_slot)
+        thread.start()
+        for _ in range(100):
+            if LLM_CONCURRENCY_QUEUE_DEPTH.value(endpoint="test-queue") == 1:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(LLM_CONCURRENCY_QUEUE_DEPTH.value(endpoint="test-queue"), 1)
+        self.assertFalse(acquired.is_set())
+        limiter.release(first)
+        self.assertTrue(acquired.wait(2))
+        thread.join()
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(LLM_CONCURRENCY_QUEUE_DEPTH.value(endpoint="test-queue"), 0)
+
+    def test_async_waiters_and_cancellation(self):
+        limiter = AdaptiveConcurrencyLimiter("test-async", initial_limit=1, max_limit=1)
+
+        async def run():
+            first = await limiter.acquire_async()
+            cancelled = asyncio.ensure_future(limiter.acquire_async())
+            waiting = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+            limiter.release(first)
+            limiter.release(await asyncio.wait_for(waiting, 2))
+
+        asyncio.run(run())
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(len(limiter._waiters), 0)
+
+
+class TestRetryIntegration(unittest.TestCase):
+    @patch('agents.retry_policy.time.sleep')
+    def test_slot_released_between_retries(self, mock_sleep):
+        limiter = AdaptiveConcurrencyLimiter("test-retry-slot", initial_limit=4)
+        calls = []
+
+        def attempt():
+            calls.append(limiter.in_flight)
+            if len(calls) == 1:
+                raise TimeoutError("slow")
+            return "ok"
+
+        with patch('agents.retry_policy.classify_error', return_value='timeout'):
+            result = call_with_retry(attempt, RetryPolicy(), CircuitBreaker("test-retry-slot"), "test", limiter, 'research')
+        self.assertEqual(result, "ok")
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.limit, 2.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
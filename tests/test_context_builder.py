@@ -0,0 +1,76 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.context_builder import ContextBuilder, EstimatingTokenizer, shrink_patent, get_tokenizer, stage_budget
+from agents.summary_agent import SummaryAgent
+
+LONG_PATENT = """摘要
+一种数据传输方法。
+权利要求书
+1. 一种数据传输方法，包括接收数据和压缩数据。
+2. 根据权利要求1所述的方法，其中压缩采用LZ4。
+说明书
+""" + "说明书段落。\n" * 3000
+
+
+class TestEstimatingTokenizer(unittest.TestCase):
+    def test_counts_cjk_per_character(self):
+        tokenizer = EstimatingTokenizer()
+        self.assertEqual(tokenizer.count("专利分析"), 4)
+        self.assertEqual(tokenizer.count("abcdefgh"), 2)
+        self.assertEqual(tokenizer.count("专利 abcd"), 4)
+
+    def test_truncate(self):
+        tokenizer = EstimatingTokenizer()
+        self.assertEqual(tokenizer.truncate("专利分析报告", 3), "专利分")
+
+
+class TestContextBuilder(unittest.TestCase):
+    def test_everything_fits(self):
+        builder = ContextBuilder('summary', budget=1000)
+        context = builder.add('system', "系统提示", priority=0).add('patent', "专利内容", priority=1).build()
+        self.assertEqual(context, {'system': "系统提示", 'patent': "专利内容"})
+        self.assertEqual(builder.report['dropped'], {})
+
+    def test_items_are_dropped_whole_and_reported(self):
+        items = [f"线索{i}: " + "相关产品" * 20 for i in range(10)]
+        builder = ContextBuilder('evaluation', budget=500)
+        context = builder.add('clues', items=items, priority=1, max_share=0.5).add('patent', LONG_PATENT, priority=2, shrink=shrink_patent).build()
+
+        kept = context['clues'].split("\n")
+        self.assertEqual(kept, items[:len(kept)])
+        self.assertEqual(builder.report['dropped']['clues']['items'], len(items) - len(kept))
+        self.assertIn('patent', builder.report['dropped'])
+        self.assertLessEqual(builder.report['used'], 500)
+
+    def test_patent_shrink_keeps_claims(self):
+        tokenizer = get_tokenizer(None)
+        shrunk = shrink_patent(LONG_PATENT, 300)
+        self.assertLessEqual(tokenizer.count(shrunk), 300)
+        self.assertIn("1. 一种数据传输方法", shrunk)
+
+    def test_output_keeps_insertion_order(self):
+        builder = ContextBuilder('summary', budget=1000)
+        context = builder.add('b', "second", priority=2).add('a', "first", priority=1).build()
+        self.assertEqual(list(context), ['b', 'a'])
+
+
+class TestSummaryBudget(unittest.TestCase):
+    def test_summary_prompt_fits_stage_budget(self):
+        research_materials = {
+            'original_text': LONG_PATENT,
+            'search_results': [{'query': f"q{i}", 'result': "结果片段" * 200} for i in range(50)],
+            'evaluated_clues': [{'match_score': 80, 'risk_level': '高', 'evidence': '证据'}],
+        }
+        messages = SummaryAgent()._build_messages(research_materials, "总结提示")
+        tokenizer = get_tokenizer(None)
+        total = sum(tokenizer.count(message['content']) for message in messages)
+        self.assertLessEqual(total, stage_budget('summary') + 100)
+        self.assertIn("匹配度：80分", messages[1]['content'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import sys
+import os
+import io
+import hashlib
+import tempfile
+from unittest import mock
+
+from werkzeug.datastructures import FileStorage
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents import research_agent
+from agents.document_store import DocumentTextStore, save_upload, file_sha256
+
+
+class FakeExtractor:
+    def __init__(self):
+        self.calls = 0
+
+    def extract_document(self, data, digest=None):
+        self.calls += 1
+        return {'text': data.decode('utf-8') or None, 'page_count': 1, 'backend': 'fake'}
+
+
+class TestSaveUpload(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _upload(self, content, filename='patent.pdf'):
+        return save_upload(FileStorage(stream=io.BytesIO(content), filename=filename), self.tmp.name)
+
+    def test_same_name_different_content(self):
+        first = self._upload(b'first patent')
+        second = self._upload(b'second patent')
+        self.assertNotEqual(first, second)
+        self.assertEqual(first, hashlib.sha256(b'first patent').hexdigest() + '.pdf')
+        self.assertEqual(file_sha256(os.path.join(self.tmp.name, second)), hashlib.sha256(b'second patent').hexdigest())
+
+    def test_duplicate_upload_is_stored_once(self):
+        first = self._upload(b'same content', 'a.pdf')
+        second = self._upload(b'same content', 'b.pdf')
+        self.assertEqual(first, second)
+        self.assertEqual(os.listdir(self.tmp.name), [first])
+
+
+class TestDocumentTextStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = DocumentTextStore(os.path.join(self.tmp.name, 'documents.sqlite3'))
+        self.extractor = FakeExtractor()
+        patchers = [
+            mock.patch.object(research_agent, 'document_store', self.store),
+            mock.patch.object(research_agent, 'get_pdf_extractor', lambda: self.extractor),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_repeat_extraction_uses_store(self):
+        agent = research_agent.ResearchAgent()
+        self.assertEqual(agent._extract_pdf_bytes(b'patent text'), 'patent text')
+        self.assertEqual(agent._extract_pdf_bytes(b'patent text'), 'patent text')
+        self.assertEqual(self.extractor.calls, 1)
+
+        document = self.store.get(hashlib.sha256(b'patent text').hexdigest())
+        self.assertEqual((document['page_count'], document['backend'], document['size']), (1, 'fake', 11))
+
+    def test_empty_text_is_not_stored(self):
+        agent = research_agent.ResearchAgent()
+        self.assertIsNone(agent._extract_pdf_bytes(b''))
+        self.assertEqual(self.store.stats()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,254 @@
+import asyncio
+import threading
+import time
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.hedging import HedgePolicy
+from agents.model_adapter import MockCompletion, HedgedModelAdapter, AsyncHedgedModelAdapter, _HedgeRace, _HedgeAttempt, _StreamCollector, _StreamStats
+from agents.retry_policy import RequestCancelled
+
+
+def _warm_policy(stage='research', ttft=0.01, **kwargs):
+    policy = HedgePolicy(min_delay=0.05, min_samples=5, **kwargs)
+    for _ in range(5):
+        policy.record_ttft(stage, ttft)
+    return policy
+
+
+class SlowThenFastAdapter:
+    """第一次调用迟迟不输出，之后的调用立即输出"""
+
+    def __init__(self, first_delay=1.0):
+        self.first_delay = first_delay
+        self.calls = 0
+        self.cancelled = []
+        self._lock = threading.Lock()
+
+    def get_response(self, messages, **kwargs):
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+        if index == 0:
+            time.sleep(self.first_delay)
+        try:
+            for token in ("你", "好"):
+                kwargs['hedge_attempt'].chunk()
+                if kwargs.get('on_token'):
+                    kwargs['on_token'](token)
+        except RequestCancelled:
+            self.cancelled.append(index)
+            return None
+        return MockCompletion(f"你好-{index}")
+
+    def close(self):
+        pass
+
+
+class StalledStreamAdapter:
+    """第一次调用打开响应流后一直不输出，直到流被关闭；之后的调用立即返回"""
+
+    def __init__(self):
+        self.calls = 0
+        self.closed = threading.Event()
+        self.on_token_passed = []
+        self.results = []
+
+    def get_response(self, messages, **kwargs):
+        index = self.calls
+        self.calls += 1
+        self.on_token_passed.append(kwargs.get('on_token') is not None)
+        hedge_attempt = kwargs['hedge_attempt']
+        if index > 0:
+            hedge_attempt.chunk()
+            return MockCompletion(f"完成-{index}")
+        hedge_attempt.opened(self.closed.set)
+        if not self.closed.wait(5):
+            return MockCompletion("超时")
+        # 流被关闭后读取出错，适配器按放弃处理
+        self.results.append(hedge_attempt.cancelled)
+        return None
+
+    def close(self):
+        pass
+
+
+class WinnerFailsAdapter:
+    """主请求迟迟不输出；对冲请求先输出首个 chunk 胜出后失败；之后不带对冲的重试成功"""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_response(self, messages, **kwargs):
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+        hedge_attempt = kwargs.get('hedge_attempt')
+        if hedge_attempt is None:
+            return MockCompletion("重试")
+        if index == 0:
+            time.sleep(0.2)
+        try:
+            hedge_attempt.chunk()
+        except RequestCancelled:
+            return None
+        return None
+
+    def close(self):
+        pass
+
+
+class AsyncSlowThenFastAdapter:
+    def __init__(self, first_delay=1.0):
+        self.first_delay = first_delay
+        self.calls = 0
+        self.cancelled = []
+
+    async def get_response(self, messages, **kwargs):
+        index = self.calls
+        self.calls += 1
+        try:
+            if index == 0:
+                await asyncio.sleep(self.first_delay)
+            for token in ("你", "好"):
+                kwargs['hedge_attempt'].chunk()
+                if kwargs.get('on_token'):
+                    kwargs['on_token'](token)
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+        return MockCompletion(f"你好-{index}")
+
+    async def close(self):
+        pass
+
+
+class TestHedgePolicy(unittest.TestCase):
+    def test_no_delay_without_samples(self):
+        policy = HedgePolicy(min_samples=3)
+        policy.record_ttft('research', 1.0)
+        self.assertIsNone(policy.hedge_delay('research'))
+
+    def test_delay_is_percentile_with_floor(self):
+        policy = HedgePolicy(percentile=90, min_delay=0.5, min_samples=10)
+        for seconds in range(1, 11):
+            policy.record_ttft('summary', seconds)
+        self.assertEqual(policy.hedge_delay('summary'), 10)
+        for _ in range(100):
+            policy.record_ttft('evaluation', 0.1)
+        self.assertEqual(policy.hedge_delay('evaluation'), 0.5)
+
+    def test_budget_caps_hedges(self):
+        policy = HedgePolicy(budget_ratio=0.5, burst=2)
+        self.assertTrue(policy.try_hedge())
+        self.assertTrue(policy.try_hedge())
+        self.assertFalse(policy.try_hedge())
+        for _ in range(2):
+            policy.on_request()
+        self.assertTrue(policy.try_hedge())
+        self.assertFalse(policy.try_hedge())
+
+
+class TestHedgedModelAdapter(unittest.TestCase):
+    def test_hedge_wins_and_primary_is_abandoned(self):
+        inner = SlowThenFastAdapter(first_delay=0.5)
+        tokens = []
+        adapter = HedgedModelAdapter(inner, _warm_policy())
+        response = adapter.get_response([], stage='research', on_token=tokens.append)
+        self.assertEqual(response.choices[0].message.content, "你好-1")
+        self.assertEqual(tokens, ["你", "好"])
+        for _ in range(100):
+            if inner.cancelled:
+                break
+            time.sleep(0.01)
+        self.assertEqual(inner.cancelled, [0])
+
+    def test_loser_stream_is_closed_when_stalled(self):
+        inner = StalledStreamAdapter()
+        adapter = HedgedModelAdapter(inner, _warm_policy())
+        started_at = time.perf_counter()
+        response = adapter.get_response([], stage='research')
+        self.assertEqual(response.choices[0].message.content, "完成-1")
+        self.assertTrue(inner.closed.wait(1))
+        self.assertLess(time.perf_counter() - started_at, 1)
+        for _ in range(100):
+            if inner.results:
+                break
+            time.sleep(0.01)
+        self.assertEqual(inner.results, [True])
+
+    def test_call_without_on_token_stays_non_streaming(self):
+        inner = StalledStreamAdapter()
+        HedgedModelAdapter(inner, _warm_policy()).get_response([], stage='research')
+        self.assertEqual(inner.on_token_passed, [False, False])
+
+    def test_tool_call_only_chunk_records_ttft(self):
+        policy = HedgePolicy(min_samples=1)
+        attempt = _HedgeAttempt(_HedgeRace(threading.Event()), 0, policy, 'research')
+        tool_call = SimpleNamespace(index=0, id="call_1", function=SimpleNamespace(name="search", arguments="{}"))
+        chunk = SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None, tool_calls=[tool_call]), finish_reason=None)])
+        collector = _StreamCollector(None, _StreamStats('research'), attempt)
+        collector.add(chunk)
+        self.assertIsNotNone(policy.hedge_delay('research'))
+
+    def test_primary_runs_on_caller_thread(self):
+        threads = []
+
+        class RecordingAdapter(SlowThenFastAdapter):
+            def get_response(self, messages, **kwargs):
+                threads.append(threading.current_thread())
+                return SlowThenFastAdapter.get_response(self, messages, **kwargs)
+
+        HedgedModelAdapter(RecordingAdapter(first_delay=0), _warm_policy()).get_response([], stage='research')
+        self.assertEqual(threads, [threading.current_thread()])
+
+    def test_winner_failing_after_first_chunk_is_retried(self):
+        inner = WinnerFailsAdapter()
+        response = HedgedModelAdapter(inner, _warm_policy()).get_response([], stage='research')
+        self.assertEqual(response.choices[0].message.content, "重试")
+        self.assertEqual(inner.calls, 3)
+
+    def test_fast_primary_is_not_hedged(self):
+        inner = SlowThenFastAdapter(first_delay=0)
+        adapter = HedgedModelAdapter(inner, _warm_policy())
+        self.assertEqual(adapter.get_response([], stage='research').choices[0].message.content, "你好-0")
+        self.assertEqual(inner.calls, 1)
+
+    def test_budget_exhausted_waits_for_primary(self):
+        inner = SlowThenFastAdapter(first_delay=0.2)
+        adapter = HedgedModelAdapter(inner, _warm_policy(burst=0))
+        self.assertEqual(adapter.get_response([], stage='research').choices[0].message.content, "你好-0")
+        self.assertEqual(inner.calls, 1)
+
+    def test_without_samples_records_ttft(self):
+        inner = SlowThenFastAdapter(first_delay=0)
+        policy = HedgePolicy(min_samples=1)
+        adapter = HedgedModelAdapter(inner, policy)
+        adapter.get_response([], stage='summary')
+        self.assertIsNotNone(policy.hedge_delay('summary'))
+
+
+class TestAsyncHedgedModelAdapter(unittest.TestCase):
+    def test_loser_task_is_cancelled(self):
+        inner = AsyncSlowThenFastAdapter(first_delay=5)
+        tokens = []
+
+        async def run():
+            adapter = AsyncHedgedModelAdapter(inner, _warm_policy('evaluation'))
+            response = await adapter.get_response([], stage='evaluation', on_token=tokens.append)
+            await asyncio.sleep(0)
+            return response
+
+        response = asyncio.run(run())
+        self.assertEqual(response.choices[0].message.content, "你好-1")
+        self.assertEqual(tokens, ["你", "好"])
+        self.assertEqual(inner.cancelled, [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
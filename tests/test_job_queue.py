@@ -0,0 +1,112 @@
+import unittest
+import sys
+import os
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.job_queue import JobQueue, JobQueueFullError
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = JobQueue(max_workers=1, max_pending=1)
+
+    def tearDown(self):
+        self.queue.shutdown()
+
+    def _wait(self, job, timeout=5):
+        self.queue._executor.submit(lambda: None).result(timeout=timeout)
+        return self.queue.get(job.job_id)
+
+    def test_job_result(self):
+        job = self.queue.submit(lambda a, b, **_: a + b, 1, b=2)
+        job = self._wait(job)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.result, 3)
+
+    def test_job_failure(self):
+        def fail(**_):
+            raise ValueError("无法提取有效文本内容")
+        job = self._wait(self.queue.submit(fail))
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, "无法提取有效文本内容")
+
+    def test_queue_full(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def block(**_):
+            started.set()
+            release.wait(5)
+
+        self.queue.submit(block)
+        started.wait(5)
+        pending = self.queue.submit(lambda **_: None)  # 占满等待队列
+        self.assertEqual(self.queue.queue_position(pending.job_id), 1)
+        with self.assertRaises(JobQueueFullError):
+            self.queue.submit(lambda **_: None)
+        release.set()
+
+    def test_progress_events(self):
+        def work(progress_callback=None):
+            progress_callback('stage', stage='research')
+            return 'ok'
+
+        job = self._wait(self.queue.submit(work))
+        events, finished = job.wait_for_events(-1, timeout=1)
+        self.assertTrue(finished)
+        self.assertEqual([e['event'] for e in events], ['stage', 'done'])
+        self.assertEqual(events[0]['data'], {'stage': 'research'})
+        self.assertEqual(job.wait_for_events(1, timeout=0), ([], True))
+
+    def test_tokens_are_coalesced_and_dropped_when_finished(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def work(progress_callback=None):
+            progress_callback('stage', stage='summary')
+            for token in "专利侵权分析报告":
+                progress_callback('token', content=token)
+            progress_callback('stage', stage='done')
+            started.set()
+            release.wait(5)
+            return 'ok'
+
+        job = self.queue.submit(work)
+        started.wait(5)
+        events, finished = job.wait_for_events(-1, timeout=1)
+        self.assertFalse(finished)
+        self.assertEqual([e['event'] for e in events], ['stage', 'token', 'stage'])
+        self.assertEqual(events[1]['data'], {'content': "专利侵权分析报告"})
+
+        release.set()
+        job = self._wait(job)
+        events, finished = job.wait_for_events(-1, timeout=1)
+        self.assertEqual([(e['id'], e['event']) for e in events], [(0, 'stage'), (2, 'stage'), (3, 'done')])
+        # 断线续传时 id 仍然有效
+        self.assertEqual([e['id'] for e in job.wait_for_events(2, timeout=0)[0]], [3])
+
+    def test_stalled_tokens_are_flushed_while_waiting(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def work(progress_callback=None):
+            progress_callback('token', content="部分")
+            started.set()
+            release.wait(5)  # 模型输出停顿
+            return 'ok'
+
+        job = self.queue.submit(work)
+        started.wait(5)
+        events, finished = job.wait_for_events(-1, timeout=2)
+        release.set()
+        self.assertFalse(finished)
+        self.assertEqual([(e['event'], e['data']) for e in events], [('token', {'content': "部分"})])
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.queue.get('missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
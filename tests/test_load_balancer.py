@@ -0,0 +1,149 @@
+import asyncio
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.load_balancer import EndpointState, HealthChecker, get_endpoint_state, order_endpoints
+from agents.model_adapter import (
+    MockCompletion, LoadBalancedModelAdapter, AsyncLoadBalancedModelAdapter, OllamaAdapter,
+    create_model_adapter, _endpoint_configs, _health_probe
+)
+from agents.retry_policy import CircuitBreaker, RetryPolicy
+
+
+class FakeAdapter:
+    def __init__(self, endpoint, responses=None, tokens=()):
+        self.endpoint = endpoint
+        self.circuit_breaker = CircuitBreaker(endpoint)
+        self.responses = list(responses or [])
+        self.tokens = tokens
+        self.calls = 0
+
+    def get_response(self, messages, **kwargs):
+        self.calls += 1
+        for token in self.tokens:
+            kwargs['on_token'](token)
+        return self.responses.pop(0) if self.responses else None
+
+    def close(self):
+        pass
+
+
+class FakeAsyncAdapter(FakeAdapter):
+    async def get_response(self, messages, **kwargs):
+        return FakeAdapter.get_response(self, messages, **kwargs)
+
+
+class TestOrderEndpoints(unittest.TestCase):
+    def _endpoint(self, name, outstanding=0, healthy=True):
+        state = EndpointState(name)
+        state.outstanding = outstanding
+        state.healthy = healthy
+        return (state, CircuitBreaker(name, failure_threshold=1, reset_timeout=60), None)
+
+    def test_least_outstanding_first(self):
+        busy = self._endpoint("order-busy", outstanding=3)
+        idle = self._endpoint("order-idle", outstanding=1)
+        self.assertIs(order_endpoints([busy, idle])[0], idle)
+
+    def test_unhealthy_and_open_circuit_last(self):
+        unhealthy = self._endpoint("order-unhealthy", healthy=False)
+        ejected = self._endpoint("order-ejected")
+        ejected[1].record_failure('connection')
+        busy = self._endpoint("order-available", outstanding=10)
+        ordered = order_endpoints([unhealthy, ejected, busy])
+        self.assertIs(ordered[0], busy)
+        self.assertEqual(len(ordered), 3)
+
+
+class TestLoadBalancedAdapter(unittest.TestCase):
+    def test_fails_over_to_next_endpoint(self):
+        failing = FakeAdapter("http://lb-failing:11434")
+        working = FakeAdapter("http://lb-working:11434", [MockCompletion("ok")])
+        # 让失败的端点排在前面
+        get_endpoint_state(working.endpoint).outstanding = 5
+        try:
+            adapter = LoadBalancedModelAdapter([failing, working])
+            response = adapter.get_response([{'role': 'user', 'content': 'hi'}], stage='research')
+        finally:
+            get_endpoint_state(working.endpoint).outstanding = 0
+        self.assertEqual(response.choices[0].message.content, "ok")
+        self.assertEqual((failing.calls, working.calls), (1, 1))
+
+    def test_no_failover_after_streamed_tokens(self):
+        first = FakeAdapter("http://lb-stream-a:11434", tokens=["部分"])
+        second = FakeAdapter("http://lb-stream-b:11434", tokens=["部分"])
+        tokens = []
+        adapter = LoadBalancedModelAdapter([first, second])
+        self.assertIsNone(adapter.get_response([], on_token=tokens.append))
+        self.assertEqual(first.calls + second.calls, 1)
+        self.assertEqual(tokens, ["部分"])
+
+    def test_outstanding_released(self):
+        endpoint = FakeAdapter("http://lb-outstanding:11434", [MockCompletion("ok")])
+        LoadBalancedModelAdapter([endpoint]).get_response([])
+        self.assertEqual(get_endpoint_state(endpoint.endpoint).outstanding, 0)
+
+    def test_retries_next_round_after_all_endpoints_fail(self):
+        recovering = FakeAdapter("http://lb-round-a:11434", [None, MockCompletion("ok")])
+        down = FakeAdapter("http://lb-round-b:11434")
+        adapter = LoadBalancedModelAdapter([recovering, down], RetryPolicy(base_delay=0), max_rounds=2)
+        self.assertEqual(adapter.get_response([]).choices[0].message.content, "ok")
+        self.assertEqual(recovering.calls, 2)
+        self.assertIn(down.calls, (1, 2))  # 第二轮的端点顺序随机
+
+    def test_async_failover(self):
+        failing = FakeAsyncAdapter("http://lb-async-a:11434")
+        working = FakeAsyncAdapter("http://lb-async-b:11434", [MockCompletion("ok")])
+        adapter = AsyncLoadBalancedModelAdapter([failing, working])
+        response = asyncio.run(adapter.get_response([]))
+        self.assertEqual(response.choices[0].message.content, "ok")
+
+
+class TestHealthChecker(unittest.TestCase):
+    def test_marks_unhealthy_and_recovers(self):
+        state = EndpointState("health-test")
+        probe = MagicMock(side_effect=[False, ConnectionError("down"), True])
+        checker = HealthChecker(state, probe, interval=60)
+        self.assertFalse(checker.check())
+        self.assertFalse(state.healthy)
+        self.assertFalse(checker.check())
+        self.assertTrue(checker.check())
+        self.assertTrue(state.healthy)
+
+
+class TestEndpointConfig(unittest.TestCase):
+    def test_endpoints_expand_to_per_endpoint_configs(self):
+        config = {"type": "openai", "api_key": "k", "base_url": "http://a", "endpoints": ["http://a", {"base_url": "http://b", "api_key": "k2"}]}
+        configs = _endpoint_configs(config)
+        self.assertEqual([c["base_url"] for c in configs], ["http://a", "http://b"])
+        self.assertEqual(configs[1]["api_key"], "k2")
+        self.assertIsNone(configs[0]["endpoints"])
+
+    @patch('agents.model_adapter.start_health_check')
+    def test_create_load_balanced_adapter(self, mock_health_check):
+        adapter = create_model_adapter({
+            "type": "ollama", "model_name": "qwen3:8b",
+            "endpoints": ["http://lb-ollama-1:11434", "http://lb-ollama-2:11434"],
+            "health_check_interval_seconds": 30
+        })
+        self.assertIsInstance(adapter, LoadBalancedModelAdapter)
+        self.assertTrue(all(isinstance(a, OllamaAdapter) for a in adapter.adapters))
+        self.assertEqual(mock_health_check.call_count, 2)
+        # 端点自身不重试，第一次基础设施错误即转到下一个端点，重试由负载均衡适配器按轮次进行
+        self.assertTrue(all(not any(a.retry_policy.budgets.values()) for a in adapter.adapters))
+        self.assertEqual(adapter.max_rounds, 3)
+        adapter.close()
+
+    def test_health_probe_rejects_client_errors(self):
+        probe = _health_probe({"type": "openai", "api_key": "k", "base_url": "http://probe"})
+        for status_code, healthy in ((200, True), (429, True), (401, False), (403, False), (404, False), (503, False)):
+            with patch('agents.model_adapter.httpx.get', return_value=MagicMock(status_code=status_code)):
+                self.assertEqual(probe(), healthy, status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
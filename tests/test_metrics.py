@@ -0,0 +1,48 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.metrics import MetricsRegistry
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_render(self):
+        retries = self.registry.counter('llm_retries_total', '模型调用重试次数', ('error_class',))
+        retries.inc(error_class='RateLimitError')
+        retries.inc(2, error_class='RateLimitError')
+        self.assertEqual(self.registry.render(), (
+            "# HELP llm_retries_total 模型调用重试次数\n"
+            "# TYPE llm_retries_total counter\n"
+            'llm_retries_total{error_class="RateLimitError"} 3\n'
+        ))
+
+    def test_histogram_buckets_are_cumulative(self):
+        latency = self.registry.histogram('stage_seconds', '阶段耗时', ('stage',), buckets=(1, 5))
+        latency.observe(0.5, stage='research')
+        latency.observe(3, stage='research')
+        latency.observe(10, stage='research')
+        rendered = self.registry.render()
+        self.assertIn('stage_seconds_bucket{stage="research",le="1"} 1', rendered)
+        self.assertIn('stage_seconds_bucket{stage="research",le="5"} 2', rendered)
+        self.assertIn('stage_seconds_bucket{stage="research",le="+Inf"} 3', rendered)
+        self.assertIn('stage_seconds_sum{stage="research"} 13.5', rendered)
+        self.assertIn('stage_seconds_count{stage="research"} 3', rendered)
+
+    def test_label_values_are_escaped(self):
+        gauge = self.registry.gauge('queue_depth', '队列长度', ('name',))
+        gauge.set(4, name='a"b')
+        self.assertIn('queue_depth{name="a\\"b"} 4', self.registry.render())
+
+    def test_missing_label_rejected(self):
+        counter = self.registry.counter('requests_total', '请求数', ('outcome',))
+        with self.assertRaises(ValueError):
+            counter.inc()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import sys
+import os
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.digest_agent import DigestAgent
+from agents.model_adapter import MockCompletion
+from agents.patent_segmenter import segment_patent, is_independent_claim, chunk_patent, condense_patent
+
+CN_PATENT = """CN123456789A
+摘要
+一种数据传输方法，通过压缩提高传输效率。
+权利要求书
+1. 一种数据传输方法，其特征在于，包括：
+步骤1. 接收数据；
+2. 根据权利要求1所述的方法，其特征在于，压缩采用LZ4。
+3. 一种数据传输装置，包括处理器。
+4. 如权利要求3所述的装置，还包括存储器。
+说明书
+技术领域
+本发明涉及通信技术。
+""" + "背景技术段落。\n" * 2000
+
+EN_PATENT = """Abstract
+A method for compressing packets.
+What is claimed is:
+1. A method comprising: receiving a packet; and compressing the packet.
+2. The method of claim 1, wherein the compression is LZ4.
+3. A system comprising a processor.
+"""
+
+
+class TestSegmentation(unittest.TestCase):
+    def test_chinese_sections_and_claims(self):
+        segments = segment_patent(CN_PATENT)
+        self.assertEqual(segments['abstract'], "一种数据传输方法，通过压缩提高传输效率。")
+        self.assertEqual(len(segments['claims']), 4)
+        self.assertIn("步骤1. 接收数据", segments['claims'][0])
+        self.assertEqual([is_independent_claim(claim) for claim in segments['claims']], [True, False, True, False])
+        self.assertTrue(segments['description'].startswith("CN123456789A"))
+
+    def test_english_claims(self):
+        claims = segment_patent(EN_PATENT)['claims']
+        self.assertEqual([is_independent_claim(claim) for claim in claims], [True, False, True])
+
+    def test_chunks_respect_limit_and_boundaries(self):
+        chunks = chunk_patent(CN_PATENT, 5000)
+        self.assertEqual([chunk['kind'] for chunk in chunks[:2]], ['abstract', 'claims'])
+        self.assertTrue(all(len(chunk['text']) <= 5000 for chunk in chunks))
+        self.assertTrue(chunks[1]['text'].endswith("还包括存储器。"))
+
+    def test_condense_keeps_claims_of_long_patent(self):
+        condensed = condense_patent(CN_PATENT, 2000)
+        self.assertLess(len(condensed), 2200)
+        self.assertIn("1. 一种数据传输方法", condensed)
+        self.assertIn("3. 一种数据传输装置", condensed)
+
+    def test_short_text_is_unchanged(self):
+        self.assertEqual(condense_patent(EN_PATENT, 15000), EN_PATENT)
+
+
+class FakeAdapter:
+    """所有分块请求都到达后才一起返回，验证 map 阶段是并发执行的"""
+
+    def __init__(self, parties):
+        self.barrier = threading.Barrier(parties, timeout=5)
+        self.calls = []
+
+    def get_response(self, messages, **kwargs):
+        self.calls.append(kwargs['stage'])
+        self.barrier.wait()
+        return MockCompletion(f"要点: {messages[1]['content'][:10]}")
+
+
+class TestDigestAgent(unittest.TestCase):
+    def test_short_patent_skips_model(self):
+        agent = DigestAgent(max_chars=15000)
+        agent.model_adapter = None
+        self.assertEqual(agent.build_context(EN_PATENT), EN_PATENT)
+
+    def test_map_runs_chunks_concurrently(self):
+        agent = DigestAgent(max_chars=10000, chunk_chars=5000, map_reduce=True)
+        chunks = chunk_patent(CN_PATENT, 5000)
+        agent.model_adapter = FakeAdapter(len(chunks))
+        events = []
+        context = agent.build_context(CN_PATENT, lambda event, **data: events.append((event, data)))
+
+        self.assertEqual(agent.model_adapter.calls, ['digest'] * len(chunks))
+        self.assertEqual(events, [('digest', {'chunks': len(chunks)})])
+        self.assertTrue(context.startswith("独立权利要求原文：\n1. 一种数据传输方法"))
+        self.assertIn(f"### 第{len(chunks)}部分要点", context)
+        self.assertLessEqual(len(context), 10000)
+
+    def test_disabled_map_reduce_keeps_full_text(self):
+        agent = DigestAgent(max_chars=2000, map_reduce=False)
+        agent.model_adapter = None
+        self.assertEqual(agent.build_context(CN_PATENT), CN_PATENT)
+
+
+if __name__ == '__main__':
+    unittest.main()
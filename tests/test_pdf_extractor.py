@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.pdf_extractor import (
+    PdfTextExtractor, PdfPageCache, PyPDF2Backend, _split_ranges, get_backend, shutdown_process_pool
+)
+
+
+def make_pdf(page_texts):
+    """生成每页一行文本的最小 PDF"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in page_texts:
+        content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return pdf
+
+
+class CountingBackend(PyPDF2Backend):
+    """记录实际提取过的页"""
+
+    def __init__(self):
+        self.extracted = []
+
+    def extract_pages(self, data, start, stop):
+        self.extracted.extend(range(start, stop))
+        return super().extract_pages(data, start, stop)
+
+
+class TestPdfTextExtractor(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data = make_pdf([f"Page {index}" for index in range(6)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_serial_extraction_joins_pages_in_order(self):
+        extractor = PdfTextExtractor(get_backend('pypdf2'), parallel_min_pages=100)
+        text = extractor.extract(self.data)
+        self.assertEqual(text.split("\n")[:6], [f"Page {index}" for index in range(6)])
+        self.assertTrue(text.endswith("\n"))
+
+    def test_parallel_extraction_matches_serial(self):
+        serial = PdfTextExtractor(get_backend('pypdf2'), parallel_min_pages=100).extract(self.data)
+        try:
+            parallel = PdfTextExtractor(get_backend('pypdf2'), parallel_min_pages=2, max_workers=2).extract(self.data)
+        finally:
+            shutdown_process_pool()
+        self.assertEqual(parallel, serial)
+
+    def test_page_cache_skips_extracted_pages(self):
+        cache = PdfPageCache(os.path.join(self.tmp.name, 'pages.sqlite3'))
+        backend = CountingBackend()
+        extractor = PdfTextExtractor(backend, page_cache=cache, parallel_min_pages=100)
+        first = extractor.extract(self.data)
+        self.assertEqual(backend.extracted, list(range(6)))
+
+        backend.extracted = []
+        self.assertEqual(extractor.extract(self.data), first)
+        self.assertEqual(backend.extracted, [])
+
+    def test_empty_document_returns_none(self):
+        extractor = PdfTextExtractor(get_backend('pypdf2'), parallel_min_pages=100)
+        self.assertIsNone(extractor.extract(make_pdf([""])))
+
+    def test_split_ranges(self):
+        self.assertEqual(_split_ranges([0, 1, 2, 3, 4], 2), [(0, 2), (2, 4), (4, 5)])
+        self.assertEqual(_split_ranges([0, 1, 4, 5], 10), [(0, 2), (4, 6)])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_backend('unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
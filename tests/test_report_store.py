@@ -0,0 +1,85 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.report_store import ReportStore, build_archive_entry
+
+
+class TestReportStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'reports.sqlite3')
+        self.store = ReportStore(self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        html = "<h2>侵权分析报告</h2>" + "<p>线索内容</p>" * 2000
+        report_id = self.store.save(html, 'file', 'abc.pdf', {'focus_area': '基站'})
+        self.assertTrue(report_id.startswith("HW-PAT-"))
+
+        # 新实例（例如服务重启后）仍能按同一 ID 读取
+        stored = ReportStore(self.path).get(report_id)
+        self.assertEqual(stored['result'], html)
+        self.assertEqual(stored['analysis_params'], {'focus_area': '基站'})
+        self.assertEqual(stored['source'], 'abc.pdf')
+
+    def test_result_is_compressed(self):
+        html = "<p>重复内容</p>" * 5000
+        report_id = self.store.save(html)
+        blob = self.store._connection().execute("SELECT result FROM reports WHERE report_id = ?", (report_id,)).fetchone()[0]
+        self.assertLess(len(blob), len(html.encode('utf-8')) / 10)
+
+    def test_missing_report(self):
+        self.assertIsNone(self.store.get("HW-PAT-2024-MISSING"))
+
+
+
+class TestReportArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = ReportStore(os.path.join(self.tmpdir.name, 'reports.sqlite3'))
+        materials = {
+            'search_results': [{'query': "LZ4 压缩 基站"}],
+            'evaluated_clues': [{'match_score': 85, 'risk_level': '高', 'evidence': "示例通信公司的基站产品采用LZ4压缩"}],
+            'report_markdown': "## 分析结果\n发现基站回传压缩相关的高风险线索。",
+        }
+        params = {'company_name': "国际知名ICT企业", 'target_companies': "示例通信", 'focus_area': "无线通信"}
+        self.report_id = self.store.save(
+            "<p>报告</p>", 'file', 'a.pdf', params,
+            archive=build_archive_entry(materials, params, {'patent_number': "CN112345678A", 'filing_date': "2021-03-01"})
+        )
+        for i in range(3):
+            self.store.save("<p>其他报告</p>", archive=build_archive_entry(
+                {'report_markdown': f"第{i}份关于显示面板的报告"}, {'focus_area': "显示技术"}, {'patent_number': f"CN20000000{i}B"}))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_search_by_fields(self):
+        for kwargs in ({'patent_number': "CN112345678"}, {'company': "示例通信"}, {'focus_area': "无线通信"},
+                       {'query': "回传压缩"}, {'query': "LZ4"}):
+            found = self.store.search(**kwargs)
+            self.assertEqual([item['report_id'] for item in found['results']], [self.report_id], kwargs)
+        self.assertEqual(self.store.search(query="回传压缩", focus_area="显示技术")['total'], 0)
+
+    def test_paging(self):
+        first = self.store.search(focus_area="显示技术", per_page=2)
+        second = self.store.search(focus_area="显示技术", page=2, per_page=2)
+        self.assertEqual(first['total'], 3)
+        self.assertEqual(len(first['results']) + len(second['results']), 3)
+        self.assertEqual(self.store.search(per_page=10)['total'], 4)
+
+    def test_resave_replaces_index_entry(self):
+        self.store.save("<p>新报告</p>", report_id=self.report_id,
+                        archive=build_archive_entry({'report_markdown': "内容已更新"}, {}, {}))
+        self.assertEqual(self.store.search(company="示例通信")['total'], 0)
+        self.assertEqual(self.store.search(query="内容已更新")['results'][0]['report_id'], self.report_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import sys
+import os
+import json
+import threading
+import time
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents import research_agent
+from agents.model_adapter import MockToolCall
+from agents.rate_limiter import RateLimiter
+
+
+class FakeSerpResponse:
+    def __init__(self, query):
+        self.query = query
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"organic_results": [{"snippet": f"snippet for {self.query}", "link": f"https://example.com/{self.query}"}]}
+
+
+class TestConcurrentToolCalls(unittest.TestCase):
+    def setUp(self):
+        for name in ('search_cache', 'search_index'):
+            patcher = mock.patch.object(research_agent, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.agent = research_agent.ResearchAgent()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def fake_get(self, url, params=None, timeout=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # 先发出的请求更晚返回，验证结果仍按 tool_call 顺序排列
+        time.sleep(0.05 * (3 - int(params['q'][-1])))
+        with self.lock:
+            self.in_flight -= 1
+        return FakeSerpResponse(params['q'])
+
+    def test_results_keep_tool_call_order(self):
+        tool_calls = [
+            MockToolCall(f"call_{i}", "search_internet", json.dumps({"query": f"q{i}"}))
+            for i in range(3)
+        ]
+        with mock.patch.object(research_agent.requests, 'get', side_effect=self.fake_get), \
+                mock.patch.object(research_agent, 'serp_api_rate_limiter', RateLimiter(0)):
+            responses = self.agent._execute_tool_calls(tool_calls)
+
+        self.assertEqual([r["tool_call_id"] for r in responses], ["call_0", "call_1", "call_2"])
+        self.assertIn("snippet for q0", responses[0]["content"])
+        self.assertEqual([r["query"] for r in self.agent.research_materials["search_results"]], ["q0", "q1", "q2"])
+        self.assertEqual(self.agent.search_count, 3)
+        self.assertGreater(self.max_in_flight, 1)
+
+    def test_failed_search_is_not_recorded(self):
+        tool_calls = [MockToolCall("call_0", "search_internet", json.dumps({"query": "q0"}))]
+        with mock.patch.object(research_agent.requests, 'get', side_effect=RuntimeError("boom")):
+            responses = self.agent._execute_tool_calls(tool_calls)
+        self.assertEqual(responses[0]["content"], "暂时无法获取SerpAPI搜索结果")
+        self.assertEqual(self.agent.research_materials["search_results"], [])
+
+    def test_malformed_arguments_return_tool_error(self):
+        tool_calls = [
+            MockToolCall("call_0", "search_internet", '{"query": "q0"'),
+            MockToolCall("call_1", "search_internet", json.dumps({"query": "q1"})),
+        ]
+        with mock.patch.object(research_agent.requests, 'get', side_effect=self.fake_get), \
+                mock.patch.object(research_agent, 'serp_api_rate_limiter', RateLimiter(0)):
+            responses = self.agent._execute_tool_calls(tool_calls)
+
+        self.assertEqual([r["tool_call_id"] for r in responses], ["call_0", "call_1"])
+        self.assertIn("不是有效的 JSON", responses[0]["content"])
+        self.assertIn("snippet for q1", responses[1]["content"])
+        self.assertEqual([r["query"] for r in self.agent.research_materials["search_results"]], ["q1"])
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_then_throttle(self):
+        limiter = RateLimiter(rate=20, burst=2)
+        self.assertEqual(limiter.acquire(), 0.0)
+        self.assertEqual(limiter.acquire(), 0.0)
+        self.assertGreater(limiter.acquire(), 0.0)
+
+    def test_unlimited(self):
+        limiter = RateLimiter(rate=0)
+        for _ in range(100):
+            self.assertEqual(limiter.acquire(), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
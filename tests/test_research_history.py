@@ -0,0 +1,129 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents import patent_analyzer, research_agent
+from agents.patent_analyzer import PatentAnalyzer
+from agents.research_history import ResearchHistory
+
+PATENT = "权利要求书\n1. 一种数据传输方法，对数据包进行LZ4压缩并通过LTE-A信道发送。\n"
+OLD_ITEM = {"snippet": "基站采用LZ4压缩数据包并通过LTE-A信道发送", "link": "https://a.example/1", "title": ""}
+NEW_ITEM = {"snippet": "新款路由器支持LZ4压缩的LTE-A回传", "link": "https://b.example/2", "title": ""}
+
+
+def research_returning(items):
+    def conduct_research(patent_text, research_prompt, **kwargs):
+        return {'original_text': patent_text, 'search_results': [{'query': "LZ4 LTE-A", 'items': list(items)}]}
+    return conduct_research
+
+
+class TestIncrementalAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.history = ResearchHistory(os.path.join(self.tmpdir.name, 'research_history.sqlite3'))
+        for name, value in (('research_history', self.history), ('checkpoint_store', None)):
+            patcher = mock.patch.object(patent_analyzer, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_analyzer(self, items, clues):
+        analyzer = PatentAnalyzer()
+        analyzer.digest_agent = mock.Mock(build_context=mock.Mock(side_effect=lambda text, callback=None: text))
+        analyzer.research_agent = mock.Mock(conduct_research=mock.Mock(side_effect=research_returning(items)))
+        analyzer.evaluation_agent = mock.Mock(conduct_evaluation=mock.Mock(return_value=clues))
+        analyzer.summary_agent = mock.Mock(generate_summary=mock.Mock(return_value="<p>报告</p>"))
+        return analyzer
+
+    def test_only_new_documents_are_evaluated(self):
+        old_clue = {'clue_id': '1', 'match_score': 90.0, 'risk_level': '高', 'evidence': '旧线索'}
+        new_clue = {'clue_id': '1', 'match_score': 80.0, 'risk_level': '高', 'evidence': '新线索'}
+        self.make_analyzer([OLD_ITEM], [old_clue]).analyze_patent(PATENT, "研究", "总结", incremental=True)
+        since = self.history.get(PATENT)['analyzed_at']
+
+        analyzer = self.make_analyzer([OLD_ITEM, NEW_ITEM], [new_clue])
+        analyzer.analyze_patent(PATENT, "研究", "总结", incremental=True)
+
+        self.assertEqual(analyzer.research_agent.after_date_floor, since)
+        self.assertIn(since, analyzer.research_agent.conduct_research.call_args[0][1])
+        evaluated_materials = analyzer.evaluation_agent.conduct_evaluation.call_args[0][0]
+        self.assertEqual([clue['link'] for clue in evaluated_materials['screened_clues']], [NEW_ITEM['link']])
+
+        research_materials = analyzer.summary_agent.generate_summary.call_args[0][0]
+        self.assertEqual([clue['evidence'] for clue in research_materials['evaluated_clues']], ['旧线索', '新线索'])
+        # 新增线索接着历史线索编号，并标明来源
+        self.assertEqual([(clue['clue_id'], clue['is_new']) for clue in research_materials['evaluated_clues']],
+                         [('1', False), (2, True)])
+        self.assertEqual(research_materials['incremental']['new_documents'], 1)
+        self.assertEqual(len(research_materials['documents']), 2)
+        self.assertEqual(len(self.history.get(PATENT)['evaluated_clues']), 2)
+
+    def test_nothing_new_skips_evaluation(self):
+        self.make_analyzer([OLD_ITEM], [{'match_score': 90.0, 'risk_level': '高', 'evidence': '旧线索'}]) \
+            .analyze_patent(PATENT, "研究", "总结", incremental=True)
+        analyzer = self.make_analyzer([OLD_ITEM], [])
+        analyzer.analyze_patent(PATENT, "研究", "总结", incremental=True)
+        analyzer.evaluation_agent.conduct_evaluation.assert_not_called()
+        research_materials = analyzer.summary_agent.generate_summary.call_args[0][0]
+        self.assertEqual(len(research_materials['evaluated_clues']), 1)
+
+    def test_full_analysis_records_baseline(self):
+        self.make_analyzer([OLD_ITEM], []).analyze_patent(PATENT, "研究", "总结")
+        saved = self.history.get(PATENT)['research_materials']
+        self.assertEqual(list(saved), ['documents'])
+        self.assertEqual([document['link'] for document in saved['documents']], [OLD_ITEM['link']])
+
+        # 完整分析之后的第一次增量复查只评估新增文档
+        analyzer = self.make_analyzer([OLD_ITEM, NEW_ITEM], [])
+        analyzer.analyze_patent(PATENT, "研究", "总结", incremental=True)
+        evaluated_materials = analyzer.evaluation_agent.conduct_evaluation.call_args[0][0]
+        self.assertEqual([document['link'] for document in evaluated_materials['documents']], [NEW_ITEM['link']])
+
+    def test_history_does_not_grow_with_repeated_results(self):
+        for _ in range(3):
+            self.make_analyzer([OLD_ITEM, NEW_ITEM], []).analyze_patent(PATENT, "研究", "总结", incremental=True)
+        self.assertEqual(len(self.history.get(PATENT)['research_materials']['documents']), 2)
+
+    def test_near_duplicate_of_old_document_is_not_new(self):
+        self.make_analyzer([OLD_ITEM], []).analyze_patent(PATENT, "研究", "总结", incremental=True)
+        repost = dict(OLD_ITEM, link="https://c.example/repost", snippet=OLD_ITEM['snippet'] + "。")
+        analyzer = self.make_analyzer([repost, NEW_ITEM], [])
+        analyzer.analyze_patent(PATENT, "研究", "总结", incremental=True)
+        evaluated_materials = analyzer.evaluation_agent.conduct_evaluation.call_args[0][0]
+        self.assertEqual([document['link'] for document in evaluated_materials['documents']], [NEW_ITEM['link']])
+        self.assertEqual([duplicate['is_new'] for duplicate in evaluated_materials['dedup']['duplicates']], [True])
+
+    def test_first_incremental_run_is_a_full_analysis(self):
+        analyzer = self.make_analyzer([OLD_ITEM], [])
+        analyzer.analyze_patent(PATENT, "研究", "总结", incremental=True)
+        self.assertIsNone(analyzer.research_agent.after_date_floor)
+        self.assertEqual(analyzer.research_agent.conduct_research.call_args[0][1], "研究")
+
+
+class TestAfterDateFloor(unittest.TestCase):
+    def test_searches_are_limited_to_floor(self):
+        agent = research_agent.ResearchAgent()
+        agent.after_date_floor = "2024-06-01"
+        captured = []
+
+        def fake_get(url, params=None, timeout=None):
+            captured.append(params['q'])
+            return mock.Mock(json=mock.Mock(return_value={'organic_results': []}))
+
+        with mock.patch.object(research_agent, 'search_cache', None), \
+                mock.patch.object(research_agent, 'search_index', None), \
+                mock.patch.object(research_agent.requests, 'get', side_effect=fake_get):
+            agent._search({"query": "q1"})
+            agent._search({"query": "q2", "after_date": "2023-01-01"})
+            agent._search({"query": "q3", "after_date": "2024-09-01"})
+        self.assertEqual(captured, ["q1 after:2024-06-01", "q2 after:2024-06-01", "q3 after:2024-09-01"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.model_adapter import BaseModelAdapter, CachedModelAdapter, MockCompletion, MockToolCall
+from agents.response_cache import ResponseCache
+
+
+class CountingAdapter(BaseModelAdapter):
+    model_name = "test_model"
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_response(self, messages, **kwargs):
+        self.calls += 1
+        tool_calls = [MockToolCall("call_1", "search_internet", '{"query": "q"}')] if kwargs.get('tools') else None
+        return MockCompletion(f"answer {self.calls}", "test_model", tool_calls=tool_calls)
+
+
+class TestCachedModelAdapter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.inner = CountingAdapter()
+        cache = ResponseCache(os.path.join(self.tmpdir.name, 'llm_cache.sqlite3'))
+        self.adapter = CachedModelAdapter(self.inner, cache, ['evaluation', 'summary'])
+        self.messages = [{"role": "user", "content": "专利内容"}]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_repeated_call_served_from_cache(self):
+        first = self.adapter.get_response(self.messages, temperature=0.3, stage="evaluation")
+        second = self.adapter.get_response(self.messages, temperature=0.3, stage="evaluation")
+        self.assertEqual(self.inner.calls, 1)
+        self.assertEqual(second.choices[0].message.content, first.choices[0].message.content)
+
+    def test_params_are_part_of_key(self):
+        self.adapter.get_response(self.messages, temperature=0.3, stage="evaluation")
+        self.adapter.get_response(self.messages, temperature=0.7, stage="evaluation")
+        self.adapter.get_response(self.messages, temperature=0.3, model="other", stage="evaluation")
+        self.assertEqual(self.inner.calls, 3)
+
+    def test_stage_not_cached(self):
+        self.adapter.get_response(self.messages, stage="research")
+        self.adapter.get_response(self.messages, stage="research")
+        self.assertEqual(self.inner.calls, 2)
+
+    def test_tool_calls_and_tokens_replayed(self):
+        self.adapter.get_response(self.messages, tools=[{"type": "function"}], stage="summary")
+        tokens = []
+        cached = self.adapter.get_response(self.messages, tools=[{"type": "function"}], stage="summary", on_token=tokens.append)
+        self.assertEqual(self.inner.calls, 1)
+        self.assertEqual(cached.choices[0].message.tool_calls[0].function.name, "search_internet")
+        self.assertEqual(tokens, ["answer 1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
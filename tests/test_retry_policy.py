@@ -0,0 +1,164 @@
+import unittest
+import sys
+import os
+import json
+from unittest.mock import patch, MagicMock
+
+import httpx
+import requests
+from openai import RateLimitError, APIStatusError, APITimeoutError, AuthenticationError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.retry_policy import (
+    RetryPolicy, CircuitBreaker, StreamInterruptedError, classify_error, retry_after_seconds, call_with_retry
+)
+from agents.model_adapter import OllamaAdapter
+
+REQUEST = httpx.Request("POST", "http://localhost:1234/v1/chat/completions")
+
+
+def _response(status_code, headers=None):
+    return httpx.Response(status_code, headers=headers or {}, request=REQUEST)
+
+
+def _status_error(cls, status_code, headers=None):
+    return cls("error", response=_response(status_code, headers), body=None)
+
+
+class TestClassifyError(unittest.TestCase):
+    def test_openai_errors(self):
+        self.assertEqual(classify_error(_status_error(RateLimitError, 429)), 'rate_limit')
+        self.assertEqual(classify_error(_status_error(APIStatusError, 503)), 'server')
+        self.assertEqual(classify_error(APITimeoutError(REQUEST)), 'timeout')
+        self.assertIsNone(classify_error(_status_error(AuthenticationError, 401)))
+
+    def test_http_library_errors(self):
+        self.assertEqual(classify_error(httpx.ConnectError("refused")), 'connection')
+        self.assertEqual(classify_error(requests.Timeout()), 'timeout')
+        http_error = requests.HTTPError(response=MagicMock(status_code=502))
+        self.assertEqual(classify_error(http_error), 'server')
+
+    def test_not_retryable(self):
+        self.assertIsNone(classify_error(StreamInterruptedError("partial")))
+        self.assertIsNone(classify_error(json.JSONDecodeError("bad", "", 0)))
+
+
+class TestRetryAfter(unittest.TestCase):
+    def test_seconds_and_milliseconds(self):
+        self.assertEqual(retry_after_seconds(_status_error(RateLimitError, 429, {"retry-after": "7"})), 7.0)
+        self.assertEqual(retry_after_seconds(_status_error(RateLimitError, 429, {"retry-after-ms": "1500"})), 1.5)
+        self.assertIsNone(retry_after_seconds(_status_error(RateLimitError, 429)))
+
+    def test_rate_limit_waits_for_retry_after(self):
+        policy = RetryPolicy(base_delay=1)
+        error_class, delay = policy.next_delay(_status_error(RateLimitError, 429, {"retry-after": "10"}), {})
+        self.assertEqual(error_class, 'rate_limit')
+        self.assertGreaterEqual(delay, 10)
+        self.assertLessEqual(delay, 11)
+
+    def test_retry_after_too_long_gives_up(self):
+        policy = RetryPolicy(max_retry_after=30)
+        _, delay = policy.next_delay(_status_error(RateLimitError, 429, {"retry-after": "600"}), {})
+        self.assertIsNone(delay)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_full_jitter_is_capped(self):
+        policy = RetryPolicy(base_delay=2, max_delay=5)
+        for attempt in range(10):
+            self.assertLessEqual(policy.backoff(attempt), 5)
+
+    def test_budgets_are_per_error_class(self):
+        policy = RetryPolicy(budgets={'timeout': 1, 'server': 2})
+        retries = {}
+        self.assertIsNotNone(policy.next_delay(APITimeoutError(REQUEST), retries)[1])
+        self.assertIsNone(policy.next_delay(APITimeoutError(REQUEST), retries)[1])
+        # 超时次数用完不影响 5xx 的重试
+        self.assertIsNotNone(policy.next_delay(_status_error(APIStatusError, 500), retries)[1])
+        self.assertEqual(retries, {'timeout': 1, 'server': 1})
+
+    @patch('agents.retry_policy.time.sleep')
+    def test_call_with_retry(self, mock_sleep):
+        attempt = MagicMock(side_effect=[_status_error(APIStatusError, 500), _status_error(RateLimitError, 429), "ok"])
+        breaker = CircuitBreaker("test-retry")
+        self.assertEqual(call_with_retry(attempt, RetryPolicy(base_delay=0.01), breaker, "test"), "ok")
+        self.assertEqual(attempt.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(breaker.failures, 0)
+
+    @patch('agents.retry_policy.time.sleep')
+    def test_call_with_retry_gives_up(self, mock_sleep):
+        attempt = MagicMock(side_effect=_status_error(APIStatusError, 500))
+        result = call_with_retry(attempt, RetryPolicy(budgets={'server': 2}), CircuitBreaker("test-give-up", 10), "test")
+        self.assertIsNone(result)
+        self.assertEqual(attempt.call_count, 3)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("test-open", failure_threshold=2, reset_timeout=60)
+        breaker.record_failure('server')
+        self.assertTrue(breaker.allow())
+        breaker.record_failure('timeout')
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_rate_limit_does_not_trip(self):
+        breaker = CircuitBreaker("test-429", failure_threshold=1)
+        breaker.record_failure('rate_limit')
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    @patch('agents.retry_policy.time.monotonic')
+    def test_half_open_allows_single_probe(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        breaker = CircuitBreaker("test-half-open", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure('connection')
+        mock_monotonic.return_value = 131.0
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    @patch('agents.retry_policy.time.monotonic')
+    def test_failed_probe_reopens(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        breaker = CircuitBreaker("test-reopen", failure_threshold=3, reset_timeout=30)
+        for _ in range(3):
+            breaker.record_failure('server')
+        mock_monotonic.return_value = 131.0
+        self.assertTrue(breaker.allow())
+        breaker.record_failure('server')
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+
+class TestOllamaRetry(unittest.TestCase):
+    @patch('agents.retry_policy.time.sleep')
+    def test_retries_server_error(self, mock_sleep):
+        adapter = OllamaAdapter(base_url="http://ollama-retry-test:11434", model_name="qwen3:8b")
+        failed = MagicMock()
+        failed.raise_for_status.side_effect = requests.HTTPError(response=MagicMock(status_code=503))
+        succeeded = MagicMock()
+        succeeded.json.return_value = {'message': {'content': '你好'}}
+        with patch.object(adapter.session, 'post', side_effect=[failed, succeeded]) as mock_post:
+            response = adapter.get_response([{'role': 'user', 'content': 'hi'}])
+        self.assertEqual(response.choices[0].message.content, '你好')
+        self.assertEqual(mock_post.call_count, 2)
+        adapter.close()
+
+    @patch('agents.retry_policy.time.sleep')
+    def test_bad_json_is_not_retried(self, mock_sleep):
+        adapter = OllamaAdapter(base_url="http://ollama-json-test:11434", model_name="qwen3:8b")
+        bad = MagicMock()
+        bad.json.side_effect = json.JSONDecodeError("bad", "", 0)
+        with patch.object(adapter.session, 'post', return_value=bad) as mock_post:
+            self.assertIsNone(adapter.get_response([{'role': 'user', 'content': 'hi'}]))
+        self.assertEqual(mock_post.call_count, 1)
+        adapter.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
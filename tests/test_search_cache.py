@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.search_cache import SearchCache
+
+RESULTS = [{"snippet": "5G 基站节能方案", "link": "https://example.com/a"}]
+
+
+class TestSearchCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = SearchCache(os.path.join(self.tmpdir.name, 'search_cache.sqlite3'), ttl_seconds=60, max_entries=2)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hit_after_set_with_normalized_query(self):
+        self.assertIsNone(self.cache.get("5G 基站", "2024-01-01", "google", 30))
+        self.cache.set("5G 基站", "2024-01-01", "google", 30, RESULTS)
+        self.assertEqual(self.cache.get("  5g   基站 ", "2024-01-01", "google", 30), RESULTS)
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "entries": 1})
+
+    def test_key_includes_date_and_num(self):
+        self.cache.set("query", "", "google", 30, RESULTS)
+        self.assertIsNone(self.cache.get("query", "2024-01-01", "google", 30))
+        self.assertIsNone(self.cache.get("query", "", "google", 10))
+
+    def test_expired_entry_is_a_miss(self):
+        self.cache.set("query", "", "google", 30, RESULTS)
+        with mock.patch('agents.sqlite_cache.time.time', return_value=10 ** 10):
+            self.assertIsNone(self.cache.get("query", "", "google", 30))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_evicts_least_recently_used(self):
+        clock = [1000.0]
+        with mock.patch('agents.sqlite_cache.time.time', side_effect=lambda: clock[0]):
+            for step in (lambda: self.cache.set("a", "", "google", 30, RESULTS),
+                         lambda: self.cache.set("b", "", "google", 30, RESULTS),
+                         lambda: self.cache.get("a", "", "google", 30),  # a 比 b 更近被访问
+                         lambda: self.cache.set("c", "", "google", 30, RESULTS)):
+                step()
+                clock[0] += 1
+            self.assertIsNotNone(self.cache.get("a", "", "google", 30))
+            self.assertIsNone(self.cache.get("b", "", "google", 30))
+            self.assertIsNotNone(self.cache.get("c", "", "google", 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
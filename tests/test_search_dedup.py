@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.search_dedup import dedup_search_results, dedup_research_materials, normalize_url, simhash
+from agents.summary_agent import SummaryAgent
+
+SEARCH_RESULTS = [
+    {'query': "LZ4 压缩 基站", 'items': [
+        {"snippet": "某公司发布新一代基站，采用LZ4压缩回传数据，时延降低30%", "link": "https://www.a.example/news/1/", "title": ""},
+        {"snippet": "智能手表表带结构专利公开", "link": "https://b.example/2", "title": ""},
+    ]},
+    {'query': "基站 回传 压缩", 'items': [
+        # 同一页面的另一种写法
+        {"snippet": "基站采用LZ4压缩回传数据", "link": "http://a.example/news/1?utm_source=x", "title": ""},
+        # 转载稿，链接不同，摘要几乎一致
+        {"snippet": "某公司发布新一代基站，采用LZ4压缩回传数据，时延降低30%。", "link": "https://c.example/repost", "title": ""},
+    ]},
+]
+
+
+class TestSearchDedup(unittest.TestCase):
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url("https://www.a.example/news/1/?utm_source=x#top"),
+                         normalize_url("http://a.example/news/1"))
+        self.assertNotEqual(normalize_url("https://a.example/item?id=1"), normalize_url("https://a.example/item?id=2"))
+
+    def test_simhash_close_for_near_duplicates(self):
+        a = simhash("某公司发布新一代基站，采用LZ4压缩回传数据，时延降低30%")
+        b = simhash("某公司发布新一代基站，采用LZ4压缩回传数据，时延降低30%。")
+        c = simhash("智能手表表带结构专利公开")
+        self.assertLessEqual(bin(a ^ b).count('1'), 3)
+        self.assertGreater(bin(a ^ c).count('1'), 3)
+
+    def test_merges_with_provenance(self):
+        documents, duplicates = dedup_search_results(SEARCH_RESULTS)
+        self.assertEqual(len(documents), 2)
+        self.assertEqual(documents[0]['queries'], ["LZ4 压缩 基站", "基站 回传 压缩"])
+        self.assertEqual(len(documents[0]['links']), 3)
+        self.assertEqual(sorted(item['reason'] for item in duplicates), ['duplicate_url', 'near_duplicate'])
+
+    def test_summary_lists_each_document_once(self):
+        materials = {'search_results': SEARCH_RESULTS}
+        dedup_research_materials(materials)
+        blocks = SummaryAgent()._document_blocks(materials['documents'])
+        self.assertEqual(len(blocks), 1)
+        self.assertIn("亦命中查询：基站 回传 压缩", blocks[0])
+        self.assertEqual(materials['dedup']['total'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
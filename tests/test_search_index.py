@@ -0,0 +1,87 @@
+import unittest
+import sys
+import os
+import tempfile
+import time
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents import research_agent
+from agents.search_index import SearchIndex, index_tokens
+
+RESULTS = [
+    {"snippet": "基站节能方案采用LZ4压缩回传数据", "link": "https://example.com/a", "title": "5G 基站节能"},
+    {"snippet": "一种智能手表的表带结构", "link": "https://example.com/b", "title": "可穿戴设备"},
+]
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index = SearchIndex(os.path.join(self.tmpdir.name, 'search_index.sqlite3'), max_documents=3)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_tokens_use_cjk_bigrams(self):
+        self.assertEqual(index_tokens("基站节能 the LZ4"), ["基站", "站节", "节能", "lz4"])
+
+    def test_search_ranks_and_filters_by_coverage(self):
+        self.index.add("基站节能", RESULTS)
+        results = self.index.search("基站 数据压缩")
+        self.assertEqual(results[0]['link'], "https://example.com/a")
+        self.assertEqual(self.index.search("基站 手表", min_coverage=0.8), [])
+
+    def test_same_link_is_stored_once(self):
+        self.index.add("q1", RESULTS)
+        self.index.add("q2", [dict(RESULTS[0], snippet="基站节能的新摘要")])
+        self.assertEqual(self.index.stats()["documents"], 2)
+        self.assertEqual(self.index.search("新摘要")[0]['snippet'], "基站节能的新摘要")
+
+    def test_max_age_excludes_stale_documents(self):
+        self.index.add("基站节能", RESULTS)
+        with mock.patch('agents.search_index.time.time', return_value=time.time() + 3600):
+            self.assertEqual(self.index.search("基站节能", max_age_seconds=60), [])
+            self.assertEqual(len(self.index.search("基站节能")), 1)
+
+    def test_prunes_oldest_documents(self):
+        for i in range(5):
+            self.index.add(f"q{i}", [{"snippet": f"文档{i}", "link": f"https://example.com/{i}"}])
+        self.assertEqual(self.index.stats()["documents"], 3)
+
+
+class TestResearchAgentLocalSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index = SearchIndex(os.path.join(self.tmpdir.name, 'search_index.sqlite3'))
+        self.index.add("基站节能", RESULTS)
+        for name, value in (('search_cache', None), ('search_index', self.index), ('SEARCH_INDEX_MIN_HITS', 1)):
+            patcher = mock.patch.object(research_agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_local_hit_skips_serpapi(self):
+        with mock.patch.object(research_agent.requests, 'get') as get:
+            result, record = research_agent.ResearchAgent()._search({"query": "基站节能"})
+        get.assert_not_called()
+        self.assertIn("https://example.com/a", record['urls'])
+
+    def test_stale_local_hits_fall_back_to_serpapi(self):
+        with mock.patch.object(research_agent, 'SEARCH_INDEX_MAX_AGE_SECONDS', 60), \
+                mock.patch('agents.search_index.time.time', return_value=time.time() + 3600):
+            self.assertIsNone(research_agent.ResearchAgent()._search_local("基站节能", None))
+            self.assertEqual(len(research_agent.ResearchAgent(offline=True)._search_local("基站节能", None)), 1)
+
+    def test_offline_mode_never_calls_serpapi(self):
+        with mock.patch.object(research_agent.requests, 'get') as get:
+            result, record = research_agent.ResearchAgent(offline=True)._search({"query": "量子计算", "after_date": "2024-01-01"})
+        get.assert_not_called()
+        self.assertEqual(record['urls'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()